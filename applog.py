@@ -0,0 +1,158 @@
+import atexit
+import contextlib
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+from paths import state_dir
+import tracing
+
+LOG_LEVEL = os.environ.get("VPN_APP_LOG_LEVEL", "INFO").upper()
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 3
+# Records waiting for the writer thread; past this they are dropped, never waited for
+LOG_QUEUE_SIZE = 10000
+# Records per call site (and connection) and window before the rest of the window is dropped
+RATE_LIMIT = 20
+RATE_WINDOW = 60.0
+
+_context = contextvars.ContextVar("vpn_log_context", default={})
+
+
+def log_file(name='vpn-app.jsonl'):
+    path = state_dir() / 'logs'
+    path.mkdir(exist_ok=True)
+    return path / name
+
+
+@contextlib.contextmanager
+def context(**fields):
+    """Add fields (e.g. connection=name) to every record logged inside the block"""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Copy the caller's context onto the record before it changes threads"""
+
+    def filter(self, record):
+        record.context = _context.get()
+        span = tracing.current()
+        record.trace_id = span.trace_id if span is not None else None
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """Let at most `limit` records per call site and connection through each
+    `window` seconds.
+
+    A flapping tunnel repeats the same few lines; the first record of the
+    next window carries how many were dropped. Other connections logging
+    from the same line are counted apart, so they are not silenced with it.
+    """
+
+    def __init__(self, limit=RATE_LIMIT, window=RATE_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.pathname, record.lineno, _context.get().get('connection'))
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.window:
+                suppressed = site[2] if site else 0
+                self._sites[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if site[1] < self.limit:
+                site[1] += 1
+                return True
+            site[2] += 1
+            return False
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line (tracebacks are already part of the message)"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f".{int(record.msecs):03d}",
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }
+        entry.update(getattr(record, 'context', None) or {})
+        if getattr(record, 'trace_id', None):
+            entry['trace_id'] = record.trace_id
+        if getattr(record, 'suppressed', None):
+            entry['suppressed'] = record.suppressed
+        if getattr(record, 'dropped', None):
+            entry['dropped'] = record.dropped
+        return json.dumps(entry, default=str)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never block the caller: a full queue means the record is dropped.
+
+    The next record that fits carries how many were lost since the last
+    report (`dropped`), like the rate limiter's `suppressed`.
+    """
+
+    dropped = 0
+
+    def enqueue(self, record):
+        # Called under the handler's lock
+        if self.dropped:
+            record.dropped = self.dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            record.dropped = None
+            self.dropped += 1
+        else:
+            self.dropped = 0
+
+
+def setup(filename='vpn-app.jsonl', level=LOG_LEVEL):
+    """Send the root logger through a queue to a rotating JSON lines file.
+
+    Callers only pay for formatting the message and a queue put; a
+    background thread does the file I/O. Returns the listener.
+    """
+    try:
+        target = logging.handlers.RotatingFileHandler(
+            log_file(filename), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding='utf-8'
+        )
+        target.setFormatter(JsonFormatter())
+    except OSError as e:
+        target = logging.StreamHandler()
+        target.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        logging.getLogger().warning(f"Cannot write the log file, logging to stderr: {e}")
+
+    handler = _DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    handler.addFilter(RateLimitFilter())
+    handler.addFilter(ContextFilter())
+    listener = logging.handlers.QueueListener(handler.queue, target)
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
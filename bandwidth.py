@@ -0,0 +1,139 @@
+import os
+import time
+from array import array
+
+# Samples per second while a tunnel is up
+SAMPLE_RATE = float(os.environ.get("VPN_APP_SAMPLE_HZ", 2))
+# Samples kept per connection
+HISTORY = 60
+
+SPARK_BLOCKS = "▁▂▃▄▅▆▇█"
+
+
+def format_rate(bytes_per_second):
+    for unit in ("B/s", "kB/s", "MB/s"):
+        if bytes_per_second < 1000:
+            return f"{bytes_per_second:.0f} {unit}"
+        bytes_per_second /= 1000
+    return f"{bytes_per_second:.1f} GB/s"
+
+
+class RingBuffer:
+    """Fixed-size history of rx/tx rates (bytes per second).
+
+    Both series live in arrays allocated once; appending overwrites the
+    oldest sample in place.
+    """
+    __slots__ = ('size', 'rx', 'tx', 'index', 'count')
+
+    def __init__(self, size=HISTORY):
+        self.size = size
+        self.rx = array('d', bytes(8 * size))
+        self.tx = array('d', bytes(8 * size))
+        self.index = 0
+        self.count = 0
+
+    def append(self, rx, tx):
+        self.rx[self.index] = rx
+        self.tx[self.index] = tx
+        self.index = (self.index + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    def position(self, i):
+        """Array index of the i-th sample, oldest first"""
+        return (self.index - self.count + i) % self.size
+
+    def latest(self):
+        if not self.count:
+            return 0.0, 0.0
+        i = (self.index - 1) % self.size
+        return self.rx[i], self.tx[i]
+
+    def peak(self):
+        # Unused slots are zero, so they never raise the peak
+        return max(max(self.rx), max(self.tx))
+
+    def sparkline(self, series, width=20):
+        """Text sparkline of the last `width` samples of 'rx' or 'tx'"""
+        values = self.rx if series == 'rx' else self.tx
+        peak = self.peak() or 1.0
+        count = min(width, self.count)
+        return "".join(
+            SPARK_BLOCKS[min(7, int(values[self.position(self.count - count + i)] / peak * 8))]
+            for i in range(count)
+        )
+
+
+class BandwidthSampler:
+    """Per-connection rx/tx rates, sampled from interface counters.
+
+    Each sample() reads /proc/net/dev once for every tracked device and
+    only parses the lines of those devices. Connections without a
+    readable device (macOS utun, IPsec without an XFRM interface) use a
+    fallback callable returning cumulative (bytes_in, bytes_out), such as
+    the OpenVPN management byte counts.
+    """
+
+    def __init__(self, history=HISTORY, path='/proc/net/dev'):
+        self.history_size = history
+        self.path = path
+        # connection_id -> [device (bytes) or None, fallback, last rx, last tx, last time, ring]
+        self._tracked = {}
+
+    def track(self, connection_id, device=None, fallback=None):
+        if not os.path.exists(self.path):
+            device = None
+        self._tracked[connection_id] = [
+            device.encode() if device else None, fallback, None, None, None, RingBuffer(self.history_size)
+        ]
+
+    def untrack(self, connection_id):
+        self._tracked.pop(connection_id, None)
+
+    def history(self, connection_id):
+        entry = self._tracked.get(connection_id)
+        return entry[5] if entry else None
+
+    def __len__(self):
+        return len(self._tracked)
+
+    def sample(self):
+        """Take one sample of every tracked connection; return their ids"""
+        devices = {entry[0] for entry in self._tracked.values() if entry[0]}
+        counters = self._read(devices) if devices else {}
+        now = time.monotonic()
+        sampled = []
+        for connection_id, entry in self._tracked.items():
+            if entry[0]:
+                totals = counters.get(entry[0])
+            elif entry[1]:
+                totals = entry[1]()
+            else:
+                totals = None
+            if totals is None:
+                continue
+            rx, tx = totals
+            if entry[4] is not None:
+                elapsed = now - entry[4]
+                if elapsed > 0:
+                    # Counters restart from zero if the device is recreated
+                    entry[5].append(max(0.0, (rx - entry[2]) / elapsed), max(0.0, (tx - entry[3]) / elapsed))
+                    sampled.append(connection_id)
+            entry[2], entry[3], entry[4] = rx, tx, now
+        return sampled
+
+    def _read(self, devices):
+        counters = {}
+        try:
+            with open(self.path, 'rb') as file:
+                data = file.read()
+        except OSError:
+            return counters
+        for line in data.splitlines()[2:]:
+            name, _, fields = line.partition(b':')
+            name = name.strip()
+            if name in devices:
+                fields = fields.split()
+                counters[name] = (int(fields[0]), int(fields[8]))
+        return counters
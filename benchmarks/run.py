@@ -0,0 +1,329 @@
+"""Benchmarks for the data and UI hot paths.
+
+Runs headless (QT_QPA_PLATFORM=offscreen) against generated profiles in a
+scratch directory; the connection engine is replaced by a stub, so no VPN
+binaries, sudo or network are needed. Results are written as JSON and
+compared against benchmarks/baseline.json:
+
+    python benchmarks/run.py
+    python benchmarks/run.py --sizes 10,1000 --stores json
+    python benchmarks/run.py --update-baseline
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARKS_DIR.parent))
+
+DEFAULT_SIZES = (10, 1000, 10000)
+DEFAULT_STORES = ('json', 'sqlite')
+DEFAULT_BASELINE = BENCHMARKS_DIR / 'baseline.json'
+DEFAULT_OUTPUT = BENCHMARKS_DIR / 'results.json'
+# Fixed workload that only measures how fast the machine is right now
+CALIBRATION = 'calibration'
+
+PROFILE = """client
+dev tun
+proto udp
+remote vpn{index}.example.com 1194
+nobind
+persist-key
+persist-tun
+cipher AES-256-GCM
+verb 3
+<ca>
+-----BEGIN CERTIFICATE-----
+MIIBszCCAVmgAwIBAgIUBENCHMARKBENCHMARKBENCHMARKBENCHMARKwCgYIKoZIzj0EAwIw
+-----END CERTIFICATE-----
+</ca>
+"""
+
+
+def _isolate(scratch):
+    """Keep logs, caches and state of the app out of the user's home"""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    for variable, name in (('XDG_STATE_HOME', 'state'), ('XDG_CACHE_HOME', 'cache'),
+                           ('XDG_RUNTIME_DIR', 'run')):
+        path = scratch / name
+        path.mkdir(mode=0o700, exist_ok=True)
+        os.environ[variable] = str(path)
+    os.environ.pop('VPN_APP_METRICS_PORT', None)
+    os.environ.pop('VPN_APP_TRACE', None)
+    # The app reads and writes its files relative to the working directory
+    os.chdir(scratch)
+
+
+def make_fixture(root, size, store_engine):
+    """A directory with `size` saved connections, each with its own profile"""
+    from store import Connection, SQLiteConnectionStore
+
+    directory = root / f"{store_engine}-{size}"
+    profiles = directory / 'profiles'
+    profiles.mkdir(parents=True)
+    connections = []
+    for index in range(size):
+        path = profiles / f"vpn{index}.ovpn"
+        path.write_text(PROFILE.format(index=index))
+        connections.append(Connection(f"vpn{index}", str(path), f"user{index}", f"password-{index:06d}"))
+    with open(directory / 'connections.json', 'w') as file:
+        json.dump([connection.to_dict() for connection in connections], file)
+    if store_engine == 'sqlite':
+        # Migrate now so that no timed load pays for it
+        store = SQLiteConnectionStore(directory / 'connections.db', json_path=directory / 'connections.json')
+        store.load()
+        store.close()
+    return directory
+
+
+def stub_engine():
+    """Swap the connection engine for one that never spawns a daemon"""
+    import gui
+    from engine import ConnectionEngine
+
+    class StubEngine(ConnectionEngine):
+        # Profiles compile on the engine's pool; keep that work from
+        # competing with the GUI thread being measured
+        def precompile(self, connections):
+            self.precompiled = sum(1 for _ in connections)
+
+        def connect(self, connection_id, connection, sudo_password):
+            self.calls.append(('connect', connection_id))
+
+        def disconnect(self, connection_id, connection, sudo_password):
+            self.calls.append(('disconnect', connection_id))
+
+        @property
+        def needs_password(self):
+            return False
+
+    StubEngine.calls = []
+    gui.ConnectionEngine = StubEngine
+    # A dialog would block the run forever: fail instead
+    def unexpected_dialog(parent, title, text, *args):
+        sys.exit(f"Unexpected dialog during benchmark: {title}: {text}")
+    gui.QMessageBox.critical = unexpected_dialog
+    gui.QMessageBox.information = unexpected_dialog
+    # No update check (network) or library probe (subprocesses)
+    gui.MainWindow.check_for_updates = lambda self: None
+    gui.MainWindow.start_library_check = lambda self: None
+
+
+def calibrate(bench):
+    """Time a workload that never changes with the code (JSON and sorting, like the app's own work)"""
+    records = [{'name': f"vpn{index}", 'config_path': f"/profiles/vpn{index}.ovpn", 'index': index}
+               for index in range(20000)]
+    for _ in range(bench.repeat):
+        with bench.measure(CALIBRATION):
+            sorted(json.loads(json.dumps(records)), key=lambda record: record['name'])
+
+
+@contextlib.contextmanager
+def patched(owner, name, value):
+    original = getattr(owner, name)
+    setattr(owner, name, value)
+    try:
+        yield
+    finally:
+        setattr(owner, name, original)
+
+
+class Bench:
+    """Collect timings (ms) per benchmark name"""
+
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.samples = {}
+
+    @contextlib.contextmanager
+    def measure(self, name):
+        gc.collect()
+        start = time.perf_counter_ns()
+        yield
+        self.samples.setdefault(name, []).append((time.perf_counter_ns() - start) / 1e6)
+
+    def results(self):
+        return {
+            name: {
+                'min_ms': round(min(samples), 4),
+                'median_ms': round(statistics.median(samples), 4),
+                'samples': len(samples)
+            }
+            for name, samples in self.samples.items()
+        }
+
+
+def close_window(app, window):
+    window.engine.shutdown()
+    window.registry.store.close()
+    window.tray_icon.hide()
+    window.deleteLater()
+    app.processEvents()
+
+
+def run_size(app, bench, fixture, size, store_engine):
+    import gui
+    import store
+    from models import ConnectionState
+
+    os.chdir(fixture)
+    store.STORE_ENGINE = store_engine
+    suffix = f"[{store_engine},{size}]"
+
+    for _ in range(bench.repeat):
+        with bench.measure(f"cold_main_window{suffix}"):
+            window = gui.MainWindow()
+        close_window(app, window)
+
+    for _ in range(bench.repeat):
+        with patched(gui.MainWindow, 'load_connections', lambda self: None):
+            window = gui.MainWindow()
+        with bench.measure(f"load_connections{suffix}"):
+            window.load_connections()
+
+        # First opening of each submenu builds all of its actions
+        with bench.measure(f"update_connections_menu{suffix}"):
+            window.tray_connections.flush()
+
+        # Afterwards a state change only touches its own action
+        connection_id = window.list_model.connection_id(size // 2)
+        with bench.measure(f"update_connections_menu_single_change{suffix}"):
+            window.registry.set_state(connection_id, ConnectionState.CONNECTED)
+            window.tray_connections.flush()
+        close_window(app, window)
+
+    window = gui.MainWindow()
+    ids = [window.list_model.connection_id(row) for row in range(size)]
+    window.save_connections()
+    for sample in range(bench.repeat):
+        connection_id = ids[(sample * 7919) % size]
+        with bench.measure(f"save_connections{suffix}"):
+            window.registry.update(connection_id, username=f"edited{sample}")
+            window.save_connections()
+
+    # Worst case for a lookup: the last connection of the list
+    connection_id = ids[-1]
+    observer = window.observer_for(connection_id)
+    for _ in range(bench.repeat * 10):
+        observer.set_state(ConnectionState.DISCONNECTED)
+        with bench.measure(f"toggle_vpn_from_menu{suffix}"):
+            window.toggle_vpn_from_menu(connection_id)
+    close_window(app, window)
+
+
+def machine_factor(results, baseline):
+    """How much slower the machine is now than when the baseline was taken (never below 1)"""
+    if CALIBRATION not in results or CALIBRATION not in baseline:
+        return 1.0
+    # A faster reading only tightens the limits, and is as noisy as a slower one
+    return max(1.0, results[CALIBRATION]['min_ms'] / max(baseline[CALIBRATION]['min_ms'], 1e-6))
+
+
+def compare(results, baseline, threshold):
+    """Return (name, baseline ms, current ms, ratio) for every slowdown past threshold.
+
+    Baseline times are scaled by machine_factor(), so a busier or slower
+    machine doesn't read as a regression of the code.
+    """
+    factor = machine_factor(results, baseline)
+    regressions = []
+    for name, result in sorted(results.items()):
+        reference = baseline.get(name)
+        if not reference or name == CALIBRATION:
+            continue
+        expected = reference['min_ms'] * factor
+        # The fastest sample is the least disturbed by the rest of the machine
+        ratio = result['min_ms'] / max(expected, 1e-6)
+        # Sub-10µs differences are timer noise, whatever the ratio
+        if ratio > threshold and result['min_ms'] - expected > 0.01:
+            regressions.append((name, expected, result['min_ms'], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the data and UI hot paths")
+    parser.add_argument('--sizes', default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated connection counts")
+    parser.add_argument('--stores', default=",".join(DEFAULT_STORES), help="comma-separated store engines")
+    parser.add_argument('--repeat', type=int, default=5, help="samples per benchmark")
+    parser.add_argument('--output', default=str(DEFAULT_OUTPUT), help="where to write the results")
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help="results to compare against")
+    # Runs of the same code on one machine differ by up to ~1.8x on the IO-bound benchmarks
+    parser.add_argument('--threshold', type=float, default=2.0,
+                        help="ratio over the baseline minimum that counts as a regression")
+    parser.add_argument('--update-baseline', action='store_true', help="store these results as the baseline")
+    args = parser.parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(',')]
+    stores = args.stores.split(',')
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline)
+
+    scratch = Path(tempfile.mkdtemp(prefix='vpn-bench-'))
+    try:
+        _isolate(scratch)
+        from PyQt5.QtCore import QT_VERSION_STR
+        from PyQt5.QtWidgets import QApplication
+        app = QApplication(sys.argv[:1])
+        stub_engine()
+
+        bench = Bench(args.repeat)
+        for store_engine in stores:
+            for size in sizes:
+                fixture = make_fixture(scratch, size, store_engine)
+                print(f"{store_engine} x {size}...", file=sys.stderr)
+                # Sampled all along the run: load on the machine comes and goes
+                calibrate(bench)
+                run_size(app, bench, fixture, size, store_engine)
+    finally:
+        os.chdir(BENCHMARKS_DIR)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'qt': QT_VERSION_STR,
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'repeat': args.repeat
+        },
+        'results': bench.results()
+    }
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=2)
+
+    for name, result in report['results'].items():
+        print(f"{name:60} {result['median_ms']:10.3f} ms  (min {result['min_ms']:.3f})")
+
+    if args.update_baseline:
+        shutil.copyfile(output, baseline_path)
+        print(f"Baseline updated: {baseline_path}")
+        return 0
+    try:
+        with open(baseline_path) as file:
+            baseline = json.load(file)['results']
+    except FileNotFoundError:
+        print(f"No baseline at {baseline_path}; run with --update-baseline to create one")
+        return 0
+    factor = machine_factor(report['results'], baseline)
+    if factor != 1.0:
+        print(f"Machine speed against the baseline: x{factor:.2f} (baseline times scaled accordingly)")
+    regressions = compare(report['results'], baseline, args.threshold)
+    for name, before, after, ratio in regressions:
+        print(f"REGRESSION {name}: {before:.3f} ms -> {after:.3f} ms (x{ratio:.2f})")
+    if not regressions:
+        print(f"No regressions against {baseline_path}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""Command line interface: python Main.py connect|disconnect|status|list|import.
+
+Works on the same connections file (or database) as the tray application
+and never imports Qt. The connection engine is only loaded by the
+commands that start or stop a tunnel.
+"""
+import argparse
+import getpass
+import json
+import logging
+import sys
+
+from store import open_store
+from tunnels import Tunnel, sa_name
+
+COMMANDS = ('connect', 'disconnect', 'status', 'list', 'import')
+
+
+def _load_store():
+    store = open_store()
+    store.load()
+    return store
+
+
+def _find(store, name):
+    connection_id = store.find_by_name(name)
+    if connection_id is None:
+        print(f"No existe la conexión: {name}", file=sys.stderr)
+        return None, None
+    return connection_id, store.get(connection_id)
+
+
+def _sudo_password(connection, args):
+    """Saved password, then --password-stdin, then an interactive prompt"""
+    if connection.sudo_password:
+        return connection.sudo_password
+    if args.password_stdin:
+        return sys.stdin.readline().rstrip('\n')
+    if sys.stdin.isatty():
+        return getpass.getpass("Contraseña de sudo: ")
+    return None
+
+
+def _ipsec_sas():
+    """Names of the IKE SAs charon has up, or None if it cannot be asked"""
+    import vici
+
+    names = set()
+    try:
+        session = vici.ViciSession.open(on_event=lambda event, message: names.update(message))
+    except (OSError, vici.ViciError) as e:
+        logging.warning(f"Cannot query IPsec state: {e}")
+        return None
+    try:
+        session.register('list-sa')
+        session.request('list-sas')
+        session.unregister('list-sa')
+    except (OSError, vici.ViciError) as e:
+        logging.warning(f"Cannot query IPsec state: {e}")
+        return None
+    finally:
+        session.close()
+    return names
+
+
+def _status(connection, ipsec_sas):
+    if connection.type == 'ipsec':
+        if ipsec_sas is None:
+            return "desconocido", None
+        return ("conectada" if sa_name(connection.config_path) in ipsec_sas else "desconectada"), None
+    tunnel = Tunnel(connection.config_path, create=False)
+    if tunnel.is_running():
+        return "conectada", tunnel.read_pid()
+    return "desconectada", None
+
+
+def command_list(args):
+    store = _load_store()
+    rows = [
+        {'name': connection.name, 'type': connection.type, 'config': connection.config_path,
+         'username': connection.username}
+        for _, connection in store.items()
+    ]
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        for row in rows:
+            print(f"{row['name']}\t{row['type']}\t{row['config']}\t{row['username']}")
+    return 0
+
+
+def command_status(args):
+    store = _load_store()
+    connections = [connection for _, connection in store.items()]
+    if args.name:
+        _, connection = _find(store, args.name)
+        if connection is None:
+            return 1
+        connections = [connection]
+
+    ipsec_sas = _ipsec_sas() if any(c.type == 'ipsec' for c in connections) else None
+    rows = []
+    for connection in connections:
+        state, pid = _status(connection, ipsec_sas)
+        rows.append({'name': connection.name, 'type': connection.type, 'state': state, 'pid': pid})
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        for row in rows:
+            pid = f" (pid {row['pid']})" if row['pid'] else ""
+            print(f"{row['name']}\t{row['type']}\t{row['state']}{pid}")
+    if args.name:
+        return 0 if rows[0]['state'] == "conectada" else 3
+    return 0
+
+
+def command_import(args):
+    from importer import import_profiles
+    from profiles import ProfileError
+
+    store = _load_store()
+    if args.password_stdin:
+        password = sys.stdin.readline().rstrip('\n')
+    elif sys.stdin.isatty():
+        password = getpass.getpass("Contraseña de la VPN: ")
+    else:
+        password = ""
+    if not password:
+        print("Se necesita la contraseña de la VPN (--password-stdin)", file=sys.stderr)
+        return 1
+    try:
+        result = import_profiles(args.source, args.username, password,
+                                 existing=[connection for _, connection in store.items()])
+    except (OSError, ProfileError) as e:
+        print(f"No se pudo importar: {e}", file=sys.stderr)
+        return 1
+    for path, error in result.invalid:
+        print(f"No válido: {error}", file=sys.stderr)
+    if args.verbose:
+        for path, name in result.duplicates:
+            print(f"Duplicado de {name}: {path}", file=sys.stderr)
+    try:
+        # One batch: a single transaction (SQLite) or file rewrite (JSON)
+        store.add_many(result.connections)
+    finally:
+        store.close()
+    print(result.summary())
+    return 0
+
+
+class _Outcome:
+    """Last state the engine reported for the connection being driven"""
+
+    def __init__(self, verbose):
+        self.verbose = verbose
+        self.state = None
+        self.error = None
+
+    def __call__(self, connection_id, state, error):
+        if self.verbose and state != self.state:
+            print(state.name.lower(), file=sys.stderr)
+        self.state = state
+        self.error = error
+
+
+def command_connect(args):
+    store = _load_store()
+    connection_id, connection = _find(store, args.name)
+    if connection is None:
+        return 1
+
+    from engine import ConnectionEngine
+    from models import ConnectionState
+
+    outcome = _Outcome(args.verbose)
+    # charon's socket is root's: IPsec goes through the helper's descriptor
+    engine = ConnectionEngine(on_state=outcome, use_helper=connection.type == 'ipsec')
+    try:
+        if engine.adopt(connection_id, connection):
+            print(f"{connection.name} ya está conectada")
+            return 0
+        profile_error = engine.check_profile(connection)
+        if profile_error:
+            print(f"Perfil no válido: {profile_error}", file=sys.stderr)
+            return 1
+        sudo_password = _sudo_password(connection, args)
+        if not sudo_password:
+            print("Se necesita la contraseña de sudo (--password-stdin)", file=sys.stderr)
+            return 1
+        engine.connect(connection_id, connection, sudo_password).result(timeout=args.timeout)
+        if outcome.state != ConnectionState.CONNECTED:
+            print(outcome.error or f"No se pudo conectar {connection.name}", file=sys.stderr)
+            return 1
+        print(f"{connection.name} conectada")
+        return 0
+    finally:
+        engine.shutdown()
+
+
+def command_disconnect(args):
+    store = _load_store()
+    connection_id, connection = _find(store, args.name)
+    if connection is None:
+        return 1
+
+    from engine import ConnectionEngine
+    from models import ConnectionState
+
+    outcome = _Outcome(args.verbose)
+    # charon's socket is root's: IPsec goes through the helper's descriptor
+    engine = ConnectionEngine(on_state=outcome, use_helper=connection.type == 'ipsec')
+    try:
+        # Through the management socket no password is needed
+        engine.adopt(connection_id, connection)
+        engine.disconnect(connection_id, connection, None).result(timeout=args.timeout)
+        if outcome.state != ConnectionState.DISCONNECTED:
+            sudo_password = _sudo_password(connection, args)
+            if sudo_password:
+                engine.disconnect(connection_id, connection, sudo_password).result(timeout=args.timeout)
+        if outcome.state != ConnectionState.DISCONNECTED:
+            print(outcome.error or f"No se pudo desconectar {connection.name}", file=sys.stderr)
+            return 1
+        print(f"{connection.name} desconectada")
+        return 0
+    finally:
+        engine.shutdown()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="Main.py", description="Gestionar conexiones VPN sin interfaz gráfica")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    for name, help in (('connect', "conectar"), ('disconnect', "desconectar")):
+        command = commands.add_parser(name, help=help)
+        command.add_argument('name', help="nombre de la conexión")
+        command.add_argument('--password-stdin', action='store_true',
+                             help="leer la contraseña de sudo de la entrada estándar")
+        command.add_argument('--timeout', type=float, default=90, help="segundos de espera como máximo")
+        command.add_argument('-v', '--verbose', action='store_true', help="mostrar cada cambio de estado")
+
+    status = commands.add_parser('status', help="estado de las conexiones")
+    status.add_argument('name', nargs='?', help="solo esta conexión (código 3 si no está conectada)")
+    status.add_argument('--json', action='store_true')
+
+    listing = commands.add_parser('list', help="conexiones guardadas")
+    listing.add_argument('--json', action='store_true')
+
+    importing = commands.add_parser('import', help="importar perfiles .ovpn de una carpeta o un zip")
+    importing.add_argument('source', help="carpeta o fichero zip")
+    importing.add_argument('--username', required=True, help="usuario de la VPN para todos los perfiles")
+    importing.add_argument('--password-stdin', action='store_true',
+                           help="leer la contraseña de la VPN de la entrada estándar")
+    importing.add_argument('-v', '--verbose', action='store_true', help="listar los duplicados")
+
+    args = parser.parse_args(argv)
+    handlers = {
+        'connect': command_connect,
+        'disconnect': command_disconnect,
+        'status': command_status,
+        'list': command_list,
+        'import': command_import
+    }
+    try:
+        return handlers[args.command](args)
+    except Exception as e:
+        logging.error(f"Error in command {args.command}: {e}")
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
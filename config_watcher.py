@@ -0,0 +1,140 @@
+import logging
+import os
+
+from PyQt5.QtCore import QObject, QFileSystemWatcher, QTimer, pyqtSignal
+
+from registry import RegistryObserver
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class ConfigWatcher(QObject, RegistryObserver):
+    """Watch the connection store and every OpenVPN profile it references.
+
+    Change notifications are coalesced for DELAY_MS and then reported
+    once: store_changed() if one of the store's files changed, and
+    profiles_changed(paths) with the profiles whose stamp differs from
+    the last one seen. Files replaced atomically (write and rename) drop
+    out of the watch, so their directories are watched as well and
+    existing files are added back after every burst. Profiles are added
+    in chunks from the event loop: a watch costs a syscall or two, and
+    large lists shouldn't delay the first paint.
+    """
+    store_changed = pyqtSignal()
+    profiles_changed = pyqtSignal(list)
+
+    DELAY_MS = 300
+    CHUNK = 256
+
+    def __init__(self, registry, store_paths, parent=None):
+        super().__init__(parent)
+        self.registry = registry
+        self.store_paths = {os.path.abspath(path) for path in store_paths}
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self._changed)
+        self.watcher.directoryChanged.connect(self._changed)
+        # Profile path -> stamp when last seen, and profiles by directory
+        self.stamps = {}
+        self._by_dir = {}
+        self._directories = set()
+        self._queue = []
+        self._pending = set()
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(self.DELAY_MS)
+        self.timer.timeout.connect(self._flush)
+        self.add_timer = QTimer(self)
+        self.add_timer.setInterval(0)
+        self.add_timer.timeout.connect(self._add_chunk)
+
+        self._add(list(self.store_paths))
+        registry.subscribe(self)
+
+    def watch(self, paths):
+        """Start watching these profiles"""
+        for path in paths:
+            path = os.path.abspath(path)
+            if path not in self.stamps:
+                self.stamps[path] = None
+                self._by_dir.setdefault(os.path.dirname(path), set()).add(path)
+                self._queue.append(path)
+        if self._queue and not self.add_timer.isActive():
+            self.add_timer.start()
+
+    def unwatch(self, path):
+        path = os.path.abspath(path)
+        self.stamps.pop(path, None)
+        self._by_dir.get(os.path.dirname(path), set()).discard(path)
+        if path in self.watcher.files():
+            self.watcher.removePath(path)
+
+    def on_added(self, connection_id, connection):
+        self.on_added_many([(connection_id, connection)])
+
+    def on_added_many(self, added):
+        self.watch(connection.config_path for _, connection in added if connection.type == 'openvpn')
+
+    def on_removed(self, connection_id, connection):
+        # Another connection may use the same profile
+        if connection.type == 'openvpn' and self.registry.find_by_config_path(connection.config_path) is None:
+            self.unwatch(connection.config_path)
+
+    def on_changed(self, connection_id, old, new):
+        if old.config_path != new.config_path:
+            self.on_removed(connection_id, old)
+            self.on_added_many([(connection_id, new)])
+
+    def _add_chunk(self):
+        chunk, self._queue = self._queue[:self.CHUNK], self._queue[self.CHUNK:]
+        chunk = [path for path in chunk if path in self.stamps]
+        for path in chunk:
+            self.stamps[path] = _stamp(path)
+        self._add(chunk)
+        if not self._queue:
+            self.add_timer.stop()
+
+    def _add(self, files):
+        directories = {os.path.dirname(path) for path in files} - self._directories
+        self._directories |= directories
+        # Missing files are added back once their directory reports them
+        paths = [path for path in files if os.path.exists(path)] + [d for d in directories if os.path.isdir(d)]
+        if paths:
+            self.watcher.addPaths(paths)
+
+    def _changed(self, path):
+        self._pending.add(path)
+        # Restarting the timer coalesces a burst into one flush
+        self.timer.start()
+
+    def _flush(self):
+        pending, self._pending = self._pending, set()
+        try:
+            candidates = {path for path in pending if path in self.stamps}
+            store_changed = bool(pending & self.store_paths)
+            for path in pending:
+                candidates |= self._by_dir.get(path, set())
+                if any(os.path.dirname(store_path) == path for store_path in self.store_paths):
+                    store_changed = True
+            changed = []
+            for path in candidates:
+                stamp = _stamp(path)
+                if stamp != self.stamps.get(path):
+                    self.stamps[path] = stamp
+                    changed.append(path)
+            # A replaced file is a new inode: watch it again
+            watched = set(self.watcher.files())
+            self._add([path for path in candidates | self.store_paths if path not in watched])
+        except Exception as e:
+            logging.error(f"Error checking changed files: {e}")
+            return
+        if store_changed:
+            self.store_changed.emit()
+        if changed:
+            self.profiles_changed.emit(sorted(changed))
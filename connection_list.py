@@ -0,0 +1,230 @@
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QEvent, QRect, QSize, pyqtSignal
+from PyQt5.QtGui import QColor, QPen, QPolygon
+from PyQt5.QtWidgets import QStyledItemDelegate, QStyle, QStyleOptionButton, QApplication
+
+from bandwidth import HISTORY, format_rate
+from models import ConnectionState, STATE_COLORS
+from registry import RegistryObserver, mask_password
+
+ConnectionIdRole = Qt.UserRole + 1
+ConnectionRole = Qt.UserRole + 2
+StateRole = Qt.UserRole + 3
+SamplesRole = Qt.UserRole + 4
+StaleRole = Qt.UserRole + 5
+
+
+class ConnectionListModel(QAbstractListModel, RegistryObserver):
+    """Flat list model over the connection registry, in insertion order"""
+
+    def __init__(self, registry, parent=None):
+        super().__init__(parent)
+        self.registry = registry
+        # Optional BandwidthSampler providing SamplesRole
+        self.sampler = None
+        self._ids = []
+        self._rows = {}
+        # Up with an older version of their profile, until they reconnect
+        self._stale = set()
+        registry.subscribe(self)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._ids)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        connection_id = self._ids[index.row()]
+        if role == Qt.DisplayRole:
+            return self.registry.get(connection_id).name
+        if role == ConnectionIdRole:
+            return connection_id
+        if role == ConnectionRole:
+            return self.registry.get(connection_id)
+        if role == StateRole:
+            return self.registry.state(connection_id)
+        if role == SamplesRole:
+            return self.sampler.history(connection_id) if self.sampler else None
+        if role == StaleRole:
+            return connection_id in self._stale
+        return None
+
+    def connection_id(self, row):
+        return self._ids[row]
+
+    def row_of(self, connection_id):
+        return self._rows.get(connection_id)
+
+    def on_added(self, connection_id, connection):
+        self.on_added_many([(connection_id, connection)])
+
+    def on_added_many(self, added):
+        first = len(self._ids)
+        self.beginInsertRows(QModelIndex(), first, first + len(added) - 1)
+        for offset, (connection_id, _) in enumerate(added):
+            self._rows[connection_id] = first + offset
+            self._ids.append(connection_id)
+        self.endInsertRows()
+
+    def on_removed(self, connection_id, connection):
+        self._stale.discard(connection_id)
+        row = self._rows.pop(connection_id, None)
+        if row is None:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._ids[row]
+        for later_row in range(row, len(self._ids)):
+            self._rows[self._ids[later_row]] = later_row
+        self.endRemoveRows()
+
+    def on_changed(self, connection_id, old, new):
+        self._row_changed(connection_id)
+
+    def on_state_changed(self, connection_id, state):
+        if state not in (ConnectionState.CONNECTED, ConnectionState.RECONNECTING):
+            # Whatever comes up next reads the profile again (a soft restart doesn't)
+            self._stale.discard(connection_id)
+        self._row_changed(connection_id)
+
+    def profiles_changed(self, connection_ids, active_ids=()):
+        """Repaint rows whose profile changed; active ones are flagged for reconnect"""
+        self._stale.update(active_ids)
+        for connection_id in connection_ids:
+            self._row_changed(connection_id, [StaleRole])
+
+    def samples_changed(self, connection_ids):
+        for connection_id in connection_ids:
+            self._row_changed(connection_id, [SamplesRole])
+
+    def _row_changed(self, connection_id, roles=()):
+        row = self._rows.get(connection_id)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, list(roles))
+
+
+class ConnectionDelegate(QStyledItemDelegate):
+    """Paint a connection row (name, user, masked password and its buttons).
+
+    Rows own no widgets: the buttons are drawn with the current style and
+    clicks are hit-tested in editorEvent, so only visible rows cost anything.
+    Connected rows also get an rx/tx sparkline, drawn through one reused
+    polygon.
+    """
+    delete_clicked = pyqtSignal(int)
+    edit_clicked = pyqtSignal(int)
+    connect_clicked = pyqtSignal(int)
+
+    MARGIN = 10
+    SPACING = 4
+    BUTTON_HEIGHT = 26
+    ICON_BUTTON_WIDTH = 40
+    SPARKLINE_WIDTH = 120
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        style = QApplication.style()
+        self.delete_icon = style.standardIcon(QStyle.SP_TrashIcon)
+        self.edit_icon = style.standardIcon(QStyle.SP_FileDialogDetailedView)
+        self.rx_pen = QPen(QColor("#2E8B57"), 1)
+        self.tx_pen = QPen(QColor("#4169E1"), 1)
+        self._polygon = QPolygon(HISTORY)
+
+    def sizeHint(self, option, index):
+        line = option.fontMetrics.height() + self.SPACING
+        return QSize(option.rect.width(), 2 * self.MARGIN + 3 * line + self.BUTTON_HEIGHT)
+
+    def _button_rects(self, option):
+        rect = option.rect.adjusted(self.MARGIN, self.MARGIN, -self.MARGIN, -self.MARGIN)
+        top = rect.bottom() - self.BUTTON_HEIGHT + 1
+        delete_rect = QRect(rect.left(), top, self.ICON_BUTTON_WIDTH, self.BUTTON_HEIGHT)
+        edit_rect = QRect(delete_rect.right() + 1 + self.SPACING, top, self.ICON_BUTTON_WIDTH, self.BUTTON_HEIGHT)
+        connect_left = edit_rect.right() + 1 + self.SPACING
+        connect_rect = QRect(connect_left, top, rect.right() - connect_left + 1, self.BUTTON_HEIGHT)
+        return delete_rect, edit_rect, connect_rect
+
+    def paint(self, painter, option, index):
+        connection = index.data(ConnectionRole)
+        state = index.data(StateRole)
+        if connection is None:
+            return
+
+        painter.save()
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.alternateBase())
+
+        # Text lines: name, username, masked password
+        line = option.fontMetrics.height() + self.SPACING
+        text_rect = QRect(
+            option.rect.left() + self.MARGIN, option.rect.top() + self.MARGIN,
+            option.rect.width() - 2 * self.MARGIN, option.fontMetrics.height()
+        )
+        painter.setPen(option.palette.text().color())
+        painter.drawText(text_rect, Qt.AlignLeft | Qt.AlignVCenter, connection.name)
+        painter.drawText(text_rect.translated(0, line), Qt.AlignLeft | Qt.AlignVCenter,
+                         f"Usuario: {connection.username}")
+        painter.drawText(text_rect.translated(0, 2 * line), Qt.AlignLeft | Qt.AlignVCenter,
+                         f"Contraseña: {mask_password(connection.password)}")
+
+        history = index.data(SamplesRole)
+        if history is not None and history.count > 1:
+            rx, tx = history.latest()
+            painter.drawText(text_rect, Qt.AlignRight | Qt.AlignVCenter,
+                             f"↓ {format_rate(rx)}  ↑ {format_rate(tx)}")
+            spark_rect = QRect(
+                text_rect.right() - self.SPARKLINE_WIDTH + 1, text_rect.top() + line,
+                self.SPARKLINE_WIDTH, 2 * line - self.SPACING
+            )
+            self._paint_sparkline(painter, spark_rect, history)
+
+        # Buttons
+        delete_rect, edit_rect, connect_rect = self._button_rects(option)
+        style = option.widget.style() if option.widget else QApplication.style()
+        for rect, icon in ((delete_rect, self.delete_icon), (edit_rect, self.edit_icon)):
+            button = QStyleOptionButton()
+            button.rect = rect
+            button.icon = icon
+            button.iconSize = QSize(16, 16)
+            button.state = QStyle.State_Enabled | QStyle.State_Raised
+            style.drawControl(QStyle.CE_PushButton, button, painter, option.widget)
+
+        painter.setRenderHint(painter.Antialiasing)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor(STATE_COLORS.get(state, "#D3D3D3")))
+        painter.drawRoundedRect(connect_rect, 5, 5)
+        painter.setPen(Qt.black)
+        label = (state or ConnectionState.DISCONNECTED).value
+        if index.data(StaleRole):
+            label += " · perfil modificado, reconecte"
+        painter.drawText(connect_rect, Qt.AlignCenter, label)
+        painter.restore()
+
+    def _paint_sparkline(self, painter, rect, history):
+        peak = history.peak() or 1.0
+        step = (rect.width() - 1) / max(1, history.size - 1)
+        left = rect.right() - (history.count - 1) * step
+        # The polygon always has `size` points: until the history fills up,
+        # the leading ones repeat the oldest sample and draw nothing
+        polygon = self._polygon
+        padding = history.size - history.count
+        for series, pen in ((history.rx, self.rx_pen), (history.tx, self.tx_pen)):
+            for point in range(history.size):
+                i = max(0, point - padding)
+                value = series[history.position(i)]
+                polygon.setPoint(point, int(left + i * step), int(rect.bottom() - value / peak * (rect.height() - 1)))
+            painter.setPen(pen)
+            painter.drawPolyline(polygon)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            connection_id = index.data(ConnectionIdRole)
+            delete_rect, edit_rect, connect_rect = self._button_rects(option)
+            if delete_rect.contains(event.pos()):
+                self.delete_clicked.emit(connection_id)
+                return True
+            if edit_rect.contains(event.pos()):
+                self.edit_clicked.emit(connection_id)
+                return True
+            if connect_rect.contains(event.pos()):
+                self.connect_clicked.emit(connection_id)
+                return True
+        return super().editorEvent(event, model, option, index)
@@ -0,0 +1,129 @@
+import logging
+import os
+import queue
+import selectors
+import threading
+import time
+from collections import deque
+
+# Lines kept per connection; older ones are dropped as new ones arrive
+LOG_LINES = int(os.environ.get("VPN_APP_DAEMON_LOG_LINES", 2000))
+# Longer lines are cut, so a ring never holds more than LOG_LINES * MAX_LINE characters
+MAX_LINE = 1000
+
+
+def format_line(when, text):
+    return f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(when))} {text}"
+
+
+class DaemonLogs:
+    """Recent output of each connection's daemon, in fixed-size rings"""
+
+    def __init__(self, lines=LOG_LINES):
+        self.lines = lines
+        self._rings = {}
+        self._lock = threading.Lock()
+        # Bumped on every append, so viewers can tell when to redraw
+        self.generation = 0
+
+    def append(self, name, text, when=None):
+        entry = (when or time.time(), text.rstrip()[:MAX_LINE])
+        with self._lock:
+            ring = self._rings.get(name)
+            if ring is None:
+                ring = self._rings[name] = deque(maxlen=self.lines)
+            ring.append(entry)
+            self.generation += 1
+
+    def names(self):
+        with self._lock:
+            return sorted(self._rings)
+
+    def search(self, name, pattern=""):
+        """Formatted lines of a connection, only those containing pattern (any case)"""
+        with self._lock:
+            entries = list(self._rings.get(name, ()))
+        pattern = pattern.lower()
+        return [format_line(when, text) for when, text in entries if pattern in text.lower()]
+
+    def export(self, name, path, pattern=""):
+        lines = self.search(name, pattern)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.writelines(f"{line}\n" for line in lines)
+        return len(lines)
+
+
+class OutputPump:
+    """Drain the pipes of long-lived child processes from one thread.
+
+    A child that writes to a pipe nobody reads blocks once the pipe is
+    full; here every attached pipe is read as soon as it has data and
+    its lines go to the DaemonLogs ring of the given name.
+    """
+
+    def __init__(self, logs):
+        self.logs = logs
+        self.selector = selectors.DefaultSelector()
+        self._pending = queue.SimpleQueue()
+        self._wake_read, self._wake_write = os.pipe()
+        os.set_blocking(self._wake_read, False)
+        self.selector.register(self._wake_read, selectors.EVENT_READ)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def attach(self, name, pipe):
+        """Start draining a pipe (file object or descriptor) into the ring `name`"""
+        self._pending.put((name, pipe if isinstance(pipe, int) else pipe.fileno()))
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="vpn-output", daemon=True)
+                self._thread.start()
+        os.write(self._wake_write, b"x")
+
+    def _run(self):
+        partial = {}
+        while True:
+            for key, _ in self.selector.select():
+                fd = key.fileobj
+                if fd == self._wake_read:
+                    self._register_pending()
+                    continue
+                try:
+                    data = os.read(fd, 65536)
+                except BlockingIOError:
+                    continue
+                except OSError as e:
+                    logging.warning(f"Stopped reading output of {key.data}: {e}")
+                    data = b""
+                if not data:
+                    self.selector.unregister(fd)
+                    rest = partial.pop(fd, b"")
+                    if rest:
+                        self.logs.append(key.data, rest.decode(errors='replace'))
+                    continue
+                *lines, rest = (partial.pop(fd, b"") + data).split(b"\n")
+                for line in lines:
+                    self.logs.append(key.data, line.decode(errors='replace'))
+                # A line without end is still bounded
+                if len(rest) > MAX_LINE:
+                    self.logs.append(key.data, rest.decode(errors='replace'))
+                    rest = b""
+                if rest:
+                    partial[fd] = rest
+
+    def _register_pending(self):
+        try:
+            while os.read(self._wake_read, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        while True:
+            try:
+                name, fd = self._pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                os.set_blocking(fd, False)
+                self.selector.register(fd, selectors.EVENT_READ, name)
+            except (OSError, ValueError, KeyError) as e:
+                logging.warning(f"Cannot read output of {name}: {e}")
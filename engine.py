@@ -0,0 +1,741 @@
+import logging
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import applog
+from daemonlog import DaemonLogs, OutputPump
+from helper import HelperClient
+import metrics
+import tracing
+from management import EventLoopThread, ManagementClient, OPENVPN_STATES
+from models import ConnectionState
+from profiles import ProfileCompiler, ProfileError
+from remotes import LatencyProbe
+from supervisor import KEEPALIVE_TARGET, STALL_TIMEOUT, TunnelSupervisor, keepalive
+from tunnels import Tunnel, allocate_device, device_args, pid_alive, sa_name
+from vici import ViciError, ViciSession
+
+# Seconds a new OpenVPN daemon gets to bring its tunnel up
+CONNECT_TIMEOUT = float(os.environ.get("VPN_APP_CONNECT_TIMEOUT", 60))
+# charon does not push byte counts like OpenVPN's bytecount: ask this often
+IPSEC_COUNTER_INTERVAL = 1.0
+
+
+class SudoRunner:
+    """Fallback when the privileged helper is not running: one sudo per operation"""
+
+    def openvpn(self, profile, device, remote, sudo_password):
+        """Start openvpn as root for a profile; return (returncode, stderr)"""
+        process = subprocess.Popen(
+            ['sudo', '-S', 'openvpn', *profile.argv(device_args(device), remote)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True
+        )
+        _, stderr = process.communicate(f"{sudo_password}\n", timeout=30)
+        return process.returncode, stderr
+
+    def signal(self, pid, signal_name, sudo_password):
+        if not sudo_password:
+            raise Exception("No sudo password provided")
+        process = subprocess.Popen(
+            ['sudo', '-S', 'kill', f'-{signal_name}', str(pid)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True
+        )
+        _, stderr = process.communicate(f"{sudo_password}\n", timeout=5)
+        if process.returncode != 0 and pid_alive(pid):
+            raise RuntimeError(stderr.strip() or f"kill exited with status {process.returncode}")
+
+
+class OpenVPNBackend:
+    def __init__(self, loop, privileged, profiles=None, latency=None, on_log=None):
+        self.loop = loop
+        # Returns the helper client or the sudo runner, whichever is usable
+        self.privileged = privileged
+        self.profiles = profiles or ProfileCompiler()
+        self.latency = latency or LatencyProbe()
+        # on_log(connection name, line) for output that doesn't come through management
+        self.on_log = on_log or (lambda name, line: None)
+
+    def connect(self, connection, sudo_password, device, management):
+        """Start an OpenVPN daemon for a connection and return its pid.
+
+        Each tunnel gets its own pid/status files, tun device and management
+        socket, so several can run side by side and be stopped individually.
+        The daemon is held until `management` is attached, so no state or
+        byte count is missed, and this only returns once the daemon reports
+        the tunnel up (or fails after CONNECT_TIMEOUT seconds).
+        """
+        try:
+            profile = self.profiles.compile(connection.config_path)
+            tunnel = profile.tunnel
+            # Tunnel files are per profile: another connection may share this one
+            if tunnel.is_running():
+                raise RuntimeError(f"{connection.config_path} is already in use by another active connection")
+            tunnel.create()
+            tunnel.clear()
+            with tracing.span('latency_probe', remotes=len(profile.remotes)):
+                pinned_remote = self._pinned_remote(profile)
+
+            # Start OpenVPN as root; this returns once the daemon has forked.
+            # It gets no credentials: it asks for them once management is attached
+            with tracing.span('spawn_openvpn', device=device):
+                returncode, stderr = self.privileged().openvpn(profile, device, pinned_remote, sudo_password)
+            for line in stderr.splitlines():
+                self.on_log(connection.name, line)
+            if returncode != 0:
+                raise RuntimeError(stderr.strip() or f"openvpn exited with status {returncode}")
+
+            try:
+                with tracing.span('management_attach'):
+                    credentials = (connection.username, connection.password)
+                    pid = self.loop.run(self._attach(management, credentials), timeout=15)
+            except Exception as e:
+                # A held daemon would wait forever: make sure it goes away
+                self.disconnect(connection, {'pid': tunnel.read_pid()}, sudo_password)
+                raise RuntimeError(f"Could not attach to the OpenVPN management interface: {e}")
+
+            # Forking only means the daemon started: wait for it to say the tunnel is usable
+            try:
+                with tracing.span('wait_ready', timeout=CONNECT_TIMEOUT):
+                    self.loop.run(management.wait_ready(CONNECT_TIMEOUT), timeout=CONNECT_TIMEOUT + 5)
+            except Exception as e:
+                self.disconnect(connection, {'pid': pid, 'management': management}, sudo_password)
+                raise RuntimeError(str(e) or "Tunnel not up in time")
+
+            logging.info(f"OpenVPN connection started for {connection.config_path} (pid {pid}, {device})")
+            return pid
+
+        except Exception as e:
+            logging.error(f"Error connecting OpenVPN: {e}")
+            raise
+
+    def _pinned_remote(self, profile):
+        try:
+            return self.latency.fastest(profile.remotes, profile.config_path, udp_probes=not profile.tls_wrapped)
+        except Exception as e:
+            logging.warning(f"Latency probe failed for {profile.config_path}: {e}")
+            return None
+
+    async def _attach(self, management, credentials):
+        await management.connect()
+        pid = await management.pid()
+        await management.start(credentials=credentials)
+        return pid
+
+    def disconnect(self, connection, active, sudo_password):
+        """Stop only this connection's daemon"""
+        config_path = connection.config_path
+        try:
+            tunnel = active.get('tunnel') or Tunnel(config_path, create=False)
+            pid = active.get('pid') or tunnel.read_pid()
+            management = active.get('management')
+            if not pid or not pid_alive(pid):
+                logging.info(f"OpenVPN for {config_path} is not running")
+                tunnel.clear()
+                return True
+
+            logging.info(f"Terminating OpenVPN process {pid} for {config_path}")
+            stopped = False
+            if management is not None and management.connected:
+                # Ask the daemon itself; the socket closes as it exits
+                try:
+                    with tracing.span('management_sigterm', pid=pid):
+                        self.loop.run(self._terminate(management), timeout=5)
+                        stopped = self._wait_exit(pid, timeout=5)
+                except Exception as e:
+                    logging.warning(f"Management SIGTERM failed for {config_path}: {e}")
+            if not stopped:
+                with tracing.span('signal', pid=pid, signal='TERM'):
+                    self.privileged().signal(pid, 'TERM', sudo_password)
+                    stopped = self._wait_exit(pid, timeout=5)
+            if not stopped:
+                with tracing.span('signal', pid=pid, signal='KILL'):
+                    self.privileged().signal(pid, 'KILL', sudo_password)
+                logging.warning("Had to force kill OpenVPN process")
+            tunnel.clear()
+
+            logging.info(f"OpenVPN connection terminated for {config_path}")
+            return True
+
+        except subprocess.TimeoutExpired:
+            logging.error(f"Timeout while trying to stop OpenVPN for {config_path}")
+            raise
+        except Exception as e:
+            logging.error(f"Error disconnecting OpenVPN: {e}")
+            raise
+
+    async def _terminate(self, management):
+        await management.signal("SIGTERM")
+        await management.wait_closed()
+
+    def _wait_exit(self, pid, timeout):
+        deadline = time.monotonic() + timeout
+        while pid_alive(pid):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+
+class IPsecBackend:
+    """strongSwan through one persistent VICI connection to charon.
+
+    Each connection becomes an IKEv1 PSK + XAuth conn named after its
+    server, loaded together with its secrets on connect and unloaded on
+    disconnect. ike-updown events report SAs that go down on their own;
+    charon's control-log for our requests goes to on_log(server, line).
+    """
+
+    def __init__(self, privileged, on_down=None, on_log=None):
+        self.privileged = privileged
+        self.on_down = on_down or (lambda server: None)
+        self.on_log = on_log or (lambda server, line: None)
+        self.session = None
+        # IKE SA name -> server, for the SAs we loaded
+        self._names = {}
+        self._lock = threading.Lock()
+        # list-sa events of the list-sas request in progress
+        self._listed = None
+        self._list_lock = threading.Lock()
+
+    sa_name = staticmethod(sa_name)
+
+    def _session(self):
+        with self._lock:
+            if self.session is None or not self.session.connected:
+                self.session = self._open_session()
+            return self.session
+
+    def _open_session(self):
+        try:
+            session = ViciSession.open(on_event=self._on_event, on_closed=self._on_closed)
+        except PermissionError:
+            # Only root may talk to charon: let the helper open the socket
+            runner = self.privileged()
+            if not hasattr(runner, 'open_vici'):
+                raise RuntimeError("charon's VICI socket needs root and the privileged helper is not running")
+            session = ViciSession(runner.open_vici(), self._on_event, self._on_closed)
+        for event in ('ike-updown', 'child-updown', 'control-log', 'list-sa'):
+            session.register(event)
+        return session
+
+    def connect(self, connection, sudo_password):
+        server = connection.config_path
+        name = self.sa_name(server)
+        session = self._session()
+        self._names[name] = server
+        try:
+            session.request('load-shared', {
+                'id': f"{name}-psk", 'type': 'IKE', 'data': connection.shared_secret, 'owners': [server]
+            })
+            session.request('load-shared', {
+                'id': f"{name}-xauth", 'type': 'XAUTH', 'data': connection.password, 'owners': [connection.username]
+            })
+            session.request('load-conn', {name: {
+                'version': 1,
+                'remote_addrs': [server],
+                'vips': ['0.0.0.0'],
+                'local-1': {'auth': 'psk'},
+                'local-2': {'auth': 'xauth', 'xauth_id': connection.username},
+                'remote-1': {'auth': 'psk', 'id': server},
+                'children': {name: {'remote_ts': ['0.0.0.0/0'], 'start_action': 'none'}}
+            }})
+            session.request('initiate', {'ike': name, 'child': name, 'timeout': 30000, 'loglevel': 1}, timeout=40)
+        except Exception as e:
+            logging.error(f"Error connecting IPsec: {e}")
+            self._unload(session, name)
+            raise
+        logging.info(f"IPsec connection established with {server}")
+
+    def disconnect(self, connection, active, sudo_password):
+        server = connection.config_path
+        name = self.sa_name(server)
+        session = self._session()
+        try:
+            session.request('terminate', {'ike': name, 'timeout': 10000, 'loglevel': 1}, timeout=20)
+        except ViciError as e:
+            if 'no matching' not in str(e):
+                logging.error(f"Error disconnecting IPsec: {e}")
+                raise
+            logging.info(f"IPsec SA for {server} was already down")
+        self._unload(session, name)
+        logging.info(f"IPsec connection terminated for {server}")
+        return True
+
+    def counters(self, server):
+        """Cumulative (bytes_in, bytes_out) of the SA for a server, or None if it is not up"""
+        name = self.sa_name(server)
+        session = self._session()
+        with self._list_lock:
+            self._listed = {}
+            try:
+                session.request('list-sas', {'ike': name, 'noblock': 'yes'}, timeout=10)
+            finally:
+                listed, self._listed = self._listed, None
+        sa = listed.get(name)
+        if not isinstance(sa, dict):
+            return None
+        children = [child for child in sa.get('child-sas', {}).values() if isinstance(child, dict)]
+        return (sum(int(child.get('bytes-in', 0)) for child in children),
+                sum(int(child.get('bytes-out', 0)) for child in children))
+
+    def _unload(self, session, name):
+        self._names.pop(name, None)
+        for command, message in (('unload-conn', {'name': name}),
+                                 ('unload-shared', {'id': f"{name}-psk"}),
+                                 ('unload-shared', {'id': f"{name}-xauth"})):
+            try:
+                session.request(command, message)
+            except ViciError as e:
+                logging.warning(f"{command} failed for {name}: {e}")
+
+    def _on_event(self, event, message):
+        if event == 'list-sa':
+            if self._listed is not None:
+                self._listed.update(message)
+            return
+        if event == 'control-log':
+            server = self._names.get(message.get('ikesa-name'))
+            if server is not None:
+                self.on_log(server, f"[{message.get('group', '')}] {message.get('msg', '')}")
+            return
+        up = message.get('up') == 'yes'
+        for name in message:
+            server = self._names.get(name)
+            if server is None:
+                continue
+            logging.info(f"IPsec {event} for {server}: {'up' if up else 'down'}")
+            if event == 'ike-updown' and not up:
+                self.on_down(server)
+
+    def _on_closed(self):
+        """charon went away, and every SA with it"""
+        for server in list(self._names.values()):
+            self.on_down(server)
+        self._names.clear()
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+
+
+class ConnectionEngine:
+    """Run connection lifecycles on a worker pool.
+
+    connect() and disconnect() return immediately with a Future; progress
+    is reported through on_state(connection_id, state, error) and, while a
+    tunnel is up, on_counters(connection_id, bytes_in, bytes_out). Both are
+    called from worker or event loop threads, so GUI callers must marshal
+    them back to their own thread. Different connections proceed
+    concurrently.
+    """
+
+    def __init__(self, on_state=None, on_counters=None, max_workers=8, use_helper=True):
+        self.on_state = on_state or (lambda connection_id, state, error: None)
+        self.on_counters = on_counters or (lambda connection_id, bytes_in, bytes_out: None)
+        self.loop = EventLoopThread()
+        # Recent daemon output per connection name (plus 'helper'), for the log viewer
+        self.daemon_logs = DaemonLogs()
+        self.helper = HelperClient(output=OutputPump(self.daemon_logs))
+        # One-shot callers (the CLI) would pay for a helper they drop right away
+        self.use_helper = use_helper
+        self.sudo = SudoRunner()
+        self.profiles = ProfileCompiler()
+        self.backends = {
+            'openvpn': OpenVPNBackend(self.loop, self.privileged, self.profiles, on_log=self.daemon_logs.append),
+            'ipsec': IPsecBackend(self.privileged, on_down=self._on_ipsec_down, on_log=self._on_ipsec_log)
+        }
+        # Active VPNs by connection id; a profile edited while up keeps its entry
+        self.active_vpns = {}
+        self._lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="vpn-engine")
+        # Brings back the tunnels that die or stall while wanted
+        self.supervisor = TunnelSupervisor(self)
+        self._ipsec_poller = None
+        self._stopped = False
+
+    def privileged(self):
+        return self.helper if self.helper.running else self.sudo
+
+    @property
+    def needs_password(self):
+        """True until the privileged helper has been started"""
+        return not self.helper.running
+
+    def _ensure_helper(self, sudo_password):
+        """Start the helper with the first password we get; fall back to sudo on failure"""
+        if not self.use_helper or self.helper.running or not sudo_password:
+            return
+        try:
+            with tracing.span('start_helper'):
+                self.helper.start(sudo_password)
+        except Exception as e:
+            logging.warning(f"Privileged helper unavailable, using sudo per operation: {e}")
+
+    def check_profile(self, connection):
+        """Return why a connection's profile cannot be used, or None"""
+        if connection.type != 'openvpn':
+            return None
+        try:
+            self.profiles.compile(connection.config_path)
+        except ProfileError as e:
+            return str(e)
+        return None
+
+    def precompile(self, connections):
+        """Compile the OpenVPN profiles in the background"""
+        paths = [connection.config_path for connection in connections if connection.type == 'openvpn']
+        return self.pool.submit(self.profiles.precompile, paths)
+
+    def backend_for(self, connection_type):
+        backend = self.backends.get(connection_type)
+        if backend is None:
+            raise ValueError(f"No backend available for {connection_type} connections")
+        return backend
+
+    def adopt(self, connection_id, connection):
+        """Take over an OpenVPN tunnel started by another process (e.g. the CLI).
+
+        Returns True if its daemon is running. Once adopted, disconnect()
+        stops it through its management socket when it can be reached.
+        """
+        if connection.type != 'openvpn':
+            return False
+        tunnel = Tunnel(connection.config_path, create=False)
+        pid = tunnel.read_pid()
+        if not pid or not pid_alive(pid):
+            return False
+        management = ManagementClient(
+            str(tunnel.management_socket),
+            on_state=lambda name, fields: self._on_management_state(connection_id, connection, name, fields),
+            on_bytecount=lambda bytes_in, bytes_out: self._on_bytecount(connection_id, connection, bytes_in, bytes_out),
+            on_closed=lambda: self._on_management_closed(connection_id, connection)
+        )
+        try:
+            self.loop.run(management.connect(timeout=2), timeout=5)
+        except Exception as e:
+            # The daemon takes one management client at a time
+            logging.warning(f"Could not attach to the management socket of {connection.config_path}: {e}")
+            management = None
+        with self._lock:
+            self.active_vpns[connection_id] = {
+                'connection_id': connection_id,
+                'type': connection.type,
+                'username': connection.username,
+                'device': None,
+                'pid': pid,
+                'management': management,
+                'connection': connection,
+                'tunnel': tunnel,
+                'up': True
+            }
+        return True
+
+    def connect(self, connection_id, connection, sudo_password):
+        self.supervisor.watch(connection_id, connection, sudo_password)
+        return self.pool.submit(tracing.bind(self._connect), connection_id, connection, sudo_password)
+
+    def disconnect(self, connection_id, connection, sudo_password):
+        self.supervisor.forget(connection_id)
+        return self.pool.submit(tracing.bind(self._disconnect), connection_id, connection, sudo_password)
+
+    def is_active(self, connection_id):
+        return connection_id in self.active_vpns
+
+    def reconnect(self, connection_id, connection, sudo_password):
+        """Replace a lost tunnel (called by the supervisor)"""
+        return self.pool.submit(tracing.bind(self._reconnect), connection_id, connection, sudo_password)
+
+    def _reconnect(self, connection_id, connection, sudo_password):
+        with applog.context(connection=connection.name), tracing.span('reconnect', connection=connection.name, type=connection.type):
+            metrics.RECONNECTS.inc(connection.name)
+            with self._lock:
+                active = self.active_vpns.pop(connection_id, None)
+            if active is not None:
+                # A stalled daemon is still running and holds its device
+                try:
+                    self.backend_for(connection.type).disconnect(active.get('connection', connection), active, sudo_password)
+                except Exception as e:
+                    logging.warning(f"Could not tear down the lost tunnel of {connection.name}: {e}")
+            self.on_state(connection_id, ConnectionState.CONNECTING, None)
+            self._connect(connection_id, connection, sudo_password, reconnect=True)
+
+    def _connect(self, connection_id, connection, sudo_password, reconnect=False):
+        with applog.context(connection=connection.name), tracing.span('connect', connection=connection.name, type=connection.type) as span:
+            logging.info(f"Connecting VPN: {connection.config_path}")
+            try:
+                backend = self.backend_for(connection.type)
+                # A broken profile fails here, before anything is spawned
+                profile = None
+                dev_type = 'tun'
+                if connection.type == 'openvpn':
+                    with tracing.span('compile_profile'):
+                        profile = self.profiles.compile(connection.config_path)
+                    dev_type = profile.dev_type
+                self.on_state(connection_id, ConnectionState.AUTHENTICATING, None)
+                self._ensure_helper(sudo_password)
+                with self._lock:
+                    # Tunnel files and SA names follow the profile: two connections can't share one
+                    if any(vpn['type'] == connection.type and vpn['connection'].config_path == connection.config_path
+                           for key, vpn in self.active_vpns.items() if key != connection_id):
+                        raise RuntimeError(f"{connection.config_path} is already in use by another active connection")
+                    device = None
+                    if connection.type == 'openvpn':
+                        device = allocate_device(
+                            [vpn['device'] for vpn in self.active_vpns.values() if vpn.get('device')],
+                            dev_type
+                        )
+                    # Reserve the device while the daemon starts
+                    entry = self.active_vpns[connection_id] = {
+                        'connection_id': connection_id,
+                        'type': connection.type,
+                        'username': connection.username,
+                        'device': device,
+                        'pid': None,
+                        'connection': connection,
+                        # Where its pid and socket are, even if the profile path is edited later
+                        'tunnel': profile.tunnel if profile else None,
+                        # Daemon state changes are recorded under this connect's trace
+                        'trace': tracing.current()
+                    }
+                try:
+                    if connection.type == 'openvpn':
+                        management = ManagementClient(
+                            str(profile.tunnel.management_socket),
+                            on_state=lambda name, fields: self._on_management_state(connection_id, connection, name, fields),
+                            on_bytecount=lambda bytes_in, bytes_out: self._on_bytecount(connection_id, connection, bytes_in, bytes_out),
+                            on_closed=lambda: self._on_management_closed(connection_id, connection),
+                            on_log=lambda when, flags, message: self.daemon_logs.append(
+                                connection.name, f"{flags} {message}", when
+                            )
+                        )
+                        with self._lock:
+                            entry['management'] = management
+                        pid = backend.connect(connection, sudo_password, device, management)
+                    else:
+                        backend.connect(connection, sudo_password)
+                        pid = None
+                except Exception:
+                    with self._lock:
+                        if self.active_vpns.get(connection_id) is entry:
+                            del self.active_vpns[connection_id]
+                    if not self.supervisor.is_watched(connection_id):
+                        # Disconnected while starting; _disconnect reports the outcome
+                        logging.info(f"Connection of {connection.name} cancelled")
+                        return
+                    raise
+
+                # Store the daemon's pid for a targeted disconnect
+                with self._lock:
+                    cancelled = self.active_vpns.get(connection_id) is not entry or entry.get('stopping')
+                    if not cancelled:
+                        entry['pid'] = pid
+                        entry['up'] = True
+                        entry['rx_at'] = time.monotonic()
+                if cancelled:
+                    # Disconnected while starting, maybe before the pid was known: stop this daemon too
+                    logging.info(f"Connection of {connection.name} cancelled")
+                    try:
+                        backend.disconnect(connection, dict(entry, pid=pid), sudo_password)
+                    except Exception as e:
+                        logging.warning(f"Could not stop the cancelled tunnel of {connection.name}: {e}")
+                    return
+                self.supervisor.tunnel_up(connection_id)
+                if connection.type == 'ipsec':
+                    self._start_ipsec_poller()
+                self.on_state(connection_id, ConnectionState.CONNECTED, None)
+            except Exception as e:
+                logging.error(f"Failed to connect VPN: {e}")
+                span.fail(e)
+                metrics.FAILURES.inc(connection.name, 'connect', type(e).__name__)
+                if reconnect and self.supervisor.is_watched(connection_id):
+                    # Keep trying quietly: one dialog per attempt would be unbearable
+                    delay = self.supervisor.tunnel_failed(connection_id)
+                    logging.info(f"Next attempt for {connection.name} in {delay:.1f} s")
+                    self.on_state(connection_id, ConnectionState.ERROR, None)
+                else:
+                    self.supervisor.forget(connection_id)
+                    self.on_state(connection_id, ConnectionState.DISCONNECTED, f"Failed to connect VPN: {e}")
+
+    def _disconnect(self, connection_id, connection, sudo_password):
+        with applog.context(connection=connection.name), tracing.span('disconnect', connection=connection.name, type=connection.type) as span:
+            logging.info(f"Disconnecting VPN: {connection.config_path}")
+            try:
+                with self._lock:
+                    active = self.active_vpns.get(connection_id, {})
+                    active['stopping'] = True
+                self._ensure_helper(sudo_password)
+                # Stop what was started, even if the connection was edited since
+                self.backend_for(connection.type).disconnect(active.get('connection', connection), active, sudo_password)
+
+                with self._lock:
+                    self.active_vpns.pop(connection_id, None)
+                self.on_state(connection_id, ConnectionState.DISCONNECTED, None)
+            except Exception as e:
+                logging.error(f"Failed to disconnect VPN: {e}")
+                span.fail(e)
+                metrics.FAILURES.inc(connection.name, 'disconnect', type(e).__name__)
+                self.on_state(connection_id, ConnectionState.CONNECTED, f"Failed to disconnect VPN: {e}")
+
+    def _on_management_state(self, connection_id, connection, name, fields=()):
+        with self._lock:
+            active = self.active_vpns.get(connection_id)
+            if active is None or active.get('stopping'):
+                return
+            active['openvpn_state'] = name
+            if name == 'CONNECTED' and len(fields) > 3:
+                # Tunnel address, the source of keepalive probes
+                active['local_ip'] = fields[3]
+            tracing.mark(f"openvpn.{name}", parent=active.get('trace'))
+            if name == 'RECONNECTING' and active.get('up'):
+                metrics.RECONNECTS.inc(connection.name)
+            # The first CONNECTED is reported by _connect once the daemon is tracked
+            starting = not active.get('up')
+        state = OPENVPN_STATES.get(name)
+        if state == ConnectionState.CONNECTED and starting:
+            return
+        if state in (ConnectionState.CONNECTING, ConnectionState.AUTHENTICATING) and not starting:
+            # The daemon restarting an established tunnel, not a connect of ours
+            state = ConnectionState.RECONNECTING
+        if state is not None and state != ConnectionState.DISCONNECTING:
+            self.on_state(connection_id, state, None)
+
+    def _on_bytecount(self, connection_id, connection, bytes_in, bytes_out):
+        with self._lock:
+            active = self.active_vpns.get(connection_id)
+            if active is None:
+                return
+            if bytes_in > active.get('bytes_in', 0):
+                active['rx_at'] = time.monotonic()
+            active['bytes_in'] = bytes_in
+            active['bytes_out'] = bytes_out
+        metrics.BYTES_RECEIVED.set(bytes_in, connection.name)
+        metrics.BYTES_SENT.set(bytes_out, connection.name)
+        self.on_counters(connection_id, bytes_in, bytes_out)
+
+    def _start_ipsec_poller(self):
+        with self._lock:
+            if self._ipsec_poller is None and not self._stopped:
+                self._ipsec_poller = threading.Thread(target=self._poll_ipsec, name="vpn-ipsec-counters", daemon=True)
+                self._ipsec_poller.start()
+
+    def _poll_ipsec(self):
+        """Report the byte counts of the IPsec tunnels that are up, until there are none"""
+        backend = self.backends['ipsec']
+        while True:
+            with self._lock:
+                tunnels = [(connection_id, active['connection']) for connection_id, active in self.active_vpns.items()
+                           if active['type'] == 'ipsec' and active.get('up') and not active.get('stopping')]
+                if not tunnels or self._stopped:
+                    self._ipsec_poller = None
+                    return
+            for connection_id, connection in tunnels:
+                try:
+                    counters = backend.counters(connection.config_path)
+                except Exception as e:
+                    logging.warning(f"Cannot read IPsec counters of {connection.name}: {e}")
+                    continue
+                if counters is not None:
+                    self._on_bytecount(connection_id, connection, *counters)
+            time.sleep(IPSEC_COUNTER_INTERVAL)
+
+    def _on_management_closed(self, connection_id, connection):
+        """The daemon went away without us asking"""
+        with self._lock:
+            active = self.active_vpns.get(connection_id)
+            if active is None or active.get('stopping') or not active.get('pid'):
+                return
+        if self.supervisor.is_watched(connection_id):
+            self.tunnel_lost(connection_id, connection, "OpenVPN exited")
+            return
+        with self._lock:
+            self.active_vpns.pop(connection_id, None)
+        logging.warning(f"OpenVPN for {connection.config_path} exited unexpectedly")
+        self.on_state(connection_id, ConnectionState.DISCONNECTED, None)
+
+    def _ipsec_entry(self, server):
+        """The active IPsec entry for a server (charon names its SAs after the server); call with the lock"""
+        for active in self.active_vpns.values():
+            if active['type'] == 'ipsec' and active['connection'].config_path == server:
+                return active
+        return None
+
+    def _on_ipsec_down(self, server):
+        """An IPsec SA went down without us asking"""
+        with self._lock:
+            active = self._ipsec_entry(server)
+            if active is None or active.get('stopping') or not active.get('up'):
+                return
+            connection_id, connection = active['connection_id'], active['connection']
+        if self.supervisor.is_watched(connection_id):
+            self.tunnel_lost(connection_id, connection, "IPsec SA went down")
+            return
+        with self._lock:
+            self.active_vpns.pop(connection_id, None)
+        logging.warning(f"IPsec connection to {server} went down")
+        self.on_state(connection_id, ConnectionState.DISCONNECTED, None)
+
+    def _on_ipsec_log(self, server, line):
+        with self._lock:
+            active = self._ipsec_entry(server)
+            connection = active['connection'] if active else None
+        self.daemon_logs.append(connection.name if connection else server, line)
+
+    def check_health(self, connection_id):
+        """Return what is wrong with an established tunnel, or None"""
+        with self._lock:
+            active = self.active_vpns.get(connection_id)
+            if active is None or active.get('stopping') or not active.get('up'):
+                return None
+            pid = active.get('pid')
+            rx_at = active.get('rx_at')
+            local_ip = active.get('local_ip')
+            # Silence only means something for tunnels that report byte counters
+            counted = 'bytes_in' in active
+        if pid and not pid_alive(pid):
+            return "OpenVPN exited"
+        if not counted or not rx_at or time.monotonic() - rx_at < STALL_TIMEOUT:
+            return None
+        # Quiet is not dead: only a keepalive probe that goes unanswered is
+        if not (KEEPALIVE_TARGET and local_ip) or keepalive(local_ip):
+            return None
+        return f"nothing received for {STALL_TIMEOUT:.0f} s and no keepalive answer from {local_ip}"
+
+    def tunnel_lost(self, connection_id, connection, reason):
+        """Report a dead or stalled tunnel and schedule its replacement"""
+        with self._lock:
+            active = self.active_vpns.get(connection_id)
+            if active is None or active.get('stopping'):
+                return
+            # Kept for the teardown in _reconnect; callbacks stop here
+            active['stopping'] = True
+            active['up'] = False
+        logging.warning(f"Tunnel of {connection.name} lost: {reason}")
+        metrics.FAILURES.inc(connection.name, 'tunnel', 'TunnelLost')
+        self.on_state(connection_id, ConnectionState.ERROR, None)
+        delay = self.supervisor.tunnel_failed(connection_id)
+        if delay is not None:
+            logging.info(f"Reconnecting {connection.name} in {delay:.1f} s")
+
+    def shutdown(self):
+        self.supervisor.stop()
+        # Tunnels outlive us: their management sockets closing is not a drop
+        with self._lock:
+            self._stopped = True
+            for active in self.active_vpns.values():
+                active['stopping'] = True
+        self.pool.shutdown(wait=False)
+        self.loop.stop()
+        self.backends['ipsec'].close()
+        try:
+            self.helper.stop()
+        except Exception as e:
+            logging.error(f"Error stopping privileged helper: {e}")
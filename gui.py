@@ -0,0 +1,1154 @@
+import sys
+import time
+import subprocess
+import json
+import logging
+import sqlite3
+from PyQt5.QtWidgets import (
+    QApplication, QMainWindow, QVBoxLayout, QWidget, QPushButton,
+    QListView, QLabel, QMessageBox, QMenu, QSystemTrayIcon, QStyle, QDialog, QLineEdit, QTabWidget, QFileDialog
+)
+from PyQt5.QtCore import Qt, QObject, QThread, QTimer, pyqtSignal
+from PyQt5.QtGui import QIcon, QCursor
+import platform
+from pathlib import Path
+from models import ConnectionState, ConnectionObserver  # Import models
+from probe import DependencyProbe, install_library
+from updater import UpdateChecker
+from registry import ConnectionRegistry, RegistryObserver, UsageTracker
+from store import Connection, open_store
+from engine import ConnectionEngine
+from profiles import ProfileError, compile_profile
+from importer import import_profiles
+from connection_list import ConnectionListModel, ConnectionDelegate
+from config_watcher import ConfigWatcher
+from metrics import ConnectionMetrics, STARTUP, start_metrics_server
+from log_viewer import LogViewer
+from trace_viewer import TraceViewer
+import tracing
+from bandwidth import BandwidthSampler, SAMPLE_RATE, format_rate
+
+class MainWindow(QMainWindow):
+    def __init__(self):
+        started = time.perf_counter()
+        try:
+            super().__init__()
+            self.setWindowTitle("VPN Manager")
+            self.setGeometry(100, 100, 500, 400)
+
+            # Initialize tray menu and icon
+            self.tray_menu = QMenu()
+            self.tray_icon = QSystemTrayIcon(QIcon.fromTheme("network-vpn"), self)
+            self.tray_icon.setContextMenu(self.tray_menu)
+            self.tray_icon.show()
+
+            # Add "Open" action
+            open_action = self.tray_menu.addAction("Abrir")
+            open_action.triggered.connect(self.show)
+
+            # Add connections submenu, kept in sync with the registry
+            self.registry = ConnectionRegistry(open_store())
+            self.usage_tracker = UsageTracker(self.registry)
+            self.connection_metrics = ConnectionMetrics(self.registry)
+            self.metrics_server = start_metrics_server()
+            self.sampler = BandwidthSampler()
+            QApplication.instance().aboutToQuit.connect(self.save_connections)
+            self.connections_menu = self.tray_menu.addMenu("Conexiones")
+            self.tray_connections = TrayConnectionsMenu(self, self.connections_menu, self.registry)
+
+            # Add autostart option
+            self.autostart_action = self.tray_menu.addAction("Iniciar con el sistema")
+            self.autostart_action.setCheckable(True)
+            self.autostart_action.setChecked(self.is_autostart_enabled())
+            self.autostart_action.triggered.connect(self.toggle_autostart)
+
+            # Add separator
+            self.tray_menu.addSeparator()
+
+            # Add "Exit" action
+            exit_action = self.tray_menu.addAction("Salir")
+            exit_action.triggered.connect(QApplication.instance().quit)
+
+            # Configure button
+            self.configure_button = QPushButton("Configurar")
+            self.configure_button.clicked.connect(self.open_configure_window)
+            self.import_button = QPushButton("Importar perfiles...")
+            self.import_button.clicked.connect(self.open_import_window)
+
+            # List view setup: rows are painted by the delegate, not built from widgets
+            self.list_model = ConnectionListModel(self.registry, self)
+            self.list_model.sampler = self.sampler
+            self.list_delegate = ConnectionDelegate(self)
+            self.list_delegate.delete_clicked.connect(self.delete_item_from_list)
+            self.list_delegate.edit_clicked.connect(self.open_edit_window)
+            self.list_delegate.connect_clicked.connect(self.toggle_vpn)
+            self.list_view = QListView()
+            self.list_view.setModel(self.list_model)
+            self.list_view.setItemDelegate(self.list_delegate)
+            self.list_view.setUniformItemSizes(True)
+            self.list_view.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
+            self.list_view.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+
+            # State observers, created on first use
+            self.observers = {}
+
+            # Main layout
+            layout = QVBoxLayout()
+            layout.addWidget(self.configure_button)
+            layout.addWidget(self.import_button)
+            layout.addWidget(self.list_view)
+
+            connections_tab = QWidget()
+            connections_tab.setLayout(layout)
+
+            # Traces of recent connects/disconnects, read when the tab is opened
+            self.trace_viewer = TraceViewer()
+            self.tabs = QTabWidget()
+            self.tabs.addTab(connections_tab, "Conexiones")
+            self.tabs.addTab(self.trace_viewer, "Trazas")
+            self.tabs.currentChanged.connect(
+                lambda index: self.tabs.widget(index) is self.trace_viewer and self.trace_viewer.refresh()
+            )
+            self.setCentralWidget(self.tabs)
+
+            # Connection engine: lifecycles run on its worker pool and report back
+            # through engine_signals, which delivers them on the GUI thread
+            self.engine_signals = EngineSignals(self)
+            self.engine_signals.state_changed.connect(self.on_engine_state)
+            self.engine_signals.counters_changed.connect(self.on_engine_counters)
+            self.engine = ConnectionEngine(
+                on_state=self.engine_signals.emit_state,
+                on_counters=self.engine_signals.counters_changed.emit
+            )
+            QApplication.instance().aboutToQuit.connect(self.engine.shutdown)
+
+            # Recent output of the daemons, kept in memory by the engine
+            self.log_viewer = LogViewer(self.engine.daemon_logs)
+            self.tabs.addTab(self.log_viewer, "Registro")
+
+            # Dictionary for active VPNs
+            self.active_vpns = self.engine.active_vpns
+
+            # Bandwidth sampling, only while some tunnel is up
+            self.sample_timer = QTimer(self)
+            self.sample_timer.setInterval(int(1000 / SAMPLE_RATE))
+            self.sample_timer.timeout.connect(self.sample_bandwidth)
+
+            # Outside edits of the store and the profiles are applied as diffs;
+            # created first so it sees the loaded connections
+            self.config_watcher = ConfigWatcher(self.registry, self.registry.store.watch_paths, self)
+            self.config_watcher.store_changed.connect(self.reload_connections)
+            self.config_watcher.profiles_changed.connect(self.on_profiles_changed)
+
+            # Load connections after menu is initialized
+            self.load_connections()
+
+            # Check for updates
+            self.check_for_updates()
+
+            # Probe required libraries once the window is on screen
+            QTimer.singleShot(0, self.start_library_check)
+        except Exception as e:
+            logging.error(f"Error initializing MainWindow: {e}")
+        STARTUP.set(time.perf_counter() - started, 'main_window_init')
+
+    def start_library_check(self):
+        """Check for required libraries in the background"""
+        try:
+            self.library_check = LibraryCheckThread(self)
+            self.library_check.status.connect(self.show_library_check_status)
+            self.library_check.install_failed.connect(self.show_install_error)
+            self.library_check.start()
+        except Exception as e:
+            logging.error(f"Error checking required libraries: {e}")
+
+    def show_library_check_status(self, message):
+        # Keep in-progress messages until the next one replaces them
+        timeout = 0 if message.endswith("...") else 5000
+        self.statusBar().showMessage(message, timeout)
+
+    def show_install_error(self, install_cmd, error):
+        QMessageBox.critical(
+            self,
+            "Error",
+            f"No se pudo instalar la librería necesaria.\nComando: {install_cmd}\nError: {error}"
+        )
+
+    def add_connection(self, connection):
+        """Add a Connection to the registry (and, shortly after, to disk)"""
+        try:
+            return self.registry.add(connection)
+        except Exception as e:
+            logging.error(f"Error adding item to list: {e}")
+
+    def observer_for(self, connection_id):
+        """Return the ConnectionObserver driving this connection's state"""
+        observer = self.observers.get(connection_id)
+        if observer is None:
+            observer = ConnectionObserver(
+                None, self.tray_icon,
+                on_change=lambda state: self.registry.set_state(connection_id, state)
+            )
+            self.observers[connection_id] = observer
+        return observer
+
+    def toggle_vpn(self, connection_id):
+        """Connect or disconnect a registered connection without blocking the GUI"""
+        try:
+            with tracing.span('toggle_vpn') as span:
+                connection = self.registry.get(connection_id)
+                if not connection:
+                    logging.error(f"Unknown connection: {connection_id}")
+                    return
+                span.set(connection=connection.name)
+                observer = self.observer_for(connection_id)
+
+                # Ignore clicks while an operation is already in flight
+                if observer.state in (ConnectionState.CONNECTING, ConnectionState.AUTHENTICATING,
+                                      ConnectionState.DISCONNECTING):
+                    return
+
+                # Handle connection or disconnection; a tunnel waiting to be
+                # reconnected (ERROR) or reconnecting by itself is stopped
+                # like a connected one
+                if observer.state not in (ConnectionState.CONNECTED, ConnectionState.ERROR,
+                                          ConnectionState.RECONNECTING):
+                    # Reject a broken profile before asking for any password
+                    with tracing.span('check_profile'):
+                        profile_error = self.engine.check_profile(connection)
+                    if profile_error:
+                        QMessageBox.critical(self, "Error", f"Perfil no válido: {profile_error}")
+                        return
+
+                    observer.set_state(ConnectionState.CONNECTING)
+
+                    # Get sudo password if needed (only until the privileged helper runs)
+                    sudo_password = None
+                    if self.engine.needs_password:
+                        with tracing.span('get_sudo_password'):
+                            sudo_password = self.get_sudo_password()
+                        if not sudo_password:
+                            observer.set_state(ConnectionState.DISCONNECTED)
+                            return
+
+                    self.engine.connect(connection_id, connection, sudo_password)
+                else:
+                    sudo_password = None
+                    if self.engine.needs_password:
+                        with tracing.span('get_sudo_password'):
+                            sudo_password = self.get_sudo_password()
+                        if not sudo_password:
+                            return
+
+                    observer.set_state(ConnectionState.DISCONNECTING)
+                    self.engine.disconnect(connection_id, connection, sudo_password)
+        except Exception as e:
+            logging.error(f"Error in toggle_vpn: {e}")
+
+    def on_engine_state(self, connection_id, state, error):
+        """Apply a state reported by the connection engine (GUI thread)"""
+        try:
+            if connection_id in self.registry:
+                self.observer_for(connection_id).set_state(state)
+                self.update_sampling(connection_id, state)
+            if error:
+                QMessageBox.critical(self, "Error", error)
+        except Exception as e:
+            logging.error(f"Error applying connection state: {e}")
+
+    def update_sampling(self, connection_id, state):
+        """Start sampling a tunnel once it is up, stop when it goes down"""
+        if state == ConnectionState.CONNECTED and self.sampler.history(connection_id) is None:
+            device = self.engine.active_vpns.get(connection_id, {}).get('device')
+            observer = self.observer_for(connection_id)
+            self.sampler.track(connection_id, device, lambda: (observer.bytes_in, observer.bytes_out))
+        elif state in (ConnectionState.DISCONNECTED, ConnectionState.ERROR):
+            # A reconnected tunnel may come back on another device
+            self.sampler.untrack(connection_id)
+            self.tray_connections.update_tooltip()
+
+        if len(self.sampler) and not self.sample_timer.isActive():
+            self.sample_timer.start()
+        elif not len(self.sampler):
+            self.sample_timer.stop()
+
+    def sample_bandwidth(self):
+        try:
+            self.list_model.samples_changed(self.sampler.sample())
+            self.tray_connections.update_tooltip()
+        except Exception as e:
+            logging.error(f"Error sampling bandwidth: {e}")
+
+    def on_engine_counters(self, connection_id, bytes_in, bytes_out):
+        if connection_id in self.registry:
+            self.observer_for(connection_id).set_counters(bytes_in, bytes_out)
+
+    def open_configure_window(self):
+        try:
+            dialog = ConfigureDialog(self)
+            if dialog.exec_():
+                if hasattr(dialog, 'ipsec_config'):
+                    # IPSec configuration
+                    self.add_ipsec_connection(dialog.ipsec_config)
+                else:
+                    # OpenVPN configuration
+                    selected_name = dialog.get_selected_name()
+                    selected_file = dialog.get_selected_file()
+                    username = dialog.get_username()
+                    password = dialog.get_password()
+                    if selected_name and selected_file and username and password:
+                        self.add_connection(Connection(selected_name, selected_file, username, password))
+        except Exception as e:
+            logging.error(f"Error opening configure window: {e}")
+    
+    def open_import_window(self):
+        try:
+            dialog = ImportDialog(self)
+            if not dialog.exec_():
+                return
+            # Unpacking, hashing and validating a large bundle takes a while: not on this thread
+            self.import_thread = ImportThread(
+                dialog.source, dialog.get_username(), dialog.get_password(),
+                [connection for _, connection in self.registry.items()], self
+            )
+            self.import_thread.imported.connect(self.finish_import)
+            self.import_thread.failed.connect(self.show_import_error)
+            self.import_thread.finished.connect(lambda: self.import_button.setEnabled(True))
+            self.import_button.setEnabled(False)
+            self.statusBar().showMessage("Importando perfiles...")
+            self.import_thread.start()
+        except Exception as e:
+            logging.error(f"Error importing profiles: {e}")
+
+    def finish_import(self, result):
+        try:
+            # One batch: one store write, one model insert, one menu diff
+            self.registry.add_many(result.connections)
+            self.engine.precompile(result.connections)
+            self.statusBar().showMessage(result.summary(), 5000)
+            message = result.summary()
+            if result.invalid:
+                message += "\n\nNo válidos:\n" + "\n".join(error for _, error in result.invalid[:10])
+                if len(result.invalid) > 10:
+                    message += f"\n... y {len(result.invalid) - 10} más"
+            QMessageBox.information(self, "Importar perfiles", message)
+        except Exception as e:
+            logging.error(f"Error importing profiles: {e}")
+            self.show_import_error(str(e))
+
+    def show_import_error(self, error):
+        self.statusBar().clearMessage()
+        QMessageBox.critical(self, "Error", f"No se pudieron importar los perfiles: {error}")
+
+    def save_connections(self):
+        """Write any pending connection changes to disk now"""
+        try:
+            self.registry.store.flush()
+        except Exception as e:
+            logging.error(f"Error saving connections: {e}")
+
+    def load_connections(self):
+        """Cargar las conexiones desde un archivo JSON"""
+        try:
+            # Single batched insert: one model insert for the view, one menu diff
+            with tracing.span('load_connections') as span:
+                self.registry.load()
+                span.set(connections=len(self.registry))
+                self.engine.precompile(connection for _, connection in self.registry.items())
+        except json.JSONDecodeError as e:
+            logging.error(f"Error decoding connections.json: {e}")
+        except sqlite3.Error as e:
+            logging.error(f"Error reading connections database: {e}")
+        except Exception as e:
+            logging.error(f"Error loading connections: {e}")
+
+    def reload_connections(self):
+        """Apply outside edits of the store, touching only the connections that changed"""
+        try:
+            added, removed, changed = self.registry.reload()
+            if not (added or removed or changed):
+                return
+            logging.info(f"Connections changed on disk: {len(added)} added, {len(removed)} removed, "
+                         f"{len(changed)} changed")
+            for connection_id, connection in removed.items():
+                self.observers.pop(connection_id, None)
+                self.sampler.untrack(connection_id)
+                if self.engine.is_active(connection_id):
+                    # Its row is gone, and with it the only way to stop it
+                    self.engine.disconnect(connection_id, connection, self.sudo_password_for(connection))
+            moved = {connection_id: new for connection_id, (old, new) in changed.items()
+                     if new.config_path != old.config_path}
+            self.engine.precompile([self.registry.get(connection_id) for connection_id in added] + list(moved.values()))
+            # Tunnels up with the old profile keep it until they reconnect
+            active = [connection_id for connection_id in moved if self.engine.is_active(connection_id)]
+            if active:
+                self.list_model.profiles_changed(active, active)
+        except sqlite3.Error as e:
+            logging.error(f"Error reloading connections database: {e}")
+        except Exception as e:
+            logging.error(f"Error reloading connections: {e}")
+
+    def on_profiles_changed(self, paths):
+        """Re-parse the changed profiles and flag the tunnels still using the old ones"""
+        try:
+            paths = set(paths)
+            affected = [(connection_id, connection) for connection_id, connection in self.registry.items()
+                        if connection.config_path in paths]
+            if not affected:
+                return
+            self.engine.precompile(connection for _, connection in affected)
+            active = [connection_id for connection_id, _ in affected if self.engine.is_active(connection_id)]
+            self.list_model.profiles_changed([connection_id for connection_id, _ in affected], active)
+            for connection_id in active:
+                name = self.registry.get(connection_id).name
+                self.tray_icon.showMessage(
+                    "Perfil modificado", f"{name}: reconecte para aplicar los cambios", QSystemTrayIcon.Information
+                )
+        except Exception as e:
+            logging.error(f"Error applying changed profiles: {e}")
+
+    def delete_item_from_list(self, connection_id):
+        try:
+            # Eliminar el elemento de la lista
+            if connection_id in self.registry:
+                connection = self.registry.get(connection_id)
+                if self.engine.is_active(connection_id):
+                    # Its daemon would outlive the only row that can stop it
+                    QMessageBox.warning(self, "Eliminar", f"Desconecte {connection.name} antes de eliminarla.")
+                    return
+                self.registry.remove(connection_id)
+                self.observers.pop(connection_id, None)
+        except Exception as e:
+            logging.error(f"Error deleting item from list: {e}")
+
+    def open_edit_window(self, connection_id):
+        try:
+            connection = self.registry.get(connection_id)
+            if not connection:
+                return
+            if self.engine.is_active(connection_id):
+                # The running daemon belongs to the profile it was started with
+                QMessageBox.warning(self, "Editar", f"Desconecte {connection.name} antes de editarla.")
+                return
+            # Crear una nueva ventana de edición
+            dialog = EditDialog(
+                self, connection.name, connection.config_path,
+                connection.username, connection.password
+            )
+            if dialog.exec_():  # Si se cierra con "Aceptar"
+                new_name = dialog.get_selected_name()
+                new_file = dialog.get_selected_file()
+                new_username = dialog.get_username()
+                new_password = dialog.get_password()
+                if new_name and new_file and new_username and new_password:
+                    self.registry.update(  # Actualizar la lista, el menú y el archivo
+                        connection_id,
+                        name=new_name,
+                        config_path=new_file,
+                        username=new_username,
+                        password=new_password
+                    )
+        except Exception as e:
+            logging.error(f"Error opening edit window: {e}")
+
+    def sudo_password_for(self, connection):
+        """The saved sudo password of a connection, or ask for one while the engine needs it"""
+        if connection.sudo_password or not self.engine.needs_password:
+            return connection.sudo_password
+        with tracing.span('get_sudo_password'):
+            return self.get_sudo_password()
+
+    def get_sudo_password(self):
+        try:
+            # Crear un diálogo más informativo para la contraseña sudo
+            dialog = QDialog(self)
+            dialog.setWindowTitle("Autenticación requerida")  # Título más descriptivo
+            layout = QVBoxLayout()
+            
+            # Mensaje más descriptivo e informativo
+            label = QLabel("Se necesita clave sudo para seguir")
+            label.setWordWrap(True)  # Permite que el texto se ajuste al ancho del diálogo
+            
+            password_input = QLineEdit()
+            password_input.setEchoMode(QLineEdit.Password)
+            password_input.setPlaceholderText("Introduzca su contraseña")  # Texto de ayuda
+            
+            button = QPushButton("Aceptar")
+            button.clicked.connect(dialog.accept)
+            
+            layout.addWidget(label)
+            layout.addWidget(password_input)
+            layout.addWidget(button)
+            
+            dialog.setLayout(layout)
+            
+            if dialog.exec_() == QDialog.Accepted:
+                return password_input.text()
+            return ""
+        except Exception as e:
+            logging.error(f"Error getting sudo password: {e}")
+
+    def add_ipsec_connection(self, config):
+        try:
+            # Add IPSec connection to the list
+            self.add_connection(Connection.from_dict(config))
+        except Exception as e:
+            logging.error(f"Error adding IPSec connection: {e}")
+
+    def tray_icon_activated(self, reason):
+        """Handle tray icon activation"""
+        if reason == QSystemTrayIcon.DoubleClick:
+            self.show()
+
+    def handle_tray_activation_macos(self, reason):
+        """Special handler for macOS tray icon clicks"""
+        if reason == QSystemTrayIcon.Trigger:  # Single click in macOS
+            self.tray_icon.contextMenu().popup(QCursor.pos())
+        elif reason == QSystemTrayIcon.DoubleClick:
+            self.show()
+
+    def toggle_vpn_from_menu(self, connection_id):
+        """Handle VPN connection from tray menu"""
+        try:
+            self.toggle_vpn(connection_id)
+        except Exception as e:
+            logging.error(f"Error toggling VPN from menu: {e}")
+
+    def is_autostart_enabled(self):
+        """Check if application is set to autostart"""
+        autostart_file = Path.home() / '.config/autostart/vpn-app.desktop'
+        return autostart_file.exists()
+
+    def toggle_autostart(self, checked):
+        """Enable or disable autostart"""
+        try:
+            autostart_dir = Path.home() / '.config/autostart'
+            autostart_file = autostart_dir / 'vpn-app.desktop'
+            
+            if checked:
+                # Create autostart directory if it doesn't exist
+                autostart_dir.mkdir(parents=True, exist_ok=True)
+                
+                # Create desktop entry
+                entry_content = [
+                    "[Desktop Entry]",
+                    "Type=Application",
+                    "Name=VPN App",
+                    "Exec=" + sys.argv[0],
+                    "Terminal=false",
+                    "Hidden=false",
+                    "X-GNOME-Autostart-enabled=true"
+                ]
+                
+                # Write desktop entry file
+                with open(autostart_file, 'w') as f:
+                    f.write('\n'.join(entry_content))
+                
+                # Set proper permissions
+                autostart_file.chmod(0o755)
+            else:
+                # Remove desktop entry if it exists
+                if autostart_file.exists():
+                    autostart_file.unlink()
+        except Exception as e:
+            logging.error(f"Error toggling autostart: {e}")
+
+    def closeEvent(self, event):
+        """Handle window close event"""
+        try:
+            if platform.system() == 'Darwin':
+                # En macOS, ocultar la ventana en lugar de cerrarla
+                self.hide()
+                event.ignore()
+            elif self.tray_icon.isVisible():
+                self.hide()
+                self.tray_icon.showMessage(
+                    "VPN App",
+                    "La aplicación continúa ejecutándose en segundo plano",
+                    QIcon.fromTheme("network-vpn"),
+                    2000
+                )
+                event.ignore()
+        except Exception as e:
+            logging.error(f"Error handling close event: {e}")
+
+    def check_for_updates(self):
+        """Check for updates on GitHub without blocking the GUI thread"""
+        try:
+            self.update_check = UpdateCheckThread(self)
+            self.update_check.update_available.connect(self.notify_update_available)
+            self.update_check.start()
+        except Exception as e:
+            logging.error(f"Error checking for updates: {e}")
+
+    def notify_update_available(self, latest_version):
+        """Notify the user about an available update"""
+        try:
+            QMessageBox.information(
+                self,
+                "Actualización Disponible",
+                f"Una nueva versión ({latest_version}) está disponible.\n"
+                "Por favor, actualice la aplicación."
+            )
+        except Exception as e:
+            logging.error(f"Error notifying update: {e}")
+
+class TrayConnectionsMenu(RegistryObserver):
+    """Mirror the registry into the tray "Conexiones" submenu.
+
+    Registry diffs are queued per submenu and applied when that submenu is
+    about to be shown, touching only the actions that changed. The tray icon
+    and tooltip follow state changes immediately.
+    """
+
+    def __init__(self, window, menu, registry):
+        self.window = window
+        self.registry = registry
+
+        # Create submenus with platform-specific icons
+        if platform.system() == 'Darwin':
+            openvpn_icon = window.style().standardIcon(QStyle.SP_DriveNetIcon)
+            ipsec_icon = window.style().standardIcon(QStyle.SP_DriveNetIcon)
+            self.connected_icon = window.style().standardIcon(QStyle.SP_DialogApplyButton)
+            self.disconnected_icon = window.style().standardIcon(QStyle.SP_DialogCancelButton)
+        else:
+            openvpn_icon = QIcon.fromTheme("network-vpn")
+            ipsec_icon = QIcon.fromTheme("network-vpn")
+            self.connected_icon = QIcon.fromTheme("network-transmit-receive")
+            self.disconnected_icon = QIcon.fromTheme("network-offline")
+
+        self.menus = {
+            'openvpn': menu.addMenu("OpenVPN"),
+            'ipsec': menu.addMenu("IPsec")
+        }
+        self.menus['openvpn'].setIcon(openvpn_icon)
+        self.menus['ipsec'].setIcon(ipsec_icon)
+
+        self.empty_action = menu.addAction("No hay conexiones guardadas")
+        self.empty_action.setIcon(QIcon.fromTheme("dialog-warning"))
+        self.empty_action.setEnabled(False)
+
+        # Per submenu: realized actions and pending diffs (id -> present?)
+        self.actions = {kind: {} for kind in self.menus}
+        self.pending = {kind: {} for kind in self.menus}
+        self.counts = {kind: 0 for kind in self.menus}
+
+        for kind, submenu in self.menus.items():
+            submenu.aboutToShow.connect(lambda kind=kind: self.flush(kind))
+
+        registry.subscribe(self)
+        self.update_visibility()
+        self.update_tray_icon()
+
+    @staticmethod
+    def kind_of(connection):
+        return 'ipsec' if connection.type == 'ipsec' else 'openvpn'
+
+    def on_added(self, connection_id, connection):
+        kind = self.kind_of(connection)
+        self.counts[kind] += 1
+        self.pending[kind][connection_id] = True
+        self.update_visibility()
+
+    def on_removed(self, connection_id, connection):
+        kind = self.kind_of(connection)
+        self.counts[kind] -= 1
+        self.pending[kind][connection_id] = False
+        self.update_visibility()
+        self.update_tray_icon()
+
+    def on_changed(self, connection_id, old, new):
+        old_kind, new_kind = self.kind_of(old), self.kind_of(new)
+        if old_kind != new_kind:
+            self.counts[old_kind] -= 1
+            self.counts[new_kind] += 1
+            self.pending[old_kind][connection_id] = False
+            self.update_visibility()
+        self.pending[new_kind][connection_id] = True
+        if old.name != new.name:
+            self.update_tray_icon()
+
+    def on_state_changed(self, connection_id, state):
+        connection = self.registry.get(connection_id)
+        self.pending[self.kind_of(connection)][connection_id] = True
+        self.update_tray_icon()
+
+    def flush(self, kind=None):
+        """Apply the queued diffs to one submenu (or all of them)"""
+        try:
+            for kind in ([kind] if kind else list(self.menus)):
+                submenu = self.menus[kind]
+                actions = self.actions[kind]
+                for connection_id, present in self.pending[kind].items():
+                    action = actions.get(connection_id)
+                    if not present:
+                        if action:
+                            submenu.removeAction(action)
+                            action.deleteLater()
+                            del actions[connection_id]
+                        continue
+
+                    connection = self.registry.get(connection_id)
+                    if action is None:
+                        action = submenu.addAction(connection.name)
+                        action.triggered.connect(
+                            lambda checked, cid=connection_id: self.window.toggle_vpn_from_menu(cid)
+                        )
+                        actions[connection_id] = action
+                    else:
+                        action.setText(connection.name)
+
+                    # Set icon based on connection status
+                    if self.registry.state(connection_id) == ConnectionState.CONNECTED:
+                        action.setIcon(self.connected_icon)
+                    else:
+                        action.setIcon(self.disconnected_icon)
+                self.pending[kind].clear()
+        except Exception as e:
+            logging.error(f"Error updating connections menu: {e}")
+
+    def update_visibility(self):
+        # Hide empty submenus
+        for kind, submenu in self.menus.items():
+            submenu.menuAction().setVisible(self.counts[kind] > 0)
+        self.empty_action.setVisible(len(self.registry) == 0)
+
+    def update_tray_icon(self):
+        # Update main tray icon based on active connection
+        tray_icon = self.window.tray_icon
+        connected = self.registry.connected()
+        if connected:
+            tray_icon.setIcon(self.connected_icon)
+        else:
+            tray_icon.setIcon(self.disconnected_icon)
+        self.update_tooltip()
+
+    def update_tooltip(self):
+        tray_icon = self.window.tray_icon
+        connected = self.registry.connected()
+        if not connected:
+            tray_icon.setToolTip("VPN Desconectada")
+            return
+        tooltip = f"VPN Conectada: {self.registry.get(connected[0]).name}"
+        history = self.window.sampler.history(connected[0])
+        if history is not None and history.count:
+            rx, tx = history.latest()
+            tooltip += (f"\n↓ {history.sparkline('rx')} {format_rate(rx)}"
+                        f"\n↑ {history.sparkline('tx')} {format_rate(tx)}")
+        tray_icon.setToolTip(tooltip)
+
+class EngineSignals(QObject):
+    """Carry connection engine callbacks from worker threads to the GUI thread"""
+    state_changed = pyqtSignal(int, object, str)
+    # Python ints: byte counters outgrow a C int
+    counters_changed = pyqtSignal(int, object, object)
+
+    def emit_state(self, connection_id, state, error):
+        self.state_changed.emit(connection_id, state, error or "")
+
+class LibraryCheckThread(QThread):
+    """Probe (and if needed install) the VPN binaries off the GUI thread"""
+    status = pyqtSignal(str)
+    install_failed = pyqtSignal(str, str)
+
+    def __init__(self, parent=None, probe=None):
+        super().__init__(parent)
+        self.probe = probe or DependencyProbe()
+
+    def run(self):
+        try:
+            results = self.probe.run()
+            for lib, path in results.items():
+                if path:
+                    continue
+                install_cmd = f"brew install {lib}"
+                logging.warning(f"{lib} no encontrado. Intentando instalar...")
+                self.status.emit(f"Instalando {lib}...")
+                try:
+                    install_library(install_cmd)
+                    self.probe.probe(lib)
+                except (OSError, subprocess.CalledProcessError) as e:
+                    logging.error(f"Error al instalar la librería: {e}")
+                    self.install_failed.emit(install_cmd, str(e))
+            self.status.emit("Librerías comprobadas")
+        except Exception as e:
+            logging.error(f"Error checking required libraries: {e}")
+
+class ImportThread(QThread):
+    """Read and validate profiles to import off the GUI thread"""
+    imported = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, source, username, password, existing, parent=None):
+        super().__init__(parent)
+        self.source = source
+        self.username = username
+        self.password = password
+        self.existing = existing
+
+    def run(self):
+        try:
+            self.imported.emit(import_profiles(self.source, self.username, self.password, existing=self.existing))
+        except (OSError, ProfileError) as e:
+            self.failed.emit(str(e))
+        except Exception as e:
+            logging.error(f"Error importing profiles: {e}")
+            self.failed.emit(str(e))
+
+class UpdateCheckThread(QThread):
+    """Run the update check off the GUI thread"""
+    update_available = pyqtSignal(str)
+
+    def __init__(self, parent=None, checker=None):
+        super().__init__(parent)
+        self.checker = checker or UpdateChecker()
+
+    def run(self):
+        try:
+            latest_version = self.checker.check()
+            if latest_version:
+                self.update_available.emit(latest_version)
+        except Exception as e:
+            logging.error(f"Error checking for updates: {e}")
+
+class ConfigureDialog(QDialog):
+    def __init__(self, parent=None):
+        try:
+            super().__init__(parent)
+            self.setWindowTitle("Configurar")
+            self.setGeometry(150, 150, 400, 300)  # Made window taller
+
+            # Create tab widget
+            self.tab_widget = QTabWidget()
+            
+            # Create tabs
+            self.openvpn_tab = QWidget()
+            self.ipsec_tab = QWidget()
+            
+            # Add tabs to widget
+            self.tab_widget.addTab(self.openvpn_tab, "OpenVPN")
+            self.tab_widget.addTab(self.ipsec_tab, "IPSec")
+            
+            # Setup OpenVPN tab
+            self.setup_openvpn_tab()
+            
+            # Setup IPSec tab
+            self.setup_ipsec_tab()
+            
+            # Main layout
+            main_layout = QVBoxLayout()
+            main_layout.addWidget(self.tab_widget)
+            self.setLayout(main_layout)
+        except Exception as e:
+            logging.error(f"Error initializing ConfigureDialog: {e}")
+
+    def setup_openvpn_tab(self):
+        try:
+            layout = QVBoxLayout()
+            
+            # Original OpenVPN widgets
+            self.name_label = QLabel("Nombre:")
+            self.name_input = QLineEdit()
+            
+            self.username_label = QLabel("Usuario:")
+            self.username_input = QLineEdit()
+            
+            self.password_label = QLabel("Contraseña:")
+            self.password_input = QLineEdit()
+            self.password_input.setEchoMode(QLineEdit.Password)
+            
+            self.add_file_button = QPushButton("+")
+            self.add_file_button.clicked.connect(self.open_file_explorer)
+            
+            self.file_label = QLabel("Ningún archivo seleccionado")
+            
+            self.save_button = QPushButton("Guardar")
+            self.save_button.clicked.connect(self.accept)
+            
+            # Add widgets to layout
+            layout.addWidget(self.name_label)
+            layout.addWidget(self.name_input)
+            layout.addWidget(self.username_label)
+            layout.addWidget(self.username_input)
+            layout.addWidget(self.password_label)
+            layout.addWidget(self.password_input)
+            layout.addWidget(self.add_file_button)
+            layout.addWidget(self.file_label)
+            layout.addWidget(self.save_button)
+            
+            self.openvpn_tab.setLayout(layout)
+        except Exception as e:
+            logging.error(f"Error setting up OpenVPN tab: {e}")
+
+    def setup_ipsec_tab(self):
+        try:
+            layout = QVBoxLayout()
+            
+            # IPSec specific widgets
+            self.ipsec_name_label = QLabel("Nombre:")
+            self.ipsec_name_input = QLineEdit()
+            
+            self.server_label = QLabel("Servidor:")
+            self.server_input = QLineEdit()
+            
+            self.shared_secret_label = QLabel("Secreto Compartido:")
+            self.shared_secret_input = QLineEdit()
+            self.shared_secret_input.setEchoMode(QLineEdit.Password)
+            
+            self.ipsec_username_label = QLabel("Usuario:")
+            self.ipsec_username_input = QLineEdit()
+            
+            self.ipsec_password_label = QLabel("Contraseña:")
+            self.ipsec_password_input = QLineEdit()
+            self.ipsec_password_input.setEchoMode(QLineEdit.Password)
+            
+            self.ipsec_save_button = QPushButton("Guardar")
+            self.ipsec_save_button.clicked.connect(self.save_ipsec)
+            
+            # Add widgets to layout
+            layout.addWidget(self.ipsec_name_label)
+            layout.addWidget(self.ipsec_name_input)
+            layout.addWidget(self.server_label)
+            layout.addWidget(self.server_input)
+            layout.addWidget(self.shared_secret_label)
+            layout.addWidget(self.shared_secret_input)
+            layout.addWidget(self.ipsec_username_label)
+            layout.addWidget(self.ipsec_username_input)
+            layout.addWidget(self.ipsec_password_label)
+            layout.addWidget(self.ipsec_password_input)
+            layout.addWidget(self.ipsec_save_button)
+            
+            self.ipsec_tab.setLayout(layout)
+        except Exception as e:
+            logging.error(f"Error setting up IPSec tab: {e}")
+
+    def save_ipsec(self):
+        try:
+            # Get IPSec configuration
+            config = {
+                'name': self.ipsec_name_input.text().strip(),
+                'server': self.server_input.text().strip(),
+                'shared_secret': self.shared_secret_input.text().strip(),
+                'username': self.ipsec_username_input.text().strip(),
+                'password': self.ipsec_password_input.text().strip(),
+                'type': 'ipsec'
+            }
+            
+            # Validate required fields
+            if all(config.values()):
+                self.ipsec_config = config
+                self.accept()
+            else:
+                # Show error message if fields are empty
+                error_dialog = QDialog(self)
+                error_dialog.setWindowTitle("Error")
+                layout = QVBoxLayout()
+                label = QLabel("Por favor, complete todos los campos")
+                button = QPushButton("Aceptar")
+                button.clicked.connect(error_dialog.accept)
+                layout.addWidget(label)
+                layout.addWidget(button)
+                error_dialog.setLayout(layout)
+                error_dialog.exec_()
+        except Exception as e:
+            logging.error(f"Error saving IPSec configuration: {e}")
+
+    def open_file_explorer(self):
+        try:
+            # Abrir el explorador de archivos para seleccionar un archivo .ovpn
+            options = QFileDialog.Options()
+            file_path, _ = QFileDialog.getOpenFileName(
+                self,
+                "Seleccionar archivo .ovpn",
+                "",
+                "Archivos OVPN (*.ovpn);;Todos los archivos (*)",
+                options=options
+            )
+
+            # Mostrar la ruta del archivo seleccionado
+            if file_path:
+                self.selected_file = file_path
+                try:
+                    compile_profile(file_path)
+                    self.file_label.setText(f"Seleccionado: {file_path}")
+                except ProfileError as e:
+                    self.file_label.setText(f"Seleccionado: {file_path}\nPerfil no válido: {e}")
+        except Exception as e:
+            logging.error(f"Error opening file explorer: {e}")
+
+    def get_selected_file(self):
+        return self.selected_file
+
+    def get_selected_name(self):
+        return self.name_input.text().strip()
+
+    def get_username(self):
+        return self.username_input.text().strip()
+
+    def get_password(self):
+        return self.password_input.text().strip()
+
+class ImportDialog(QDialog):
+    """Pick a folder or zip of .ovpn profiles and the credentials they share"""
+
+    def __init__(self, parent=None):
+        try:
+            super().__init__(parent)
+            self.setWindowTitle("Importar perfiles")
+            self.setGeometry(150, 150, 400, 220)
+            self.source = None
+
+            self.source_label = QLabel("Ninguna carpeta o zip seleccionado")
+            self.source_label.setWordWrap(True)
+            self.folder_button = QPushButton("Carpeta...")
+            self.folder_button.clicked.connect(self.choose_folder)
+            self.zip_button = QPushButton("Zip...")
+            self.zip_button.clicked.connect(self.choose_zip)
+
+            self.username_label = QLabel("Usuario:")
+            self.username_input = QLineEdit()
+            self.password_label = QLabel("Contraseña:")
+            self.password_input = QLineEdit()
+            self.password_input.setEchoMode(QLineEdit.Password)
+
+            self.import_button = QPushButton("Importar")
+            self.import_button.clicked.connect(self.accept_if_complete)
+
+            layout = QVBoxLayout()
+            layout.addWidget(self.source_label)
+            layout.addWidget(self.folder_button)
+            layout.addWidget(self.zip_button)
+            layout.addWidget(self.username_label)
+            layout.addWidget(self.username_input)
+            layout.addWidget(self.password_label)
+            layout.addWidget(self.password_input)
+            layout.addWidget(self.import_button)
+            self.setLayout(layout)
+        except Exception as e:
+            logging.error(f"Error initializing ImportDialog: {e}")
+
+    def choose_folder(self):
+        path = QFileDialog.getExistingDirectory(self, "Seleccionar carpeta con perfiles .ovpn")
+        if path:
+            self.set_source(path)
+
+    def choose_zip(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Seleccionar zip de perfiles", "", "Archivos zip (*.zip);;Todos los archivos (*)"
+        )
+        if path:
+            self.set_source(path)
+
+    def set_source(self, path):
+        self.source = path
+        self.source_label.setText(f"Seleccionado: {path}")
+
+    def accept_if_complete(self):
+        if self.source and self.get_username() and self.get_password():
+            self.accept()
+        else:
+            QMessageBox.warning(self, "Error", "Por favor, elija una carpeta o zip y complete usuario y contraseña")
+
+    def get_username(self):
+        return self.username_input.text().strip()
+
+    def get_password(self):
+        return self.password_input.text().strip()
+
+class EditDialog(QDialog):
+    def __init__(self, parent=None, name="", config_path="", username="", password=""):
+        try:
+            super().__init__(parent)
+            self.setWindowTitle("Editar Configuración")
+            self.setGeometry(150, 150, 400, 200)
+
+            self.selected_file = config_path  # Ruta del archivo seleccionado
+
+            # Label y campo de texto para el nombre
+            self.name_label = QLabel("Nombre:")
+            self.name_input = QLineEdit()
+            self.name_input.setText(name)
+
+            # Label y campo de texto para el usuario
+            self.username_label = QLabel("Usuario:")
+            self.username_input = QLineEdit()
+            self.username_input.setText(username)
+
+            # Label y campo de texto para la contraseña
+            self.password_label = QLabel("Contraseña:")
+            self.password_input = QLineEdit()
+            self.password_input.setEchoMode(QLineEdit.Password)
+            self.password_input.setText(password)
+
+            # Botón "+"
+            self.add_file_button = QPushButton("+")
+            self.add_file_button.clicked.connect(self.open_file_explorer)
+
+            # Botón "Guardar"
+            self.save_button = QPushButton("Guardar")
+            self.save_button.clicked.connect(self.accept)  # Cierra el diálogo con estado "Aceptar"
+
+            # Etiqueta para mostrar archivo seleccionado
+            self.file_label = QLabel(f"Seleccionado: {config_path}" if config_path else "Ningún archivo seleccionado")
+
+            # Layout principal
+            layout = QVBoxLayout()
+            layout.addWidget(self.name_label)
+            layout.addWidget(self.name_input)
+            layout.addWidget(self.username_label)
+            layout.addWidget(self.username_input)
+            layout.addWidget(self.password_label)
+            layout.addWidget(self.password_input)
+            layout.addWidget(self.add_file_button)
+            layout.addWidget(self.file_label)
+            layout.addWidget(self.save_button)
+            self.setLayout(layout)
+        except Exception as e:
+            logging.error(f"Error initializing EditDialog: {e}")
+
+    def open_file_explorer(self):
+        try:
+            # Abrir el explorador de archivos para seleccionar un archivo .ovpn
+            options = QFileDialog.Options()
+            file_path, _ = QFileDialog.getOpenFileName(
+                self,
+                "Seleccionar archivo .ovpn",
+                "",
+                "Archivos OVPN (*.ovpn);;Todos los archivos (*)",
+                options=options
+            )
+
+            # Mostrar la ruta del archivo seleccionado
+            if file_path:
+                self.selected_file = file_path
+                try:
+                    compile_profile(file_path)
+                    self.file_label.setText(f"Seleccionado: {file_path}")
+                except ProfileError as e:
+                    self.file_label.setText(f"Seleccionado: {file_path}\nPerfil no válido: {e}")
+        except Exception as e:
+            logging.error(f"Error opening file explorer: {e}")
+
+    def get_selected_file(self):
+        return self.selected_file
+
+    def get_selected_name(self):
+        return self.name_input.text().strip()
+
+    def get_username(self):
+        return self.username_input.text().strip()
+
+    def get_password(self):
+        return self.password_input.text().strip()
+
+
+def main():
+    """Run the tray application until it quits"""
+    try:
+        app = QApplication(sys.argv)
+        window = MainWindow()
+        window.show()
+        return app.exec_()
+    except Exception as e:
+        logging.critical(f"Critical error in main: {e}")
+        return 1
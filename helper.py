@@ -0,0 +1,464 @@
+import argparse
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import secrets
+import selectors
+import signal
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+from paths import runtime_dir
+from probe import REQUIRED_LIBRARIES, find_library
+from profiles import compile_profile
+from remotes import Remote
+from tunnels import SA_PREFIX, Tunnel, device_args
+from vici import (
+    CMD_REQUEST, CMD_RESPONSE, CMD_UNKNOWN, EVENT, EVENT_REGISTER, EVENT_UNKNOWN, EVENT_UNREGISTER, ViciError,
+    decode_message, decode_packet, encode_packet, find_vici_socket, pack_packet, read_packet
+)
+
+SIGNALS = {'TERM': signal.SIGTERM, 'KILL': signal.SIGKILL, 'HUP': signal.SIGHUP, 'USR1': signal.SIGUSR1}
+DEVICE_PATTERN = re.compile(r'^[A-Za-z0-9_.-]{1,15}$')
+
+
+class HelperError(Exception):
+    pass
+
+
+def helper_command():
+    """How to re-launch this program as the helper"""
+    if getattr(sys, 'frozen', False):
+        return [sys.executable, 'privileged-helper']
+    return [sys.executable, os.path.abspath(__file__)]
+
+
+def default_socket_path():
+    return str(runtime_dir() / 'helper.sock')
+
+
+def token_digest(token):
+    """What the helper prints after READY, so the GUI knows it got the right token"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def read_token(stream):
+    """Read the token line from the helper's stdin.
+
+    sudo -S only consumes the password line when it asks for one; with
+    NOPASSWD it reaches the helper too, so lines before the token are skipped.
+    """
+    for line in stream:
+        if line.startswith("TOKEN "):
+            return line[len("TOKEN "):].strip()
+    raise HelperError("No token received")
+
+
+def _is_openvpn(pid):
+    """Only OpenVPN daemons may be signalled through the helper"""
+    try:
+        with open(f'/proc/{pid}/comm') as file:
+            return file.read().strip().startswith('openvpn')
+    except OSError:
+        pass
+    try:
+        comm = subprocess.run(['ps', '-p', str(pid), '-o', 'comm='], capture_output=True, text=True).stdout
+        return os.path.basename(comm.strip()).startswith('openvpn')
+    except OSError:
+        return False
+
+
+def _ours(name):
+    return str(name).startswith(SA_PREFIX)
+
+
+def _require_ours(*names):
+    for name in names:
+        if not _ours(name):
+            raise ValueError(f"{name} is not a VPN App connection")
+
+
+def _has_key(message, key):
+    return key in message or any(_has_key(value, key) for value in message.values() if isinstance(value, dict))
+
+
+def _load_conn(message):
+    _require_ours(*message)
+    for conn in message.values():
+        if isinstance(conn, dict):
+            _require_ours(*conn.get('children', {}))
+    if _has_key(message, 'updown'):
+        raise ValueError("updown scripts are not allowed")
+
+
+def _named(*names, extra=()):
+    """Only these fields, and the connections or secrets they name must be ours"""
+    def check(message):
+        unexpected = set(message) - set(names) - set(extra)
+        if unexpected:
+            raise ValueError(f"Unexpected {', '.join(sorted(unexpected))}")
+        if not any(name in message for name in names):
+            raise ValueError(f"Missing {names[0]}")
+        _require_ours(*(message[name] for name in names if name in message))
+    return check
+
+
+# What the engine sends charon through the helper, and how each is checked
+VICI_COMMANDS = {
+    'load-conn': _load_conn,
+    'unload-conn': _named('name'),
+    'load-shared': _named('id', extra=('type', 'data', 'owners')),
+    'unload-shared': _named('id'),
+    'initiate': _named('ike', 'child', extra=('timeout', 'loglevel')),
+    'terminate': _named('ike', 'child', extra=('timeout', 'loglevel', 'force')),
+    'list-sas': lambda message: None
+}
+VICI_EVENTS = ('ike-updown', 'child-updown', 'control-log', 'list-sa')
+
+
+def _read_raw_packet(file):
+    header = file.read(4)
+    if len(header) < 4:
+        return None
+    length, = struct.unpack("!I", header)
+    payload = file.read(length)
+    if len(payload) < length or not payload:
+        return None
+    return decode_packet(payload)
+
+
+class ViciProxy:
+    """Relay one client's VICI session to charon.
+
+    charon's socket is root only and would let its holder run any updown
+    script, so the client never gets it: only the commands in VICI_COMMANDS
+    are passed on, on strongSwan connections named like ours and without
+    updown scripts, and events about other SAs are dropped.
+    """
+
+    def __init__(self, charon):
+        self.charon = charon
+        self.client = None
+        self._lock = threading.Lock()
+
+    def run(self, rfile, client):
+        """Relay until either side hangs up"""
+        self.client = client
+        threading.Thread(target=self._from_charon, name="vici-proxy", daemon=True).start()
+        try:
+            while True:
+                packet = _read_raw_packet(rfile)
+                if packet is None:
+                    break
+                refusal = self._check(*packet)
+                if refusal is None:
+                    self.charon.sendall(pack_packet(*packet))
+                else:
+                    self._send(refusal)
+        except (OSError, ViciError, struct.error) as e:
+            logging.warning(f"VICI relay stopped: {e}")
+        finally:
+            try:
+                self.charon.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.charon.close()
+
+    def _check(self, packet_type, name, data):
+        """Return the answer for a packet that may not reach charon, or None"""
+        if packet_type in (EVENT_REGISTER, EVENT_UNREGISTER):
+            return None if name in VICI_EVENTS else encode_packet(EVENT_UNKNOWN)
+        if packet_type != CMD_REQUEST or name not in VICI_COMMANDS:
+            return encode_packet(CMD_UNKNOWN)
+        try:
+            VICI_COMMANDS[name](decode_message(data))
+        except (ValueError, ViciError) as e:
+            logging.warning(f"Refused VICI {name}: {e}")
+            return encode_packet(CMD_RESPONSE, message={'success': 'no', 'errmsg': f"{name} refused: {e}"})
+        return None
+
+    def _from_charon(self):
+        try:
+            while True:
+                packet = read_packet(self.charon)
+                if packet is None:
+                    break
+                packet_type, name, data = packet
+                if packet_type == EVENT:
+                    message = self._our_event(name, decode_message(data))
+                    if message is not None:
+                        self._send(encode_packet(EVENT, name, message))
+                else:
+                    self._send(pack_packet(packet_type, name, data))
+        except (OSError, ViciError, struct.error) as e:
+            logging.warning(f"VICI relay stopped: {e}")
+        finally:
+            try:
+                self.client.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _our_event(name, message):
+        """The part of an event about our SAs, or None"""
+        if name == 'control-log':
+            return message if _ours(message.get('ikesa-name', '')) else None
+        ours = {key: value for key, value in message.items() if _ours(key)}
+        if not ours:
+            return None
+        if 'up' in message:
+            ours['up'] = message['up']
+        return ours
+
+    def _send(self, data):
+        with self._lock:
+            self.client.sendall(data)
+
+
+def _peer_uid(connection):
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return None
+    creds = connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    return struct.unpack('3i', creds)[1]
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                reply = self.server.helper.dispatch(json.loads(line), self.connection)
+                reply['ok'] = True
+            except Exception as e:
+                reply = {'ok': False, 'error': str(e)}
+            proxy = reply.pop('_vici', None)
+            self.wfile.write((json.dumps(reply) + "\n").encode())
+            self.wfile.flush()
+            if proxy is not None:
+                # From here on this connection carries VICI packets
+                proxy.run(self.rfile, self.connection)
+                return
+
+
+class PrivilegedHelper:
+    """Runs as root for the lifetime of one GUI session.
+
+    Requests arrive as JSON lines on a Unix socket owned by the GUI's user
+    and must carry the token the GUI handed over at launch. The helper
+    exits when its stdin (held open by the GUI) is closed.
+    """
+
+    def __init__(self, socket_path, token, uid):
+        self.socket_path = socket_path
+        self.token = token
+        self.uid = uid
+        self.openvpn = find_library(REQUIRED_LIBRARIES['openvpn']) or 'openvpn'
+
+    def serve(self):
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+        server = socketserver.ThreadingUnixStreamServer(self.socket_path, _RequestHandler)
+        server.daemon_threads = True
+        server.helper = self
+        os.chown(self.socket_path, self.uid, -1)
+        os.chmod(self.socket_path, 0o600)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        print(f"READY {token_digest(self.token)}", flush=True)
+        try:
+            sys.stdin.read()
+        finally:
+            server.shutdown()
+            os.unlink(self.socket_path)
+
+    def dispatch(self, request, connection):
+        if not hmac.compare_digest(str(request.get('token', '')), self.token):
+            raise PermissionError("Invalid token")
+        peer_uid = _peer_uid(connection)
+        if peer_uid is not None and peer_uid not in (self.uid, 0):
+            raise PermissionError("Unexpected peer")
+
+        op = request.get('op')
+        if op == 'ping':
+            return {}
+        if op == 'openvpn':
+            return self._openvpn(request)
+        if op == 'signal':
+            pid = int(request['pid'])
+            if not _is_openvpn(pid):
+                raise PermissionError(f"{pid} is not an OpenVPN process")
+            os.kill(pid, SIGNALS[request.get('signal', 'TERM')])
+            return {}
+        if op == 'vici':
+            # charon's socket is root only: connect as root and relay what the engine needs
+            path = find_vici_socket()
+            if not path:
+                raise HelperError("strongSwan VICI socket not found")
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(path)
+            except OSError:
+                sock.close()
+                raise
+            return {'_vici': ViciProxy(sock)}
+        raise ValueError(f"Unknown operation: {op}")
+
+    def _openvpn(self, request):
+        """Spawn OpenVPN for a profile; the command line is built here, never taken from the client"""
+        import pwd  # Unix only, like the helper itself
+
+        config_path = os.path.abspath(request['config_path'])
+        device = request['device']
+        if not DEVICE_PATTERN.match(device):
+            raise ValueError(f"Invalid device: {device}")
+        with open(config_path, 'rb') as file:
+            data = file.read()
+        # Rejects profiles that load plugins or place files; argv() disables their scripts
+        profile = compile_profile(config_path, data)
+        remote = request.get('remote')
+        if remote is not None:
+            remote = Remote(str(remote[0]), int(remote[1]), str(remote[2]))
+            if remote not in profile.remotes:
+                raise ValueError(f"{remote.key} is not a remote of {config_path}")
+        tunnel = Tunnel(config_path, base_dir=Path(self.socket_path).parent / 'tunnels', create=False)
+
+        # OpenVPN reads the copy that was checked, not a file the user could swap in the meantime
+        with tempfile.NamedTemporaryFile(suffix='.ovpn') as copy:
+            copy.write(data)
+            copy.flush()
+            args = profile.argv(
+                device_args(device), remote, tunnel=tunnel, user=pwd.getpwuid(self.uid).pw_name, config_file=copy.name
+            )
+            # Returns once the daemon has read its config and forked
+            process = subprocess.run(
+                [self.openvpn, *args], stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=30
+            )
+        return {'returncode': process.returncode, 'stderr': process.stderr}
+
+
+class HelperClient:
+    """GUI side of the privileged helper.
+
+    start() escalates once through sudo; afterwards openvpn(), signal()
+    and open_vici() are plain socket round trips. The sudo_password arguments are
+    accepted for interface parity with the per-operation sudo runner.
+    The helper's output goes to `output` (a daemonlog.OutputPump) once it
+    is up, so it can never block on a full pipe.
+    """
+
+    def __init__(self, socket_path=None, output=None):
+        self.socket_path = socket_path or default_socket_path()
+        self.output = output
+        self.process = None
+        self.token = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self, sudo_password, timeout=30):
+        with self._lock:
+            if self.running:
+                return
+            self.token = secrets.token_hex(32)
+            # -k: ask for the password even if sudo remembers it (NOPASSWD never asks;
+            # the helper then skips the password line)
+            cmd = ['sudo', '-k', '-S', *helper_command(),
+                   '--socket', self.socket_path, '--uid', str(os.getuid())]
+            self.process = subprocess.Popen(
+                cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                universal_newlines=True
+            )
+            self.process.stdin.write(f"{sudo_password}\nTOKEN {self.token}\n")
+            self.process.stdin.flush()
+
+            with selectors.DefaultSelector() as selector:
+                selector.register(self.process.stdout, selectors.EVENT_READ)
+                line = selector.select(timeout) and self.process.stdout.readline().strip()
+            if line != f"READY {token_digest(self.token)}":
+                self.process.kill()
+                stderr = self.process.stderr.read().strip()
+                self.process = None
+                raise HelperError(f"Privileged helper did not start: {stderr or line or 'no answer'}")
+            if self.output is not None:
+                self.output.attach('helper', self.process.stdout)
+                self.output.attach('helper', self.process.stderr)
+            logging.info("Privileged helper started")
+
+    def stop(self):
+        if self.running:
+            self.process.stdin.close()
+            self.process.wait(timeout=5)
+        self.process = None
+
+    def request(self, op, **params):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(60)
+            sock.connect(self.socket_path)
+            sock.sendall((json.dumps(dict(params, op=op, token=self.token)) + "\n").encode())
+            with sock.makefile('r') as reply_file:
+                line = reply_file.readline()
+        if not line:
+            raise HelperError("Privileged helper closed the connection")
+        reply = json.loads(line)
+        if not reply.pop('ok'):
+            raise HelperError(reply['error'])
+        return reply
+
+    def open_vici(self):
+        """Return a socket that speaks VICI to charon through the helper's relay"""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(10)
+            sock.connect(self.socket_path)
+            sock.sendall((json.dumps({'op': 'vici', 'token': self.token}) + "\n").encode())
+            # Byte by byte: what follows the reply line is VICI, for the session to read
+            data = b""
+            while not data.endswith(b"\n"):
+                chunk = sock.recv(1)
+                if not chunk:
+                    raise HelperError("Privileged helper closed the connection")
+                data += chunk
+            reply = json.loads(data)
+            if not reply.pop('ok'):
+                raise HelperError(reply['error'])
+            sock.settimeout(None)
+            return sock
+        except Exception:
+            sock.close()
+            raise
+
+    def openvpn(self, profile, device, remote=None, sudo_password=None):
+        """Start openvpn as root for a profile; return (returncode, stderr)"""
+        reply = self.request('openvpn', config_path=profile.config_path, device=device, remote=remote)
+        return reply['returncode'], reply['stderr']
+
+    def signal(self, pid, signal_name, sudo_password=None):
+        self.request('signal', pid=pid, signal=signal_name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="VPN App privileged helper")
+    parser.add_argument('--socket', required=True)
+    parser.add_argument('--uid', type=int, required=True)
+    args = parser.parse_args(argv)
+    token = read_token(sys.stdin)
+    PrivilegedHelper(args.socket, token, args.uid).serve()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Bulk import of OpenVPN profiles from a directory or a zip bundle.
+
+Profiles are read and validated on a thread pool, deduplicated by a hash
+of their normalized content (against each other and against the saved
+connections) and returned as Connection objects, so the caller can store
+them with a single add_many().
+"""
+import hashlib
+import logging
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from paths import state_dir
+from profiles import ProfileError, compile_profile
+from store import Connection
+
+IMPORT_WORKERS = min(8, (os.cpu_count() or 1) * 2)
+# A bundle that unpacks to more than this is refused (zip bombs)
+MAX_EXTRACTED_BYTES = 200 * 1024 * 1024
+
+
+def profiles_dir():
+    """Where profiles unpacked from bundles are kept"""
+    path = state_dir() / 'profiles'
+    path.mkdir(exist_ok=True)
+    return path
+
+
+def normalized_digest(data):
+    """Hash of a profile ignoring comments, blank lines, indentation and line endings"""
+    lines = []
+    for raw in data.decode(errors='replace').splitlines():
+        line = raw.strip()
+        if line and line[0] not in '#;':
+            lines.append(line)
+    return hashlib.sha256("\n".join(lines).encode()).hexdigest()
+
+
+def extract_bundle(zip_path, target=None):
+    """Unpack a zip under profiles_dir() and return the directory"""
+    zip_path = Path(zip_path)
+    with open(zip_path, 'rb') as file:
+        tag = hashlib.sha256(file.read()).hexdigest()[:8]
+    target = Path(target or profiles_dir() / f"{zip_path.stem}-{tag}")
+    with zipfile.ZipFile(zip_path) as bundle:
+        members = [member for member in bundle.infolist() if not member.is_dir()]
+        if sum(member.file_size for member in members) > MAX_EXTRACTED_BYTES:
+            raise ProfileError(f"{zip_path}: unpacks to more than {MAX_EXTRACTED_BYTES // 2 ** 20} MB")
+        root = target.resolve()
+        for member in members:
+            destination = (target / member.filename).resolve()
+            # No absolute paths or ../ escaping the target directory
+            if root not in destination.parents:
+                raise ProfileError(f"{zip_path}: unsafe path in bundle: {member.filename}")
+        target.mkdir(parents=True, exist_ok=True)
+        for member in members:
+            bundle.extract(member, target)
+    return target
+
+
+def find_profiles(directory):
+    return sorted(str(path) for path in Path(directory).rglob('*') if path.suffix.lower() == '.ovpn')
+
+
+def _check(path):
+    """(path, digest, error) for one profile; runs on the pool"""
+    try:
+        with open(path, 'rb') as file:
+            data = file.read()
+    except OSError as e:
+        return path, None, f"Cannot read {path}: {e.strerror}"
+    try:
+        compile_profile(path, data)
+    except ProfileError as e:
+        return path, None, str(e)
+    return path, normalized_digest(data), None
+
+
+def _digest_of(path):
+    try:
+        with open(path, 'rb') as file:
+            return normalized_digest(file.read())
+    except OSError:
+        return None
+
+
+def unique_name(stem, taken):
+    name = stem
+    number = 2
+    while name in taken:
+        name = f"{stem} ({number})"
+        number += 1
+    taken.add(name)
+    return name
+
+
+class ImportResult:
+    def __init__(self):
+        self.connections = []
+        self.duplicates = []  # (path, name of the connection or file it repeats)
+        self.invalid = []  # (path, error)
+
+    def summary(self):
+        return (f"{len(self.connections)} perfiles nuevos, {len(self.duplicates)} duplicados, "
+                f"{len(self.invalid)} no válidos")
+
+
+def import_profiles(source, username, password, existing=(), workers=IMPORT_WORKERS):
+    """Validate every .ovpn in a directory or zip and return an ImportResult.
+
+    existing is an iterable of the saved Connections: profiles with the
+    same content are skipped and their names are not reused.
+    """
+    # Saved connections keep these paths: they must not depend on the current directory
+    source = Path(source).resolve()
+    if zipfile.is_zipfile(source):
+        directory = extract_bundle(source)
+    elif source.is_dir():
+        directory = source
+    else:
+        raise ProfileError(f"{source} is neither a directory nor a zip file")
+    paths = find_profiles(directory)
+    existing = list(existing)
+
+    result = ImportResult()
+    taken = {connection.name for connection in existing}
+    known = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vpn-import") as pool:
+        saved = [connection for connection in existing if connection.type == 'openvpn']
+        for connection, digest in zip(saved, pool.map(_digest_of, [c.config_path for c in saved])):
+            if digest:
+                known.setdefault(digest, connection.name)
+        checked = list(pool.map(_check, paths))
+
+    for path, digest, error in checked:
+        if error:
+            result.invalid.append((path, error))
+        elif digest in known:
+            result.duplicates.append((path, known[digest]))
+        else:
+            name = unique_name(Path(path).stem, taken)
+            known[digest] = name
+            result.connections.append(Connection(name, path, username, password))
+    logging.info(f"Imported {source}: {len(result.connections)} new, {len(result.duplicates)} duplicates, "
+                 f"{len(result.invalid)} invalid")
+    return result
@@ -0,0 +1,103 @@
+import logging
+
+from PyQt5.QtCore import QTimer
+from PyQt5.QtGui import QFontDatabase
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QComboBox, QLineEdit, QPushButton, QPlainTextEdit, QFileDialog, QLabel
+)
+
+
+class LogViewer(QWidget):
+    """Recent daemon output of one connection, filtered by a search text"""
+    REFRESH_MS = 1000
+
+    def __init__(self, logs, parent=None):
+        super().__init__(parent)
+        self.logs = logs
+        self.shown_generation = None
+
+        self.connection_combo = QComboBox()
+        self.connection_combo.currentIndexChanged.connect(self.redraw)
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Buscar")
+        self.search_input.setClearButtonEnabled(True)
+        self.search_input.textChanged.connect(self.redraw)
+        self.export_button = QPushButton("Exportar...")
+        self.export_button.clicked.connect(self.export)
+        header = QHBoxLayout()
+        header.addWidget(self.connection_combo, 1)
+        header.addWidget(self.search_input, 2)
+        header.addWidget(self.export_button)
+
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        self.text.setLineWrapMode(QPlainTextEdit.NoWrap)
+        self.text.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        self.status = QLabel()
+
+        layout = QVBoxLayout()
+        layout.addLayout(header)
+        layout.addWidget(self.text)
+        layout.addWidget(self.status)
+        self.setLayout(layout)
+
+        # Only polls while visible, and only redraws when lines were added
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.REFRESH_MS)
+        self.timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self.timer.start()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.timer.stop()
+
+    def refresh(self):
+        if self.logs.generation == self.shown_generation:
+            return
+        names = self.logs.names()
+        if names != [self.connection_combo.itemText(i) for i in range(self.connection_combo.count())]:
+            current = self.connection_combo.currentText()
+            self.connection_combo.blockSignals(True)
+            self.connection_combo.clear()
+            self.connection_combo.addItems(names)
+            if current in names:
+                self.connection_combo.setCurrentIndex(names.index(current))
+            self.connection_combo.blockSignals(False)
+        self.redraw()
+
+    def redraw(self):
+        try:
+            self.shown_generation = self.logs.generation
+            name = self.connection_combo.currentText()
+            if not name:
+                self.text.clear()
+                self.status.setText("Sin salida de ningún proceso todavía")
+                return
+            lines = self.logs.search(name, self.search_input.text())
+            scrollbar = self.text.verticalScrollBar()
+            # Follow new output unless the user scrolled up to read
+            at_bottom = scrollbar.value() >= scrollbar.maximum()
+            position = scrollbar.value()
+            self.text.setPlainText("\n".join(lines))
+            scrollbar.setValue(scrollbar.maximum() if at_bottom else position)
+            self.status.setText(f"{len(lines)} líneas")
+        except Exception as e:
+            logging.error(f"Error showing daemon output: {e}")
+
+    def export(self):
+        name = self.connection_combo.currentText()
+        if not name:
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Exportar registro", f"{name}.log", "Registro (*.log *.txt)")
+        if not path:
+            return
+        try:
+            count = self.logs.export(name, path, self.search_input.text())
+            self.status.setText(f"{count} líneas exportadas a {path}")
+        except OSError as e:
+            logging.error(f"Error exporting daemon output of {name}: {e}")
+            self.status.setText(f"No se pudo exportar: {e}")
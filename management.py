@@ -0,0 +1,258 @@
+import asyncio
+import logging
+import threading
+
+from models import ConnectionState
+
+# OpenVPN management states and what they mean for the UI
+OPENVPN_STATES = {
+    'CONNECTING': ConnectionState.CONNECTING,
+    'RESOLVE': ConnectionState.CONNECTING,
+    'TCP_CONNECT': ConnectionState.CONNECTING,
+    'WAIT': ConnectionState.CONNECTING,
+    'RECONNECTING': ConnectionState.CONNECTING,
+    'AUTH': ConnectionState.AUTHENTICATING,
+    'AUTH_PENDING': ConnectionState.AUTHENTICATING,
+    'GET_CONFIG': ConnectionState.AUTHENTICATING,
+    'ASSIGN_IP': ConnectionState.AUTHENTICATING,
+    'ADD_ROUTES': ConnectionState.AUTHENTICATING,
+    'CONNECTED': ConnectionState.CONNECTED,
+    'EXITING': ConnectionState.DISCONNECTING,
+}
+
+
+class ManagementError(Exception):
+    pass
+
+
+def quote(value):
+    """Quote a command argument the way the management parser unescapes it"""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+class EventLoopThread:
+    """An asyncio loop running in a daemon thread, for use from worker threads"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="vpn-asyncio", daemon=True)
+        self.thread.start()
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+class ManagementClient:
+    """Client for OpenVPN's management interface on a Unix socket.
+
+    Real-time notifications (>STATE:, >BYTECOUNT:, ...) are dispatched to
+    the callbacks as they arrive; commands are serialized and return the
+    daemon's reply. Callbacks run on the event loop thread. With
+    --management-query-passwords the daemon asks for the credentials here
+    (>PASSWORD:Need 'Auth'), and they are answered from `credentials`, so
+    they never go through a file. The daemon is started held; once
+    released it is told not to hold again, and any later >HOLD: is
+    released too, so a soft restart (ping-restart, SIGUSR1) never leaves
+    it waiting for a client that may be gone.
+    """
+
+    def __init__(self, path, on_state=None, on_bytecount=None, on_closed=None, on_log=None):
+        self.path = path
+        self.on_state = on_state
+        self.on_bytecount = on_bytecount
+        self.on_log = on_log
+        self.on_closed = on_closed
+        self.reader = None
+        self.writer = None
+        self._replies = None
+        self._command_lock = None
+        self._read_task = None
+        self._closed = None
+        self._ready = None
+        self._auth_failed = None
+        self.ready_fields = None
+        self.credentials = None
+        self._released = False
+
+    @property
+    def connected(self):
+        return self.writer is not None and not self._closed.is_set()
+
+    async def connect(self, timeout=10.0, interval=0.05):
+        """Connect, retrying until the daemon has created its socket"""
+        self._replies = asyncio.Queue()
+        self._command_lock = asyncio.Lock()
+        self._closed = asyncio.Event()
+        self._ready = asyncio.Event()
+        self._auth_failed = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            try:
+                self.reader, self.writer = await asyncio.open_unix_connection(self.path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if loop.time() >= deadline:
+                    raise ManagementError(f"Management socket {self.path} not available")
+                await asyncio.sleep(interval)
+        self._read_task = asyncio.ensure_future(self._read_loop())
+
+    async def start(self, bytecount_interval=1, credentials=None):
+        """Subscribe to state, byte counts and log lines, then let a held daemon proceed.
+
+        credentials is the (username, password) to answer the daemon with.
+        """
+        self.credentials = credentials
+        await self.command("state on")
+        if bytecount_interval:
+            await self.command(f"bytecount {bytecount_interval}")
+        if self.on_log:
+            await self.command("log on")
+        # Restarts must not wait for us: the CLI leaves no client behind
+        await self.command("hold off")
+        await self.hold_release()
+        self._released = True
+
+    async def command(self, line, multiline=False):
+        """Send a command; return the SUCCESS text, or the lines up to END"""
+        async with self._command_lock:
+            if not self.connected:
+                raise ManagementError("Management connection closed")
+            self.writer.write(f"{line}\n".encode())
+            await self.writer.drain()
+            lines = []
+            while True:
+                reply = await self._replies.get()
+                if reply is None:
+                    raise ManagementError("Management connection closed")
+                if reply.startswith("ERROR:"):
+                    raise ManagementError(reply[6:].strip())
+                if not multiline and reply.startswith("SUCCESS:"):
+                    return reply[8:].strip()
+                if multiline and reply == "END":
+                    return lines
+                lines.append(reply)
+
+    async def wait_ready(self, timeout):
+        """Wait for the daemon's CONNECTED state and return its fields.
+
+        OpenVPN reports it when it logs "Initialization Sequence Completed",
+        i.e. once addresses and routes are in place. Raises ManagementError
+        if the daemon exits first, completes with errors or takes longer
+        than `timeout` seconds.
+        """
+        waiters = [asyncio.ensure_future(event.wait()) for event in (self._ready, self._closed, self._auth_failed)]
+        try:
+            await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+        if self._auth_failed.is_set():
+            raise ManagementError("Authentication failed: check the username and password")
+        if not self._ready.is_set():
+            if self._closed.is_set():
+                raise ManagementError("OpenVPN exited before the tunnel came up")
+            raise ManagementError(f"Tunnel not up after {timeout:.0f} s")
+        # CONNECTED,ERROR: "Initialization Sequence Completed With Errors"
+        if len(self.ready_fields) > 2 and self.ready_fields[2] == 'ERROR':
+            raise ManagementError("OpenVPN completed initialization with errors (routes or addresses missing)")
+        return self.ready_fields
+
+    async def hold_release(self):
+        return await self.command("hold release")
+
+    async def signal(self, name="SIGTERM"):
+        return await self.command(f"signal {name}")
+
+    async def pid(self):
+        reply = await self.command("pid")
+        return int(reply.split("=", 1)[1])
+
+    async def wait_closed(self):
+        await self._closed.wait()
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        if self._read_task is not None:
+            await asyncio.gather(self._read_task, return_exceptions=True)
+
+    async def _read_loop(self):
+        try:
+            while True:
+                raw = await self.reader.readline()
+                if not raw:
+                    break
+                line = raw.decode(errors='replace').rstrip("\r\n")
+                if line.startswith(">"):
+                    self._dispatch(line)
+                else:
+                    await self._replies.put(line)
+        except (ConnectionError, OSError) as e:
+            logging.warning(f"Management connection lost: {e}")
+        finally:
+            self._closed.set()
+            await self._replies.put(None)
+            if self.on_closed:
+                self.on_closed()
+
+    def _dispatch(self, line):
+        kind, _, payload = line[1:].partition(":")
+        try:
+            if kind == "STATE":
+                fields = payload.split(",")
+                if fields[1] == 'CONNECTED':
+                    self.ready_fields = fields
+                    self._ready.set()
+                if self.on_state:
+                    self.on_state(fields[1], fields)
+            elif kind == "BYTECOUNT" and self.on_bytecount:
+                bytes_in, bytes_out = payload.split(",")[:2]
+                self.on_bytecount(int(bytes_in), int(bytes_out))
+            elif kind == "PASSWORD":
+                self._on_password(payload)
+            elif kind == "HOLD" and self._released:
+                logging.info(f"OpenVPN is held again ({payload}); releasing it")
+                asyncio.ensure_future(self._release_again())
+            elif kind == "LOG" and self.on_log:
+                # time,flags,message (the message may contain commas)
+                when, flags, message = payload.split(",", 2)
+                self.on_log(int(when), flags, message)
+        except (IndexError, ValueError):
+            logging.warning(f"Unexpected management message: {line}")
+        except Exception as e:
+            logging.error(f"Error handling management message {line}: {e}")
+
+    def _on_password(self, payload):
+        if payload.startswith("Verification Failed"):
+            logging.warning(f"OpenVPN rejected the credentials: {payload}")
+            # Answering again would only repeat the same rejected password
+            self.credentials = None
+            self._auth_failed.set()
+            return
+        realm = payload.split("'")[1] if payload.count("'") >= 2 else None
+        if payload.startswith("Need") and realm == 'Auth' and self.credentials:
+            # Commands wait for replies this read loop delivers: send from a task
+            asyncio.ensure_future(self._send_credentials(realm, *self.credentials))
+        else:
+            logging.warning(f"Unanswered OpenVPN password request: {payload}")
+
+    async def _release_again(self):
+        try:
+            await self.hold_release()
+        except ManagementError as e:
+            logging.error(f"Error releasing OpenVPN from hold: {e}")
+
+    async def _send_credentials(self, realm, username, password):
+        try:
+            await self.command(f"username {quote(realm)} {quote(username)}")
+            await self.command(f"password {quote(realm)} {quote(password)}")
+        except ManagementError as e:
+            logging.error(f"Error sending credentials to OpenVPN: {e}")
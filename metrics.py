@@ -0,0 +1,241 @@
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from models import ConnectionState
+from registry import RegistryObserver
+
+# Opt-in: the endpoint only starts when a port is configured
+METRICS_PORT = int(os.environ.get("VPN_APP_METRICS_PORT", 0))
+
+DURATION_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """A metric family; series are keyed by their label values.
+
+    Updates take this family's lock for a dict update only. The scraper
+    copies the values under the same lock and formats outside of it.
+    """
+    kind = None
+
+    def __init__(self, name, help, labelnames=(), registry=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def remove_matching(self, label, value):
+        """Forget every series whose `label` equals `value`"""
+        position = self.labelnames.index(label)
+        with self._lock:
+            for key in [key for key in self._values if key[position] == value]:
+                del self._values[key]
+
+    def _snapshot(self):
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in self._snapshot():
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def set(self, value, *labels):
+        """For totals kept elsewhere (e.g. by the daemon)"""
+        with self._lock:
+            self._values[labels] = value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DURATION_BUCKETS, registry=None):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help, labelnames, registry)
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # Per-bucket (not cumulative) counts, then sum and count
+                series = self._values[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def _snapshot(self):
+        with self._lock:
+            return [(labels, list(series)) for labels, series in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in self._snapshot():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', '+Inf')])} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-2]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def forget_connection(self, name):
+        for metric in self.metrics:
+            if 'connection' in metric.labelnames:
+                metric.remove_matching('connection', name)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+CONNECTION_STATE = Gauge(
+    "vpn_connection_state", "1 for the current state of each connection", ("connection", "type", "state")
+)
+CONNECT_DURATION = Histogram(
+    "vpn_connect_duration_seconds", "Time from the connect click until the tunnel is up", ("connection",)
+)
+DISCONNECT_DURATION = Histogram(
+    "vpn_disconnect_duration_seconds", "Time from the disconnect click until the tunnel is down", ("connection",)
+)
+FAILURES = Counter(
+    "vpn_connection_failures_total", "Failed operations by exception type", ("connection", "operation", "exception")
+)
+BYTES_RECEIVED = Counter("vpn_bytes_received_total", "Bytes received through the tunnel", ("connection",))
+BYTES_SENT = Counter("vpn_bytes_sent_total", "Bytes sent through the tunnel", ("connection",))
+RECONNECTS = Counter("vpn_reconnects_total", "Tunnel reconnections", ("connection",))
+STARTUP = Gauge("vpn_app_startup_seconds", "Duration of startup phases", ("phase",))
+PROCESS_START = Gauge("process_start_time_seconds", "Start time of the process since the epoch")
+PROCESS_START.set(time.time())
+
+
+class ConnectionMetrics(RegistryObserver):
+    """Follow the registry: state gauges and connect/disconnect durations.
+
+    Durations start when the GUI moves a connection to CONNECTING or
+    DISCONNECTING (toggle_vpn does so on click) and end when it reaches
+    CONNECTED or DISCONNECTED.
+    """
+
+    def __init__(self, registry):
+        self.registry = registry
+        self._started = {}
+        registry.subscribe(self)
+
+    def on_added_many(self, added):
+        # Other states only get a series once the connection leaves this one
+        for connection_id, connection in added:
+            CONNECTION_STATE.set(1, connection.name, connection.type, ConnectionState.DISCONNECTED.name)
+
+    def on_removed(self, connection_id, connection):
+        self._started.pop(connection_id, None)
+        REGISTRY.forget_connection(connection.name)
+
+    def on_changed(self, connection_id, old, new):
+        if old.name != new.name:
+            REGISTRY.forget_connection(old.name)
+            self._set_state(new, self.registry.state(connection_id))
+
+    def on_state_changed(self, connection_id, state):
+        connection = self.registry.get(connection_id)
+        if connection is None:
+            return
+        self._set_state(connection, state)
+
+        now = time.monotonic()
+        if state in (ConnectionState.CONNECTING, ConnectionState.DISCONNECTING):
+            self._started.setdefault(connection_id, (state, now))
+            return
+        if state not in (ConnectionState.CONNECTED, ConnectionState.DISCONNECTED):
+            return
+        started = self._started.pop(connection_id, None)
+        if started is None:
+            return
+        operation, start = started
+        if operation == ConnectionState.CONNECTING and state == ConnectionState.CONNECTED:
+            CONNECT_DURATION.observe(now - start, connection.name)
+        elif operation == ConnectionState.DISCONNECTING and state == ConnectionState.DISCONNECTED:
+            DISCONNECT_DURATION.observe(now - start, connection.name)
+
+    def _set_state(self, connection, state):
+        for candidate in ConnectionState:
+            CONNECTION_STATE.set(1 if candidate == state else 0, connection.name, connection.type, candidate.name)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port=None):
+    """Serve /metrics on localhost from a daemon thread; return the server or None"""
+    port = METRICS_PORT if port is None else port
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+    except OSError as e:
+        logging.error(f"Could not start metrics endpoint on port {port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="vpn-metrics", daemon=True).start()
+    logging.info(f"Metrics available at http://127.0.0.1:{server.server_address[1]}/metrics")
+    return server
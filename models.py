@@ -1,7 +1,4 @@
 from enum import Enum
-from PyQt5.QtWidgets import QPushButton, QSystemTrayIcon, QStyle
-from PyQt5.QtGui import QIcon
-import platform
 
 class VPNType(Enum):
     OPENVPN = "OpenVPN"
@@ -12,32 +9,57 @@ class ConnectionState(Enum):
     CONNECTING = "Conectando..."
     AUTHENTICATING = "Autenticando..."
     CONNECTED = "Desconectar"
+    # The daemon restarts an established tunnel by itself; clicking still disconnects
+    RECONNECTING = "Reconectando..."
     DISCONNECTING = "Desconectando..."
     ERROR = "Error"
 
+# Button colour for each state
+STATE_COLORS = {
+    ConnectionState.DISCONNECTED: "#98FB98",
+    ConnectionState.CONNECTING: "#FFD700",
+    ConnectionState.AUTHENTICATING: "#FFD700",
+    ConnectionState.CONNECTED: "#FF6B6B",
+    ConnectionState.RECONNECTING: "#FFD700",
+    ConnectionState.ERROR: "#FFA500",
+}
+
 class ConnectionObserver:
-    def __init__(self, button, tray_icon):
+    def __init__(self, button, tray_icon, on_change=None):
         self.button = button
         self.tray_icon = tray_icon
+        self.on_change = on_change
         self.state = ConnectionState.DISCONNECTED
+        self.bytes_in = 0
+        self.bytes_out = 0
         self._update_ui()
 
     def set_state(self, state: ConnectionState):
         self.state = state
         self._update_ui()
+        if self.on_change:
+            self.on_change(state)
+
+    def set_counters(self, bytes_in, bytes_out):
+        self.bytes_in = bytes_in
+        self.bytes_out = bytes_out
 
     def _update_ui(self):
-        self.button.setText(self.state.value)
-        
+        # Rows painted by a delegate have no button; they follow on_change instead
+        if self.button is not None:
+            self.button.setText(self.state.value)
+            if self.state in STATE_COLORS:
+                self.button.setStyleSheet(f"background-color: {STATE_COLORS[self.state]}; border-radius: 5px;")
+
         if self.state == ConnectionState.DISCONNECTED:
-            self.button.setStyleSheet("background-color: #98FB98; border-radius: 5px;")
             self.tray_icon.setToolTip("VPN Desconectada")
         elif self.state == ConnectionState.CONNECTING:
-            self.button.setStyleSheet("background-color: #FFD700; border-radius: 5px;")
             self.tray_icon.setToolTip("Conectando VPN...")
         elif self.state == ConnectionState.AUTHENTICATING:
-            self.button.setStyleSheet("background-color: #FFD700; border-radius: 5px;")
             self.tray_icon.setToolTip("Autenticando VPN...")
         elif self.state == ConnectionState.CONNECTED:
-            self.button.setStyleSheet("background-color: #FF6B6B; border-radius: 5px;")
-            self.tray_icon.setToolTip("VPN Conectada")
\ No newline at end of file
+            self.tray_icon.setToolTip("VPN Conectada")
+        elif self.state == ConnectionState.RECONNECTING:
+            self.tray_icon.setToolTip("Reconectando VPN...")
+        elif self.state == ConnectionState.ERROR:
+            self.tray_icon.setToolTip("Conexión VPN perdida, reintentando...")
\ No newline at end of file
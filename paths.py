@@ -0,0 +1,45 @@
+import os
+import platform
+from pathlib import Path
+
+APP_NAME = "vpn-app"
+
+
+def _ensure(path):
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def cache_dir():
+    """Directory for data that can be rebuilt at any time (probe results, HTTP caches)"""
+    system = platform.system()
+    if system == 'Darwin':
+        base = Path.home() / 'Library' / 'Caches'
+    elif system == 'Windows':
+        base = Path(os.environ.get('LOCALAPPDATA', Path.home() / 'AppData' / 'Local')) / APP_NAME
+        return _ensure(base / 'cache')
+    else:
+        base = Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache'))
+    return _ensure(base / APP_NAME)
+
+
+def state_dir():
+    """Directory for data that should survive restarts (logs, traces)"""
+    system = platform.system()
+    if system == 'Darwin':
+        base = Path.home() / 'Library' / 'Application Support'
+    elif system == 'Windows':
+        base = Path(os.environ.get('LOCALAPPDATA', Path.home() / 'AppData' / 'Local'))
+    else:
+        base = Path(os.environ.get('XDG_STATE_HOME', Path.home() / '.local' / 'state'))
+    return _ensure(base / APP_NAME)
+
+
+def runtime_dir():
+    """Directory for per-session files (pid files, sockets)"""
+    if os.environ.get('XDG_RUNTIME_DIR'):
+        path = _ensure(Path(os.environ['XDG_RUNTIME_DIR']) / APP_NAME)
+    else:
+        path = _ensure(state_dir() / 'run')
+    path.chmod(0o700)
+    return path
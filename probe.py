@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from paths import cache_dir
+
+REQUIRED_LIBRARIES = {
+    "openvpn": ["openvpn", "/usr/local/opt/openvpn/sbin/openvpn", "/opt/homebrew/opt/openvpn/sbin/openvpn"],
+    "strongswan": ["strongswan", "/usr/local/opt/strongswan/bin/charon-cmd", "/opt/homebrew/opt/strongswan/bin/charon-cmd"]
+}
+
+
+def find_library(paths):
+    """Return the first executable among the candidate paths, or None.
+
+    Bare names are resolved through PATH.
+    """
+    for path in paths:
+        if os.sep not in path:
+            path = shutil.which(path)
+            if not path:
+                continue
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+    return None
+
+
+def install_library(install_cmd):
+    """Install a library using the provided command (raises CalledProcessError)"""
+    subprocess.run(install_cmd.split(), check=True)
+    logging.info(f"Librería instalada correctamente con el comando: {install_cmd}")
+
+
+class DependencyProbe:
+    """Locate the VPN binaries, remembering where they were found.
+
+    Every hit is cached on disk together with the binary's mtime and inode.
+    A cached entry is trusted as long as a single stat() of that path still
+    matches, so warm starts neither walk the candidate list nor spawn anything.
+    Misses are never cached.
+    """
+
+    def __init__(self, libraries=None, cache_file=None):
+        self.libraries = libraries or REQUIRED_LIBRARIES
+        self.cache_file = cache_file or (cache_dir() / 'probe.json')
+
+    def run(self):
+        """Return a dict mapping each library to its binary path (None if missing)"""
+        cache = self._load_cache()
+        results = {}
+        pending = []
+        for lib, paths in self.libraries.items():
+            path = self._cached_path(cache.get(lib), paths)
+            if path:
+                results[lib] = path
+            else:
+                pending.append(lib)
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+                found = pool.map(lambda lib: find_library(self.libraries[lib]), pending)
+                for lib, path in zip(pending, found):
+                    results[lib] = path
+                    if path:
+                        cache[lib] = self._cache_entry(path, self.libraries[lib])
+                    else:
+                        cache.pop(lib, None)
+            self._save_cache(cache)
+
+        for lib, path in results.items():
+            if path:
+                logging.info(f"Librería {lib} encontrada en: {path}")
+            else:
+                logging.warning(f"Librería {lib} no encontrada en las rutas: {self.libraries[lib]}")
+        return results
+
+    def probe(self, lib):
+        """Re-probe a single library, bypassing the cache"""
+        path = find_library(self.libraries[lib])
+        cache = self._load_cache()
+        if path:
+            cache[lib] = self._cache_entry(path, self.libraries[lib])
+        else:
+            cache.pop(lib, None)
+        self._save_cache(cache)
+        return path
+
+    def _cached_path(self, entry, paths):
+        if not entry or entry.get('candidates') != paths:
+            return None
+        try:
+            st = os.stat(entry['path'])
+        except OSError:
+            return None
+        if st.st_mtime_ns != entry.get('mtime_ns') or st.st_ino != entry.get('inode'):
+            return None
+        return entry['path']
+
+    def _cache_entry(self, path, paths):
+        st = os.stat(path)
+        return {
+            'path': path,
+            'mtime_ns': st.st_mtime_ns,
+            'inode': st.st_ino,
+            'candidates': paths
+        }
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self, cache):
+        try:
+            tmp = f"{self.cache_file}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(cache, f)
+            os.replace(tmp, self.cache_file)
+        except OSError as e:
+            logging.error(f"Error writing probe cache: {e}")
@@ -0,0 +1,273 @@
+import getpass
+import hashlib
+import logging
+import os
+import threading
+
+from remotes import Remote
+from tunnels import Tunnel
+
+# Blocks that may be inlined as <name>...</name>
+INLINE_BLOCKS = {
+    'ca', 'cert', 'key', 'extra-certs', 'tls-auth', 'tls-crypt', 'tls-crypt-v2', 'secret',
+    'pkcs12', 'dh', 'crl-verify', 'connection', 'http-proxy-user-pass', 'auth-user-pass'
+}
+PEM_BLOCKS = {'ca', 'cert', 'key', 'extra-certs'}
+# Control channel protection: servers drop UDP packets that don't carry it
+TLS_WRAP_BLOCKS = {'tls-auth', 'tls-crypt', 'tls-crypt-v2'}
+# Blocks that may appear more than once, kept as a list in file order
+REPEATABLE_BLOCKS = {'connection'}
+# OpenVPN runs as root: nothing in a profile may load code, read other
+# configs or decide where files get written
+UNSAFE_DIRECTIVES = {
+    'plugin', 'pkcs11-providers', 'engine', 'providers', 'iproute', 'config', 'cd', 'chroot', 'tmp-dir',
+    'log', 'log-append', 'writepid', 'status', 'management', 'askpass', 'daemon'
+}
+# Script hooks are accepted (update-resolv-conf profiles are common) but never
+# run: argv() adds --script-security 1 after the profile
+SCRIPT_DIRECTIVES = {
+    'script-security', 'up', 'down', 'route-up', 'route-pre-down', 'ipchange', 'tls-verify',
+    'auth-user-pass-verify', 'client-connect', 'client-disconnect', 'learn-address'
+}
+# Directives whose first argument is a file (or "inline")
+FILE_DIRECTIVES = {
+    'ca', 'cert', 'key', 'extra-certs', 'tls-auth', 'tls-crypt', 'tls-crypt-v2', 'secret',
+    'pkcs12', 'dh', 'crl-verify'
+}
+
+
+class ProfileError(ValueError):
+    pass
+
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class Profile:
+    """A parsed and validated .ovpn file, ready to be spawned.
+
+    argv() builds the whole OpenVPN command line: the profile, its
+    per-tunnel pid/status/management files and what is decided at
+    connect time (device, pinned remote).
+    """
+
+    def __init__(self, config_path, digest, directives, inline, files, remotes, dev_type, scripts=()):
+        self.config_path = config_path
+        self.digest = digest
+        self.directives = directives
+        self.inline = inline
+        self.files = files
+        self.remotes = remotes
+        self.dev_type = dev_type
+        # Script hooks of the profile, which argv() disables
+        self.scripts = sorted(set(scripts))
+        # Referenced files are part of the profile: a new cert means a recompile
+        self.file_stamps = {path: _file_stamp(path) for path in files.values()}
+
+        # Validation alone leaves nothing behind: connect creates the directory
+        self.tunnel = Tunnel(config_path, create=False)
+
+    def argv(self, device_args, remote=None, tunnel=None, user=None, config_file=None):
+        """OpenVPN options for this profile.
+
+        The privileged helper passes its own tunnel (under its socket's
+        directory), the GUI's user and config_file, a checked copy of the
+        profile.
+        """
+        tunnel = tunnel or self.tunnel
+        if self.scripts:
+            logging.info(f"{self.config_path}: ignoring script hooks ({', '.join(self.scripts)})")
+        # A --remote before --config goes ahead of the file's remotes.
+        # --cd first: relative paths in the profile resolve next to it.
+        # Options after --config override the profile's, so its
+        # script-security cannot re-enable scripts.
+        # --auth-user-pass without a file overrides the profile's: the
+        # daemon asks for the credentials over the management socket
+        return [
+            *(remote.args() if remote else []),
+            '--cd', os.path.dirname(self.config_path),
+            '--config', config_file or self.config_path,
+            '--script-security', '1',
+            '--writepid', str(tunnel.pid_file),
+            '--status', str(tunnel.status_file), '5',
+            '--management', str(tunnel.management_socket), 'unix',
+            '--management-client-user', user or getpass.getuser(),
+            '--management-hold',
+            '--daemon',
+            '--auth-user-pass',
+            '--management-query-passwords',
+            *device_args
+        ]
+
+    @property
+    def tls_wrapped(self):
+        return bool(TLS_WRAP_BLOCKS & (set(self.files) | set(self.inline)))
+
+    def files_changed(self):
+        return any(_file_stamp(path) != stamp for path, stamp in self.file_stamps.items())
+
+
+def _parse(lines, path, first_line=1):
+    """Split profile text into directives and inline blocks"""
+    directives = []
+    inline = {}
+    block = None
+    for number, raw in enumerate(lines, first_line):
+        line = raw.strip()
+        if block is not None:
+            if line == f"</{block[0]}>":
+                if block[0] in REPEATABLE_BLOCKS:
+                    inline.setdefault(block[0], []).append((block[1], block[2]))
+                else:
+                    inline[block[0]] = (block[1], block[2])
+                block = None
+            else:
+                block[2].append(raw)
+            continue
+        if line.startswith('<') and line.endswith('>') and not line.startswith('</'):
+            name = line[1:-1]
+            if name not in INLINE_BLOCKS:
+                raise ProfileError(f"{path}:{number}: unknown inline block <{name}>")
+            block = (name, number, [])
+            continue
+        if not line or line[0] in '#;':
+            continue
+        fields = line.split()
+        directives.append((fields[0].lstrip('-'), fields[1:], number))
+    if block is not None:
+        raise ProfileError(f"{path}:{block[1]}: <{block[0]}> is never closed")
+    return directives, inline
+
+
+def _remotes(directives, path, default_port=1194, default_proto='udp'):
+    for name, args, _ in directives:
+        if name == 'port' and args:
+            default_port = args[0]
+        elif name == 'proto' and args:
+            default_proto = args[0]
+
+    remotes = []
+    for name, args, number in directives:
+        if name != 'remote':
+            continue
+        if not args:
+            raise ProfileError(f"{path}:{number}: remote without a host")
+        try:
+            port = int(args[1] if len(args) > 1 else default_port)
+        except ValueError:
+            raise ProfileError(f"{path}:{number}: invalid port in remote")
+        remotes.append(Remote(args[0], port, args[2] if len(args) > 2 else default_proto))
+    return remotes, default_port, default_proto
+
+
+def compile_profile(config_path, data=None):
+    """Parse and validate a .ovpn file (raises ProfileError)"""
+    path = os.path.abspath(config_path)
+    if data is None:
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+        except OSError as e:
+            raise ProfileError(f"Cannot read {path}: {e.strerror}")
+    digest = hashlib.sha256(data).hexdigest()
+    directives, inline = _parse(data.decode(errors='replace').splitlines(), path)
+    directory = os.path.dirname(path)
+
+    remotes, port, proto = _remotes(directives, path)
+    block_directives = []
+    for first_line, lines in inline.get('connection', []):
+        # Remotes of <connection> blocks inherit the global port and proto
+        directives_of_block, _ = _parse(lines, path, first_line + 1)
+        remotes += _remotes(directives_of_block, path, port, proto)[0]
+        block_directives += directives_of_block
+    for name, _, number in directives + block_directives:
+        if name in UNSAFE_DIRECTIVES:
+            raise ProfileError(f"{path}:{number}: {name} is not allowed in profiles")
+    if not remotes:
+        raise ProfileError(f"{path}: no remote server configured")
+
+    for name in PEM_BLOCKS & set(inline):
+        number, lines = inline[name]
+        if not any('-----BEGIN' in line for line in lines):
+            raise ProfileError(f"{path}:{number}: <{name}> does not contain a PEM block")
+
+    files = {}
+    dev_type = None
+    for name, args, number in directives:
+        if name in FILE_DIRECTIVES:
+            if not args:
+                raise ProfileError(f"{path}:{number}: {name} needs a file")
+            if args[0] in ('inline', '[inline]'):
+                if name not in inline:
+                    raise ProfileError(f"{path}:{number}: {name} is inline but <{name}> is missing")
+                continue
+            file_path = os.path.join(directory, os.path.expanduser(args[0]))
+            if not os.path.isfile(file_path):
+                raise ProfileError(f"{path}:{number}: {name} file not found: {args[0]}")
+            files[name] = file_path
+        elif name == 'dev-type' and args:
+            dev_type = args[0]
+        elif name == 'dev' and args and dev_type is None:
+            dev_type = 'tap' if args[0].startswith('tap') else 'tun'
+
+    provided = set(files) | set(inline)
+    if not provided & {'ca', 'pkcs12', 'secret'}:
+        raise ProfileError(f"{path}: no CA certificate (ca, pkcs12 or secret)")
+    if 'pkcs12' not in provided and ('cert' in provided) != ('key' in provided):
+        raise ProfileError(f"{path}: cert and key must be given together")
+
+    scripts = [name for name, _, _ in directives + block_directives if name in SCRIPT_DIRECTIVES]
+    return Profile(path, digest, directives, inline, files, remotes, dev_type or 'tun', scripts)
+
+
+class ProfileCompiler:
+    """Compiled profiles by path, recompiled only when something changed.
+
+    A hit costs one stat() of the profile (plus one per referenced file).
+    If the stat changed but the content hash did not, the compiled profile
+    is kept. Invalid profiles are never cached, so fixing one takes effect
+    on the next connect.
+    """
+
+    def __init__(self):
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def compile(self, config_path):
+        path = os.path.abspath(config_path)
+        stamp = _file_stamp(path)
+        with self._lock:
+            entry = self._cache.get(path)
+        if entry and entry[0] == stamp and not entry[1].files_changed():
+            return entry[1]
+
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+        except OSError as e:
+            raise ProfileError(f"Cannot read {path}: {e.strerror}")
+        if entry and entry[1].digest == hashlib.sha256(data).hexdigest() and not entry[1].files_changed():
+            profile = entry[1]
+        else:
+            profile = compile_profile(path, data)
+            logging.info(f"Compiled profile {path} ({len(profile.remotes)} remotes, {profile.dev_type})")
+        with self._lock:
+            self._cache[path] = (stamp, profile)
+        return profile
+
+    def precompile(self, config_paths):
+        """Warm the cache, logging (not raising) invalid profiles"""
+        for config_path in config_paths:
+            try:
+                self.compile(config_path)
+            except ProfileError as e:
+                logging.warning(f"Invalid profile: {e}")
+
+    def discard(self, config_path):
+        with self._lock:
+            self._cache.pop(os.path.abspath(config_path), None)
@@ -0,0 +1,171 @@
+import time
+
+from models import ConnectionState
+from store import open_store
+
+
+def mask_password(password):
+    """Mask password showing only first and last 4 characters"""
+    if len(password) <= 8:
+        return password  # If password is too short, return as is
+    return password[:4] + '*' * (len(password) - 8) + password[-4:]
+
+
+class RegistryObserver:
+    """Base class for anything that mirrors the registry (list rows, tray menu)"""
+
+    def on_added(self, connection_id, connection):
+        pass
+
+    def on_added_many(self, added):
+        """Called once for a batch insert with a list of (id, connection)"""
+        for connection_id, connection in added:
+            self.on_added(connection_id, connection)
+
+    def on_removed(self, connection_id, connection):
+        pass
+
+    def on_changed(self, connection_id, old, new):
+        pass
+
+    def on_state_changed(self, connection_id, state):
+        pass
+
+
+class ConnectionRegistry:
+    """In-memory source of truth for the saved connections and their state.
+
+    Records live in the ConnectionStore, addressed by an id that stays
+    stable across renames; the registry adds the runtime state and pushes
+    every mutation to the subscribed observers as a single per-connection
+    diff.
+    """
+
+    def __init__(self, store=None):
+        self.store = store if store is not None else open_store()
+        self._states = {}
+        self._connected = {}  # ordered set of ids currently up
+        self._observers = []
+
+    def subscribe(self, observer):
+        self._observers.append(observer)
+
+    def load(self):
+        """Load the store and announce its connections as one batch"""
+        ids = self.store.load()
+        self._announce(ids)
+        return ids
+
+    def reload(self):
+        """Apply outside edits of the store as per-connection diffs"""
+        added, removed, changed = self.store.reload()
+        for connection_id, connection in removed.items():
+            self._states.pop(connection_id, None)
+            self._connected.pop(connection_id, None)
+            for observer in self._observers:
+                observer.on_removed(connection_id, connection)
+        for connection_id, (old, new) in changed.items():
+            for observer in self._observers:
+                observer.on_changed(connection_id, old, new)
+        self._announce(added)
+        return added, removed, changed
+
+    def add(self, connection):
+        connection_id = self.store.add(connection)
+        self._index(connection_id, connection)
+        for observer in self._observers:
+            observer.on_added(connection_id, connection)
+        return connection_id
+
+    def add_many(self, connections):
+        """Add several connections, notifying observers once"""
+        ids = self.store.add_many(connections)
+        self._announce(ids)
+        return ids
+
+    def _announce(self, ids):
+        added = []
+        for connection_id in ids:
+            connection = self.store.get(connection_id)
+            self._index(connection_id, connection)
+            added.append((connection_id, connection))
+        if added:
+            for observer in self._observers:
+                observer.on_added_many(added)
+
+    def _index(self, connection_id, connection):
+        self._states[connection_id] = ConnectionState.DISCONNECTED
+
+    def remove(self, connection_id):
+        connection = self.store.remove(connection_id)
+        del self._states[connection_id]
+        self._connected.pop(connection_id, None)
+        for observer in self._observers:
+            observer.on_removed(connection_id, connection)
+        return connection
+
+    def update(self, connection_id, **fields):
+        old = self.store.get(connection_id)
+        new = old.replace(**fields)
+        if new == old:
+            return
+        self.store.update(connection_id, new)
+        for observer in self._observers:
+            observer.on_changed(connection_id, old, new)
+
+    def set_state(self, connection_id, state):
+        if connection_id not in self._states or self._states[connection_id] == state:
+            return
+        self._states[connection_id] = state
+        if state == ConnectionState.CONNECTED:
+            self._connected[connection_id] = True
+        else:
+            self._connected.pop(connection_id, None)
+        for observer in self._observers:
+            observer.on_state_changed(connection_id, state)
+
+    def get(self, connection_id):
+        return self.store.get(connection_id)
+
+    def state(self, connection_id):
+        return self._states.get(connection_id, ConnectionState.DISCONNECTED)
+
+    def find(self, name):
+        """Return the id of the connection with this name, or None"""
+        return self.store.find_by_name(name)
+
+    def find_by_config_path(self, config_path):
+        return self.store.find_by_config_path(config_path)
+
+    def connected(self):
+        """Ids of the connections currently up"""
+        return list(self._connected)
+
+    def items(self):
+        return self.store.items()
+
+    def __len__(self):
+        return len(self.store)
+
+    def __contains__(self, connection_id):
+        return connection_id in self.store
+
+
+class UsageTracker(RegistryObserver):
+    """Feed connect counts and connected time into the store's usage stats"""
+
+    def __init__(self, registry):
+        self.registry = registry
+        self._since = {}
+        registry.subscribe(self)
+
+    def on_state_changed(self, connection_id, state):
+        if state == ConnectionState.CONNECTED:
+            self._since[connection_id] = time.monotonic()
+            self.registry.store.record_connect(connection_id)
+        elif connection_id in self._since:
+            seconds = time.monotonic() - self._since.pop(connection_id)
+            self.registry.store.record_disconnect(connection_id, seconds)
+
+    def on_removed(self, connection_id, connection):
+        self._since.pop(connection_id, None)
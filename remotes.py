@@ -0,0 +1,152 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from paths import cache_dir
+
+# Seconds during which a measured round trip is reused
+DEFAULT_TTL = int(os.environ.get("VPN_APP_LATENCY_TTL", 10 * 60))
+
+# P_CONTROL_HARD_RESET_CLIENT_V2, key id 0, no ack array, packet id 0
+_HARD_RESET_OPCODE = 7 << 3
+_HARD_RESET_SERVER_OPCODE = 8 << 3
+
+
+class Remote(namedtuple('Remote', ('host', 'port', 'proto'))):
+    @property
+    def key(self):
+        return f"{self.host}:{self.port}/{self.proto}"
+
+    @property
+    def is_tcp(self):
+        return self.proto.startswith('tcp')
+
+    def args(self):
+        """openvpn options that put this remote first in the connection list"""
+        return ['--remote', self.host, str(self.port), self.proto]
+
+
+def probe_tcp(host, port, timeout, source=None):
+    """Round trip of a TCP handshake, in seconds.
+
+    With a source address (e.g. a tunnel's local IP) the probe is sent
+    from it.
+    """
+    address = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)[0]
+    with socket.socket(address[0], socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        if source:
+            sock.bind((source, 0))
+        start = time.monotonic()
+        sock.connect(address[4])
+        return time.monotonic() - start
+
+
+def probe_udp(host, port, timeout):
+    """Round trip of an OpenVPN hard reset, in seconds.
+
+    Servers using tls-auth or tls-crypt drop the unsigned packet, so they
+    look unreachable here; OpenVPN then falls back to the file's order.
+    """
+    address = socket.getaddrinfo(host, port, type=socket.SOCK_DGRAM)[0]
+    packet = bytes([_HARD_RESET_OPCODE]) + os.urandom(8) + b'\x00' + b'\x00\x00\x00\x00'
+    with socket.socket(address[0], socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(address[4])
+        start = time.monotonic()
+        sock.send(packet)
+        while True:
+            reply = sock.recv(2048)
+            if reply and reply[0] & 0xf8 == _HARD_RESET_SERVER_OPCODE:
+                return time.monotonic() - start
+
+
+class LatencyProbe:
+    """Measure every remote of a profile concurrently and pick the fastest.
+
+    Round trips (and failures) are cached on disk per host:port/proto for
+    `ttl` seconds, so only the first connect after expiry pays for probing.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, timeout=1.5, cache_file=None):
+        self.ttl = ttl
+        self.timeout = timeout
+        self.cache_file = cache_file or (cache_dir() / 'latency.json')
+        self._cache = None
+        self._lock = threading.Lock()
+
+    def fastest(self, remotes, label="", udp_probes=True):
+        """Return the reachable remote with the lowest round trip, or None.
+
+        udp_probes=False for servers that drop unauthenticated UDP packets
+        (tls-auth, tls-crypt): our probe would only wait out the timeout.
+        """
+        if len(remotes) < 2:
+            return None
+        if not udp_probes and not all(remote.is_tcp for remote in remotes):
+            logging.info(f"Not probing the remotes of {label}: tls-auth/tls-crypt servers ignore UDP probes")
+            return None
+        rtts = self.measure(remotes)
+        reachable = [remote for remote in remotes if rtts.get(remote.key) is not None]
+        if not reachable:
+            logging.warning(f"No remote of {label} answered the latency probe")
+            return None
+        best = min(reachable, key=lambda remote: rtts[remote.key])
+        logging.info(f"Fastest remote for {label}: {best.key} ({rtts[best.key] * 1000:.0f} ms)")
+        return best
+
+    def measure(self, remotes):
+        """Return a dict mapping each remote's key to its round trip (None if unreachable)"""
+        now = time.time()
+        with self._lock:
+            cache = self._load_cache()
+            results = {}
+            pending = []
+            for remote in dict.fromkeys(remotes):
+                entry = cache.get(remote.key)
+                if entry and now - entry['checked_at'] < self.ttl:
+                    results[remote.key] = entry['rtt']
+                else:
+                    pending.append(remote)
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+                measured = list(pool.map(self._probe, pending))
+            with self._lock:
+                for remote, rtt in zip(pending, measured):
+                    results[remote.key] = rtt
+                    cache[remote.key] = {'rtt': rtt, 'checked_at': now}
+                self._save_cache(cache)
+        return results
+
+    def _probe(self, remote):
+        try:
+            if remote.is_tcp:
+                return probe_tcp(remote.host, remote.port, self.timeout)
+            return probe_udp(remote.host, remote.port, self.timeout)
+        except (OSError, socket.timeout) as e:
+            logging.info(f"Remote {remote.key} did not answer: {e}")
+            return None
+
+    def _load_cache(self):
+        if self._cache is None:
+            try:
+                with open(self.cache_file, 'r') as f:
+                    self._cache = json.load(f)
+            except (OSError, ValueError):
+                self._cache = {}
+        return self._cache
+
+    def _save_cache(self, cache):
+        try:
+            tmp = f"{self.cache_file}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(cache, f)
+            os.replace(tmp, self.cache_file)
+        except OSError as e:
+            logging.error(f"Error writing latency cache: {e}")
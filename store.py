@@ -0,0 +1,514 @@
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+DEFAULT_PATH = "connections.json"
+DEFAULT_DB_PATH = "connections.db"
+
+# Storage engine: "json" (default) or "sqlite"
+STORE_ENGINE = os.environ.get("VPN_APP_STORE", "json")
+
+
+def open_store(engine=None):
+    """Create the connection store selected by VPN_APP_STORE"""
+    if (engine or STORE_ENGINE) == "sqlite":
+        return SQLiteConnectionStore(DEFAULT_DB_PATH, json_path=DEFAULT_PATH)
+    return ConnectionStore(DEFAULT_PATH)
+
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _load_json_records(path):
+    """Parse a connections.json file into Connection records, skipping invalid entries"""
+    with open(path, "r") as file:
+        entries = json.load(file)
+
+    records = []
+    for entry in entries:
+        try:
+            records.append(Connection.from_dict(entry))
+        except KeyError as e:
+            # Not the entry itself: it holds passwords
+            kind = 'IPsec' if entry.get('type') == 'ipsec' else 'OpenVPN'
+            logging.warning(f"Skipping invalid {kind} connection {entry.get('name')!r} in {path}: missing {e}")
+    return records
+
+
+def _match_records(old, new):
+    """Pair reloaded records with the ids of the ones we had.
+
+    Names need not be unique, so records are matched on name, type and
+    config_path first, then on type and config_path (renamed), then on
+    name and type (profile moved); duplicates pair up in file order.
+    Returns one id per record in `new`, None for the new ones.
+    """
+    ids = [None] * len(new)
+    left = dict(old)
+    for key in (lambda connection: (connection.name, connection.type, connection.config_path),
+                lambda connection: (connection.type, connection.config_path),
+                lambda connection: (connection.name, connection.type)):
+        candidates = {}
+        for connection_id, connection in left.items():
+            candidates.setdefault(key(connection), []).append(connection_id)
+        for index, record in enumerate(new):
+            if ids[index] is None and candidates.get(key(record)):
+                ids[index] = candidates[key(record)].pop(0)
+                del left[ids[index]]
+    return ids
+
+
+class Connection:
+    """A saved connection, in a compact record.
+
+    For IPsec connections config_path holds the server, which is what
+    identifies them everywhere else (active_vpns, the tray menu...).
+    """
+    __slots__ = ('name', 'type', 'config_path', 'username', 'password', 'shared_secret', 'sudo_password')
+
+    def __init__(self, name, config_path, username, password, type='openvpn', shared_secret=None, sudo_password=None):
+        self.name = name
+        self.type = type
+        self.config_path = config_path
+        self.username = username
+        self.password = password
+        self.shared_secret = shared_secret
+        self.sudo_password = sudo_password
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a record from a connections.json entry (raises KeyError if incomplete)"""
+        if data.get('type') == 'ipsec':
+            return cls(
+                data['name'], data['server'], data['username'], data['password'],
+                type='ipsec', shared_secret=data['shared_secret'], sudo_password=data.get('sudo_password')
+            )
+        return cls(
+            data['name'], data['config_path'], data['username'], data['password'],
+            sudo_password=data.get('sudo_password')
+        )
+
+    def to_dict(self):
+        if self.type == 'ipsec':
+            return {
+                "name": self.name,
+                "server": self.config_path,
+                "username": self.username,
+                "password": self.password,
+                "type": "ipsec",
+                "shared_secret": self.shared_secret,
+                "sudo_password": self.sudo_password
+            }
+        return {
+            "name": self.name,
+            "config_path": self.config_path,
+            "username": self.username,
+            "password": self.password,
+            "type": "openvpn",
+            "sudo_password": self.sudo_password
+        }
+
+    @property
+    def extra_data(self):
+        if self.type == 'ipsec':
+            return {'shared_secret': self.shared_secret, 'server': self.config_path}
+        return None
+
+    def replace(self, **fields):
+        values = {slot: getattr(self, slot) for slot in self.__slots__}
+        values.update(fields)
+        return Connection(**values)
+
+    def __eq__(self, other):
+        if not isinstance(other, Connection):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+    def __repr__(self):
+        return f"Connection({self.name!r}, {self.type!r}, {self.config_path!r})"
+
+
+class ConnectionStore:
+    """Connections persisted to a JSON file.
+
+    Mutations only mark the store dirty; the file is rewritten once per
+    burst, `delay` seconds after the first change, from a background timer.
+    Each write goes to a temporary file in the same directory which then
+    replaces the original, so readers never see a torn file. reload()
+    applies edits made to the file by someone else.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, delay=0.5):
+        self.path = os.path.abspath(path)
+        self.delay = delay
+        self._records = {}
+        self._by_name = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._timer = None
+        self._dirty = False
+        # Stamp of the file as we last read or wrote it
+        self._stamp = None
+
+    def load(self):
+        """Read the file and return the ids of the valid connections"""
+        stamp = _file_stamp(self.path)
+        try:
+            records = _load_json_records(self.path)
+        except FileNotFoundError:
+            logging.warning("Connections file not found.")
+            return []
+        with self._lock:
+            self._stamp = stamp
+            return [self._insert(record) for record in records]
+
+    @property
+    def watch_paths(self):
+        """Files whose changes reload() should be told about"""
+        return (self.path,)
+
+    def reload(self):
+        """Apply changes someone else made to the file.
+
+        Records are matched as in _match_records(). Returns (added ids, {removed id:
+        connection}, {changed id: (old, new)}); all empty if the file is
+        the one we wrote, is being replaced, or our own pending changes
+        are about to overwrite it.
+        """
+        stamp = _file_stamp(self.path)
+        with self._lock:
+            if stamp is None or stamp == self._stamp:
+                return [], {}, {}
+            if self._dirty:
+                logging.warning(f"{self.path} changed while we have unsaved changes; keeping ours")
+                return [], {}, {}
+        try:
+            records = _load_json_records(self.path)
+        except (OSError, ValueError) as e:
+            # Probably half written: the writer's next change event retries
+            logging.warning(f"Cannot reload {self.path}: {e}")
+            return [], {}, {}
+
+        with self._lock:
+            self._stamp = stamp
+            ids = _match_records(self._records, records)
+            kept = set(ids)
+            removed = {
+                connection_id: connection for connection_id, connection in self._records.items()
+                if connection_id not in kept
+            }
+            changed = {
+                connection_id: (self._records[connection_id], record) for connection_id, record in zip(ids, records)
+                if connection_id is not None and record != self._records[connection_id]
+            }
+            # Rebuilt in file order, so our next write keeps it
+            self._records = {}
+            self._by_name = {}
+            added = []
+            for connection_id, record in zip(ids, records):
+                if connection_id is None:
+                    added.append(self._insert(record))
+                else:
+                    self._records[connection_id] = record
+                    self._by_name[record.name] = connection_id
+        return added, removed, changed
+
+    def add(self, connection):
+        return self.add_many([connection])[0]
+
+    def add_many(self, connections):
+        with self._lock:
+            ids = [self._insert(connection) for connection in connections]
+        self._schedule_save()
+        return ids
+
+    def update(self, connection_id, connection):
+        with self._lock:
+            old = self._records[connection_id]
+            self._records[connection_id] = connection
+            self._unindex(connection_id, old)
+            self._by_name[connection.name] = connection_id
+        self._schedule_save()
+
+    def remove(self, connection_id):
+        with self._lock:
+            connection = self._records.pop(connection_id)
+            self._unindex(connection_id, connection)
+        self._schedule_save()
+        return connection
+
+    def get(self, connection_id):
+        return self._records.get(connection_id)
+
+    def find_by_name(self, name):
+        return self._by_name.get(name)
+
+    def find_by_config_path(self, config_path):
+        for connection_id, connection in self._records.items():
+            if connection.config_path == config_path:
+                return connection_id
+        return None
+
+    def record_connect(self, connection_id):
+        """Usage stats have no place in the JSON schema"""
+
+    def record_disconnect(self, connection_id, connected_seconds):
+        """Usage stats have no place in the JSON schema"""
+
+    def items(self):
+        return self._records.items()
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, connection_id):
+        return connection_id in self._records
+
+    def _insert(self, connection):
+        connection_id = self._next_id
+        self._next_id += 1
+        self._records[connection_id] = connection
+        self._by_name[connection.name] = connection_id
+        return connection_id
+
+    def _unindex(self, connection_id, connection):
+        if self._by_name.get(connection.name) == connection_id:
+            del self._by_name[connection.name]
+
+    def _schedule_save(self):
+        with self._lock:
+            self._dirty = True
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self.delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Write pending changes now"""
+        # Serialize writers so an older snapshot can never replace a newer one
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self._dirty:
+                    return
+                self._dirty = False
+                data = [record.to_dict() for record in self._records.values()]
+            self._write(data)
+
+    def _write(self, data):
+        directory = os.path.dirname(self.path)
+        try:
+            fd, tmp = tempfile.mkstemp(prefix=".connections-", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "w") as file:
+                    json.dump(data, file)
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(tmp, self.path)
+                self._stamp = _file_stamp(self.path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except Exception as e:
+            logging.error(f"Error saving connections: {e}")
+            with self._lock:
+                self._dirty = True
+
+    def close(self):
+        self.flush()
+
+
+class SQLiteConnectionStore:
+    """Connection catalogue in SQLite, for large managed fleets.
+
+    Connections are indexed by name, type and config_path (the server for
+    IPsec), and carry usage stats. Records are also kept in memory for
+    painting; lookups by key go through the indexes. On first use an
+    existing connections.json is migrated into the database. reload()
+    picks up what other processes committed.
+    """
+
+    COLUMNS = ('name', 'type', 'config_path', 'username', 'password', 'shared_secret', 'sudo_password')
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS connections (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL,
+            config_path TEXT NOT NULL,
+            username TEXT,
+            password TEXT,
+            shared_secret TEXT,
+            sudo_password TEXT,
+            connect_count INTEGER NOT NULL DEFAULT 0,
+            last_connected REAL,
+            connected_seconds REAL NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_connections_name ON connections(name);
+        CREATE INDEX IF NOT EXISTS idx_connections_type ON connections(type);
+        CREATE INDEX IF NOT EXISTS idx_connections_config_path ON connections(config_path);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, json_path=DEFAULT_PATH):
+        self.path = os.path.abspath(path)
+        self.json_path = json_path and os.path.abspath(json_path)
+        self._records = {}
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(self.SCHEMA)
+        self._data_version = None
+
+    def _version(self):
+        # Changes only when another connection commits
+        return self.db.execute("PRAGMA data_version").fetchone()[0]
+
+    def load(self):
+        """Migrate connections.json if needed and return the ids of all connections"""
+        self._migrate_json()
+        rows = self.db.execute(
+            f"SELECT id, {', '.join(self.COLUMNS)} FROM connections ORDER BY id"
+        ).fetchall()
+        for row in rows:
+            self._records[row[0]] = Connection(**dict(zip(self.COLUMNS, row[1:])))
+        self._data_version = self._version()
+        return [row[0] for row in rows]
+
+    @property
+    def watch_paths(self):
+        # In WAL mode commits land in the -wal file first
+        return (self.path, self.path + '-wal')
+
+    def reload(self):
+        """Apply what other processes committed; same result as ConnectionStore.reload()"""
+        version = self._version()
+        if version == self._data_version:
+            return [], {}, {}
+        self._data_version = version
+        rows = self.db.execute(
+            f"SELECT id, {', '.join(self.COLUMNS)} FROM connections ORDER BY id"
+        ).fetchall()
+        fresh = {row[0]: Connection(**dict(zip(self.COLUMNS, row[1:]))) for row in rows}
+        removed = {connection_id: self._records.pop(connection_id)
+                   for connection_id in list(self._records) if connection_id not in fresh}
+        changed = {connection_id: (self._records[connection_id], connection)
+                   for connection_id, connection in fresh.items()
+                   if connection_id in self._records and self._records[connection_id] != connection}
+        added = [connection_id for connection_id in fresh if connection_id not in self._records]
+        self._records.update(fresh)
+        return added, removed, changed
+
+    def _migrate_json(self):
+        if not self.json_path:
+            return
+        if self.db.execute("SELECT 1 FROM meta WHERE key = 'migrated_json'").fetchone():
+            return
+        try:
+            records = _load_json_records(self.json_path)
+        except FileNotFoundError:
+            records = []
+        with self.db:
+            self._insert_many(records)
+            self.db.execute(
+                "INSERT INTO meta (key, value) VALUES ('migrated_json', ?)", (self.json_path,)
+            )
+        if records:
+            logging.info(f"Migrated {len(records)} connections from {self.json_path}")
+
+    def add(self, connection):
+        return self.add_many([connection])[0]
+
+    def add_many(self, connections):
+        """Insert several connections in one transaction"""
+        with self.db:
+            ids = self._insert_many(connections)
+        self._records.update(zip(ids, connections))
+        return ids
+
+    def _insert_many(self, connections):
+        ids = []
+        sql = f"INSERT INTO connections ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})"
+        for connection in connections:
+            cursor = self.db.execute(sql, [getattr(connection, column) for column in self.COLUMNS])
+            ids.append(cursor.lastrowid)
+        return ids
+
+    def update(self, connection_id, connection):
+        assignments = ', '.join(f"{column} = ?" for column in self.COLUMNS)
+        with self.db:
+            self.db.execute(
+                f"UPDATE connections SET {assignments} WHERE id = ?",
+                [getattr(connection, column) for column in self.COLUMNS] + [connection_id]
+            )
+        self._records[connection_id] = connection
+
+    def remove(self, connection_id):
+        with self.db:
+            self.db.execute("DELETE FROM connections WHERE id = ?", (connection_id,))
+        return self._records.pop(connection_id)
+
+    def get(self, connection_id):
+        return self._records.get(connection_id)
+
+    def find_by_name(self, name):
+        row = self.db.execute("SELECT id FROM connections WHERE name = ? LIMIT 1", (name,)).fetchone()
+        return row[0] if row else None
+
+    def find_by_config_path(self, config_path):
+        row = self.db.execute(
+            "SELECT id FROM connections WHERE config_path = ? LIMIT 1", (config_path,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def find_by_type(self, type):
+        return [row[0] for row in self.db.execute("SELECT id FROM connections WHERE type = ?", (type,))]
+
+    def record_connect(self, connection_id):
+        with self.db:
+            self.db.execute(
+                "UPDATE connections SET connect_count = connect_count + 1, last_connected = ? WHERE id = ?",
+                (time.time(), connection_id)
+            )
+
+    def record_disconnect(self, connection_id, connected_seconds):
+        with self.db:
+            self.db.execute(
+                "UPDATE connections SET connected_seconds = connected_seconds + ? WHERE id = ?",
+                (connected_seconds, connection_id)
+            )
+
+    def usage(self, connection_id):
+        """Return (connect_count, last_connected, connected_seconds)"""
+        return self.db.execute(
+            "SELECT connect_count, last_connected, connected_seconds FROM connections WHERE id = ?",
+            (connection_id,)
+        ).fetchone()
+
+    def items(self):
+        return self._records.items()
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, connection_id):
+        return connection_id in self._records
+
+    def flush(self):
+        """Every change is committed as it happens"""
+
+    def close(self):
+        self.db.close()
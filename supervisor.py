@@ -0,0 +1,150 @@
+import logging
+import os
+import random
+import threading
+import time
+
+from remotes import probe_tcp
+
+# Seconds between health checks of the tunnels that are up
+HEALTH_INTERVAL = float(os.environ.get("VPN_APP_HEALTH_INTERVAL", 5))
+# A tunnel that received nothing for this long is probed, when a keepalive target is set
+STALL_TIMEOUT = float(os.environ.get("VPN_APP_STALL_TIMEOUT", 60))
+# Optional host:port reached through the tunnel to tell a quiet tunnel from a dead one
+KEEPALIVE_TARGET = os.environ.get("VPN_APP_KEEPALIVE", "")
+RECONNECT_BASE = 1.0
+RECONNECT_MAX = 60.0
+
+
+def backoff_delay(attempt, base=RECONNECT_BASE, cap=RECONNECT_MAX):
+    """Exponential delay with jitter, so tunnels dropped together don't retry in lockstep"""
+    delay = min(cap, base * 2 ** attempt)
+    return random.uniform(delay / 2, delay)
+
+
+def keepalive(local_ip, target=KEEPALIVE_TARGET, timeout=3):
+    """True if target answers from the tunnel's address (a refusal is an answer too)"""
+    host, _, port = target.rpartition(':')
+    try:
+        probe_tcp(host, int(port), timeout, source=local_ip)
+    except ConnectionRefusedError:
+        return True
+    except (OSError, ValueError) as e:
+        logging.warning(f"Keepalive to {target} from {local_ip} failed: {e}")
+        return False
+    return True
+
+
+class _Watch:
+    __slots__ = ('connection_id', 'connection', 'sudo_password', 'attempt', 'due', 'generation')
+
+    def __init__(self, connection_id, connection, sudo_password):
+        self.connection_id = connection_id
+        self.connection = connection
+        self.sudo_password = sudo_password
+        self.attempt = 0
+        self.due = None
+        self.generation = 0
+
+
+class TunnelSupervisor:
+    """Keep the tunnels the user asked for up.
+
+    The engine reports each tunnel that comes up or fails; a background
+    thread checks the ones that are up every `interval` seconds through
+    engine.check_health() and asks the engine to reconnect failed ones
+    with jittered exponential backoff. Whatever the user disconnects is
+    forgotten.
+    """
+
+    def __init__(self, engine, interval=HEALTH_INTERVAL):
+        self.engine = engine
+        self.interval = interval
+        self._watches = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def watch(self, connection_id, connection, sudo_password):
+        """The user wants this connection up"""
+        with self._lock:
+            watch = self._watches.get(connection_id)
+            generation = watch.generation + 1 if watch else 0
+            watch = self._watches[connection_id] = _Watch(connection_id, connection, sudo_password)
+            watch.generation = generation
+            if self._thread is None and not self._stopped:
+                self._thread = threading.Thread(target=self._run, name="vpn-supervisor", daemon=True)
+                self._thread.start()
+
+    def forget(self, connection_id):
+        with self._lock:
+            self._watches.pop(connection_id, None)
+
+    def is_watched(self, connection_id):
+        with self._lock:
+            return connection_id in self._watches
+
+    def tunnel_up(self, connection_id):
+        with self._lock:
+            watch = self._watches.get(connection_id)
+            if watch is not None:
+                watch.attempt = 0
+                watch.due = None
+
+    def tunnel_failed(self, connection_id):
+        """Schedule the next attempt; return its delay, or None if not watched"""
+        with self._lock:
+            watch = self._watches.get(connection_id)
+            if watch is None:
+                return None
+            delay = backoff_delay(watch.attempt)
+            watch.attempt += 1
+            watch.due = time.monotonic() + delay
+        self._wake.set()
+        return delay
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def _run(self):
+        next_check = time.monotonic() + self.interval
+        while not self._stopped:
+            with self._lock:
+                dues = [watch.due for watch in self._watches.values() if watch.due is not None]
+            timeout = min([next_check] + dues) - time.monotonic()
+            self._wake.wait(max(0, timeout))
+            self._wake.clear()
+            if self._stopped:
+                return
+
+            now = time.monotonic()
+            with self._lock:
+                due = [watch for watch in self._watches.values() if watch.due is not None and watch.due <= now]
+                for watch in due:
+                    watch.due = None
+                healthy = [watch for watch in self._watches.values() if watch.due is None and watch not in due]
+            for watch in due:
+                self._reconnect(watch)
+            if now >= next_check:
+                next_check = now + self.interval
+                for watch in healthy:
+                    self._check(watch)
+
+    def _reconnect(self, watch):
+        with self._lock:
+            # The user may have disconnected or reconnected by hand meanwhile
+            if self._watches.get(watch.connection_id) is not watch:
+                return
+        logging.info(f"Reconnecting {watch.connection.name} (attempt {watch.attempt})")
+        self.engine.reconnect(watch.connection_id, watch.connection, watch.sudo_password)
+
+    def _check(self, watch):
+        try:
+            problem = self.engine.check_health(watch.connection_id)
+        except Exception as e:
+            logging.error(f"Error checking tunnel health of {watch.connection.name}: {e}")
+            return
+        if problem:
+            self.engine.tunnel_lost(watch.connection_id, watch.connection, problem)
@@ -0,0 +1,47 @@
+import logging
+import queue
+import unittest
+
+import applog
+
+
+def record(line=10):
+    return logging.LogRecord('root', logging.WARNING, '/app/engine.py', line, "Tunnel down", None, None)
+
+
+class RateLimitFilterTest(unittest.TestCase):
+    def test_each_connection_has_its_own_budget(self):
+        limiter = applog.RateLimitFilter(limit=2, window=60)
+        with applog.context(connection='office'):
+            self.assertEqual([limiter.filter(record()) for _ in range(3)], [True, True, False])
+        with applog.context(connection='home'):
+            self.assertTrue(limiter.filter(record()))
+        self.assertTrue(limiter.filter(record(line=11)))
+
+    def test_next_window_reports_what_was_suppressed(self):
+        limiter = applog.RateLimitFilter(limit=1, window=60)
+        limiter.filter(record())
+        limiter.filter(record())
+        # The window is over
+        limiter._sites[('/app/engine.py', 10, None)][0] -= 60
+        first = record()
+        self.assertTrue(limiter.filter(first))
+        self.assertEqual(first.suppressed, 1)
+
+
+class DroppingQueueHandlerTest(unittest.TestCase):
+    def test_next_record_that_fits_reports_the_dropped_ones(self):
+        handler = applog._DroppingQueueHandler(queue.Queue(1))
+        for _ in range(3):
+            handler.handle(record())
+        self.assertEqual(handler.dropped, 2)
+        handler.queue.get_nowait()
+        handler.handle(record())
+        reported = handler.queue.get_nowait()
+        self.assertEqual(reported.dropped, 2)
+        self.assertEqual(handler.dropped, 0)
+        self.assertIn('"dropped": 2', applog.JsonFormatter().format(reported))
+
+
+if __name__ == '__main__':
+    unittest.main()
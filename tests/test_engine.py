@@ -0,0 +1,165 @@
+import socket
+import threading
+import time
+import unittest
+from unittest import mock
+
+import engine
+from engine import ConnectionEngine, IPsecBackend
+from models import ConnectionState
+from store import Connection
+from supervisor import STALL_TIMEOUT
+from test_vici import FakeCharon
+from tunnels import sa_name
+from vici import ViciSession
+
+
+class CheckHealthTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = ConnectionEngine(use_helper=False)
+        self.addCleanup(self.engine.shutdown)
+
+    def track(self, connection, **fields):
+        self.engine.active_vpns[1] = dict(
+            up=True, connection=connection, rx_at=time.monotonic() - STALL_TIMEOUT - 1, **fields
+        )
+
+    def test_ipsec_tunnel_stays_healthy_past_stall_timeout(self):
+        connection = Connection('sec', '1.2.3.4', 'u', 'p', type='ipsec', shared_secret='s')
+        self.track(connection)
+        self.assertIsNone(self.engine.check_health(1))
+
+    def test_quiet_openvpn_tunnel_without_keepalive_is_healthy(self):
+        connection = Connection('ovpn', '/tmp/a.ovpn', 'u', 'p')
+        self.track(connection, bytes_in=10, local_ip='10.8.0.2')
+        with mock.patch.object(engine, 'KEEPALIVE_TARGET', ''):
+            self.assertIsNone(self.engine.check_health(1))
+
+    def test_quiet_openvpn_tunnel_is_stalled_when_keepalive_fails(self):
+        connection = Connection('ovpn', '/tmp/a.ovpn', 'u', 'p')
+        self.track(connection, bytes_in=10, local_ip='10.8.0.2')
+        with mock.patch.object(engine, 'KEEPALIVE_TARGET', '10.8.0.1:22'), \
+                mock.patch.object(engine, 'keepalive', return_value=False):
+            self.assertIn('no keepalive answer', self.engine.check_health(1))
+        with mock.patch.object(engine, 'KEEPALIVE_TARGET', '10.8.0.1:22'), \
+                mock.patch.object(engine, 'keepalive', return_value=True):
+            self.assertIsNone(self.engine.check_health(1))
+
+
+class ManagementStateTest(unittest.TestCase):
+    def setUp(self):
+        self.states = []
+        self.engine = ConnectionEngine(on_state=lambda *args: self.states.append(args[1]), use_helper=False)
+        self.addCleanup(self.engine.shutdown)
+        self.connection = Connection('ovpn', '/tmp/a.ovpn', 'u', 'p')
+
+    def test_restart_of_an_established_tunnel_is_reconnecting(self):
+        self.engine.active_vpns[1] = {'up': True}
+        for name in ('RECONNECTING', 'WAIT', 'AUTH', 'CONNECTED'):
+            self.engine._on_management_state(1, self.connection, name)
+        self.assertEqual(self.states, [ConnectionState.RECONNECTING] * 3 + [ConnectionState.CONNECTED])
+
+    def test_first_connect_is_connecting(self):
+        self.engine.active_vpns[1] = {'up': False}
+        self.engine._on_management_state(1, self.connection, 'WAIT')
+        self.assertEqual(self.states, [ConnectionState.CONNECTING])
+
+
+class SharedProfileTest(unittest.TestCase):
+    def setUp(self):
+        self.states = []
+        self.engine = ConnectionEngine(on_state=lambda *args: self.states.append(args[1:]), use_helper=False)
+        self.addCleanup(self.engine.shutdown)
+        self.connection = Connection('office', '/tmp/a.ovpn', 'u', 'p')
+        self.engine.active_vpns[1] = {'type': 'openvpn', 'connection': self.connection, 'up': True}
+
+    def test_active_tunnels_are_tracked_by_connection_id(self):
+        self.assertTrue(self.engine.is_active(1))
+        self.assertFalse(self.engine.is_active(2))
+
+    def test_second_connection_to_an_active_profile_is_refused(self):
+        other = Connection('office again', '/tmp/a.ovpn', 'u', 'p')
+        with mock.patch.object(self.engine, '_ensure_helper'), \
+                mock.patch.object(self.engine.profiles, 'compile', return_value=mock.Mock(dev_type='tun')):
+            self.engine.connect(2, other, 'pw').result(timeout=5)
+        state, error = self.states[-1]
+        self.assertEqual(state, ConnectionState.DISCONNECTED)
+        self.assertIn('already in use', error)
+        self.assertEqual(list(self.engine.active_vpns), [1])
+
+    def test_profile_of_a_running_daemon_is_not_cleared(self):
+        tunnel = mock.Mock(**{'is_running.return_value': True})
+        profile = mock.Mock(tunnel=tunnel)
+        with mock.patch.object(self.engine.profiles, 'compile', return_value=profile), \
+                self.assertRaisesRegex(RuntimeError, 'already in use'):
+            self.engine.backend_for('openvpn').connect(self.connection, 'pw', 'tun0', mock.Mock())
+        tunnel.clear.assert_not_called()
+
+
+class CancelWhileStartingTest(unittest.TestCase):
+    def test_disconnect_before_the_pid_is_known_still_stops_the_daemon(self):
+        states = []
+        connection_engine = ConnectionEngine(on_state=lambda *args: states.append(args[1:]), use_helper=False)
+        self.addCleanup(connection_engine.shutdown)
+        connection = Connection('office', '/tmp/a.ovpn', 'u', 'p')
+        backend = mock.Mock()
+
+        def connect(*args):
+            # The user disconnects while the daemon is coming up
+            connection_engine._disconnect(1, connection, 'pw')
+            return 4242
+        backend.connect.side_effect = connect
+        profile = mock.Mock(dev_type='tun', tunnel=mock.Mock(management_socket='/tmp/m.sock'))
+        with mock.patch.object(connection_engine, '_ensure_helper'), \
+                mock.patch.object(connection_engine, 'backend_for', return_value=backend), \
+                mock.patch.object(connection_engine.profiles, 'compile', return_value=profile):
+            connection_engine.connect(1, connection, 'pw').result(timeout=5)
+
+        self.assertEqual([call.args[1].get('pid') for call in backend.disconnect.call_args_list], [None, 4242])
+        self.assertEqual(states[-1], (ConnectionState.DISCONNECTED, None))
+        self.assertEqual(connection_engine.active_vpns, {})
+
+
+class IPsecCountersTest(unittest.TestCase):
+    def test_counters_add_up_the_child_sas_listed_by_charon(self):
+        name = sa_name('1.2.3.4')
+        listed = {name: {'state': 'ESTABLISHED', 'child-sas': {
+            f'{name}-1': {'bytes-in': '1000', 'bytes-out': '200'},
+            f'{name}-2': {'bytes-in': '24', 'bytes-out': '6'}
+        }}}
+        ours, theirs = socket.socketpair()
+        charon = FakeCharon(theirs, streams={'list-sas': [('list-sa', listed)]})
+        self.addCleanup(charon.close)
+        backend = IPsecBackend(privileged=None)
+        with mock.patch.object(engine.ViciSession, 'open',
+                               side_effect=lambda on_event, on_closed: ViciSession(ours, on_event, on_closed)):
+            self.assertEqual(backend.counters('1.2.3.4'), (1024, 206))
+            self.assertIsNone(backend.counters('5.6.7.8'))
+        self.assertEqual(charon.events, {'ike-updown', 'child-updown', 'control-log', 'list-sa'})
+        backend.close()
+
+    def test_engine_reports_them_while_the_tunnel_is_up(self):
+        counted = threading.Event()
+        connection_engine = ConnectionEngine(on_counters=lambda *args: counted.set(), use_helper=False)
+        self.addCleanup(connection_engine.shutdown)
+        connection = Connection('sec', '1.2.3.4', 'u', 'p', type='ipsec', shared_secret='s')
+        connection_engine.active_vpns[1] = {'type': 'ipsec', 'connection': connection, 'up': True}
+        with mock.patch.object(connection_engine.backends['ipsec'], 'counters', return_value=(10, 5)):
+            connection_engine._start_ipsec_poller()
+            self.assertTrue(counted.wait(5))
+            poller = connection_engine._ipsec_poller
+            del connection_engine.active_vpns[1]
+            poller.join(5)
+        self.assertFalse(poller.is_alive())
+
+
+class BackendForTest(unittest.TestCase):
+    def test_unknown_type_is_a_value_error(self):
+        connection_engine = ConnectionEngine(use_helper=False)
+        self.addCleanup(connection_engine.shutdown)
+        with self.assertRaisesRegex(ValueError, "No backend available for wireguard"):
+            connection_engine.backend_for('wireguard')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import os
+import queue
+import socket
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from helper import HelperClient, PrivilegedHelper, ViciProxy
+from profiles import ProfileError
+from test_vici import FakeCharon
+from vici import ViciError, ViciSession
+
+PROFILE = """client
+dev tun
+remote vpn.example.com 1194 udp
+<ca>
+-----BEGIN CERTIFICATE-----
+-----END CERTIFICATE-----
+</ca>
+"""
+
+
+class OpenVPNRequestTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.helper = PrivilegedHelper(os.path.join(self.directory, 'helper.sock'), 'token', os.getuid())
+        self.run = mock.patch('subprocess.run', return_value=mock.Mock(returncode=0, stderr='')).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def profile(self, extra=""):
+        path = os.path.join(self.directory, 'office.ovpn')
+        with open(path, 'w') as file:
+            file.write(PROFILE + extra)
+        return path
+
+    def spawn(self, **request):
+        # A real peer, so the credential check passes as it does for the GUI
+        ours, theirs = socket.socketpair()
+        with ours, theirs:
+            return self.helper.dispatch(dict(op='openvpn', token='token', **request), ours)
+
+    def test_command_line_is_built_by_the_helper(self):
+        path = self.profile()
+        self.spawn(config_path=path, device='tun3', remote=['vpn.example.com', 1194, 'udp'], args=['--plugin', 'x'])
+        argv = self.run.call_args[0][0]
+        self.assertNotIn('--plugin', argv)
+        self.assertEqual(argv[argv.index('--dev') + 1], 'tun3')
+        self.assertEqual(argv[argv.index('--cd') + 1], self.directory)
+        # The daemon reads a checked copy, and its files live next to the helper's socket
+        self.assertNotEqual(argv[argv.index('--config') + 1], path)
+        self.assertTrue(argv[argv.index('--writepid') + 1].startswith(os.path.join(self.directory, 'tunnels')))
+
+    def test_scripts_in_the_profile_are_disabled(self):
+        path = self.profile("script-security 2\nup /tmp/evil.sh\n")
+        self.spawn(config_path=path, device='tun0')
+        argv = self.run.call_args[0][0]
+        self.assertEqual(argv[argv.index('--config') + 2:argv.index('--config') + 4], ['--script-security', '1'])
+
+    def test_plugins_in_the_profile_are_refused(self):
+        path = self.profile("plugin /tmp/evil.so\n")
+        with self.assertRaises(ProfileError):
+            self.spawn(config_path=path, device='tun0')
+        self.run.assert_not_called()
+
+    def test_remote_of_any_connection_block_is_accepted(self):
+        path = self.profile("<connection>\nremote one.example.com 443 tcp\n</connection>\n"
+                            "<connection>\nremote two.example.com 1194 udp\n</connection>\n")
+        self.spawn(config_path=path, device='tun0', remote=['two.example.com', 1194, 'udp'])
+        argv = self.run.call_args[0][0]
+        self.assertEqual(argv[argv.index('--remote') + 1], 'two.example.com')
+
+    def test_unknown_remote_and_bad_device_are_refused(self):
+        path = self.profile()
+        with self.assertRaises(ValueError):
+            self.spawn(config_path=path, device='tun0', remote=['attacker.example.com', 1194, 'udp'])
+        with self.assertRaises(ValueError):
+            self.spawn(config_path=path, device='tun0 --up x')
+        self.run.assert_not_called()
+
+
+class ViciProxyTest(unittest.TestCase):
+    def setUp(self):
+        charon_side, theirs = socket.socketpair()
+        self.charon = FakeCharon(theirs)
+        self.addCleanup(self.charon.close)
+        client, helper_side = socket.socketpair()
+        self.addCleanup(helper_side.close)
+        proxy = ViciProxy(charon_side)
+        threading.Thread(target=proxy.run, args=(helper_side.makefile('rb'), helper_side), daemon=True).start()
+        self.events = queue.Queue()
+        self.session = ViciSession(client, lambda name, message: self.events.put((name, message)))
+        self.addCleanup(self.session.close)
+
+    def test_engine_commands_reach_charon(self):
+        self.session.request('load-conn', {'vpn-app-x': {'children': {'vpn-app-x': {'start_action': 'none'}}}})
+        self.session.request('initiate', {'ike': 'vpn-app-x', 'child': 'vpn-app-x', 'timeout': 30000})
+        self.assertEqual(self.charon.next_request()[0], 'load-conn')
+        self.assertEqual(self.charon.next_request(), ('initiate', {'ike': 'vpn-app-x', 'child': 'vpn-app-x',
+                                                                   'timeout': '30000'}))
+
+    def test_scripts_and_other_connections_are_refused(self):
+        for command, message in (
+            ('load-conn', {'vpn-app-x': {'children': {'vpn-app-x': {'updown': '/tmp/evil.sh'}}}}),
+            ('load-conn', {'office': {'version': 2}}),
+            ('terminate', {'ike': 'office'}),
+            ('terminate', {'ike-id': 1}),
+            ('load-shared', {'type': 'IKE', 'data': 'secret'})
+        ):
+            with self.subTest(command=command, message=message), self.assertRaisesRegex(ViciError, 'refused'):
+                self.session.request(command, message)
+        with self.assertRaisesRegex(ViciError, 'does not know'):
+            self.session.request('load-cert', {'type': 'X509'})
+        self.session.request('list-sas')
+        # Nothing refused got through
+        self.assertEqual(self.charon.next_request(), ('list-sas', {}))
+
+    def test_only_events_about_our_sas_are_passed_on(self):
+        self.session.register('ike-updown')
+        with self.assertRaisesRegex(ViciError, 'does not know'):
+            self.session.register('log')
+        self.charon.emit('ike-updown', {'up': 'no', 'office': {'state': 'DELETING'}})
+        self.charon.emit('control-log', {'ikesa-name': 'office', 'msg': 'secret'})
+        self.charon.emit('ike-updown', {'up': 'no', 'office': {}, 'vpn-app-x': {'state': 'DELETING'}})
+        self.assertEqual(self.events.get(timeout=5), ('ike-updown', {'up': 'no', 'vpn-app-x': {'state': 'DELETING'}}))
+        self.assertTrue(self.events.empty())
+
+
+class HelperStartTest(unittest.TestCase):
+    """start() against a fake sudo that runs the helper as the current user"""
+
+    SUDO = {
+        # Asks for the password and keeps the line, as with a password rule
+        'password': '#!/bin/sh\nread -r password\nshift 2\nexec "$@"\n',
+        # NOPASSWD or a cached timestamp: stdin goes to the helper untouched
+        'nopasswd': '#!/bin/sh\nshift 2\nexec "$@"\n'
+    }
+
+    def start(self, sudo):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'sudo')
+        with open(path, 'w') as file:
+            file.write(sudo)
+        os.chmod(path, 0o755)
+        with mock.patch.dict(os.environ, {'PATH': directory.name + os.pathsep + os.environ['PATH']}):
+            client = HelperClient(os.path.join(directory.name, 'helper.sock'))
+            client.start('sudo-password')
+        self.addCleanup(client.stop)
+        return client
+
+    def test_token_reaches_the_helper_whether_sudo_reads_the_password_or_not(self):
+        for kind, sudo in self.SUDO.items():
+            with self.subTest(sudo=kind):
+                client = self.start(sudo)
+                self.assertTrue(client.running)
+                self.assertEqual(client.request('ping'), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import os
+import tempfile
+import unittest
+
+from importer import import_profiles
+
+PROFILE = """client
+dev tun
+remote vpn.example.com 1194 udp
+<ca>
+-----BEGIN CERTIFICATE-----
+-----END CERTIFICATE-----
+</ca>
+"""
+
+
+class ImportProfilesTest(unittest.TestCase):
+    def test_relative_source_is_saved_as_absolute_paths(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        os.makedirs(os.path.join(directory.name, 'profiles'))
+        with open(os.path.join(directory.name, 'profiles', 'office.ovpn'), 'w') as file:
+            file.write(PROFILE)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(directory.name)
+
+        result = import_profiles('profiles', 'ana', 'secret')
+        self.assertEqual([connection.config_path for connection in result.connections],
+                         [os.path.join(os.path.realpath(directory.name), 'profiles', 'office.ovpn')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import os
+import queue
+import socket
+import tempfile
+import threading
+import unittest
+
+from management import EventLoopThread, ManagementClient, ManagementError
+
+
+class FakeDaemon:
+    """One-client OpenVPN management server on a Unix socket.
+
+    Every command is recorded and answered with SUCCESS; `on_command`
+    may send notifications after a given command, as the daemon would.
+    """
+
+    def __init__(self, path, on_command=None):
+        self.path = path
+        self.on_command = on_command or {}
+        self.commands = queue.Queue()
+        self.server = socket.socket(socket.AF_UNIX)
+        self.server.bind(path)
+        self.server.listen(1)
+        self.client = None
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def send(self, line):
+        self.client.sendall(f"{line}\n".encode())
+
+    def _serve(self):
+        self.client, _ = self.server.accept()
+        self.send(">INFO:OpenVPN Management Interface Version 5")
+        self.send(">HOLD:Waiting for hold release:0")
+        for raw in self.client.makefile('r'):
+            command = raw.strip()
+            self.commands.put(command)
+            if command == 'pid':
+                self.send("SUCCESS: pid=4242")
+            else:
+                self.send(f"SUCCESS: {command}")
+            for line in self.on_command.get(command, ()):
+                self.send(line)
+
+    def next_command(self):
+        return self.commands.get(timeout=5)
+
+    def close(self):
+        client, self.client = self.client, None
+        if client is not None:
+            client.shutdown(socket.SHUT_RDWR)
+            client.close()
+        self.server.close()
+
+
+class ManagementClientTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'management.sock')
+        self.loop = EventLoopThread()
+        self.addCleanup(self.loop.stop)
+        self.states = queue.Queue()
+        self.closed = threading.Event()
+
+    def start(self, on_command=None, credentials=None):
+        self.daemon = FakeDaemon(self.path, on_command)
+        self.addCleanup(self.daemon.close)
+        self.client = ManagementClient(
+            self.path, on_state=lambda name, fields: self.states.put(name), on_closed=self.closed.set
+        )
+        self.loop.run(self.client.connect(timeout=2), timeout=5)
+        self.addCleanup(lambda: self.loop.run(self.client.close(), timeout=5))
+        self.loop.run(self.client.start(credentials=credentials), timeout=5)
+
+    def commands(self, count):
+        return [self.daemon.next_command() for _ in range(count)]
+
+    def test_start_releases_the_hold_for_good(self):
+        self.start()
+        self.assertEqual(self.commands(4), ["state on", "bytecount 1", "hold off", "hold release"])
+        self.assertEqual(self.loop.run(self.client.pid(), timeout=5), 4242)
+
+    def test_a_restart_is_released_again(self):
+        self.start()
+        self.commands(4)
+        self.daemon.send(">STATE:1,RECONNECTING,ping-restart,,,,,")
+        self.daemon.send(">HOLD:Waiting for hold release:10")
+        self.assertEqual(self.states.get(timeout=5), 'RECONNECTING')
+        self.assertEqual(self.daemon.next_command(), "hold release")
+
+    def test_credentials_are_answered_quoted(self):
+        connected = [">STATE:1,CONNECTED,SUCCESS,10.8.0.2,1.2.3.4,1194,,"]
+        self.start(
+            on_command={
+                'hold release': [">PASSWORD:Need 'Auth' username/password"],
+                'password "Auth" "p\\"q"': connected
+            },
+            credentials=('ana', 'p"q')
+        )
+        self.commands(4)
+        self.assertEqual(self.commands(2), ['username "Auth" "ana"', 'password "Auth" "p\\"q"'])
+        fields = self.loop.run(self.client.wait_ready(5), timeout=10)
+        self.assertEqual(fields[3], '10.8.0.2')
+
+    def test_rejected_credentials_fail_wait_ready(self):
+        self.start(
+            on_command={
+                'hold release': [">PASSWORD:Need 'Auth' username/password"],
+                'password "Auth" "wrong"': [">PASSWORD:Verification Failed: 'Auth'"]
+            },
+            credentials=('ana', 'wrong')
+        )
+        with self.assertRaisesRegex(ManagementError, "Authentication failed"):
+            self.loop.run(self.client.wait_ready(5), timeout=10)
+
+    def test_daemon_exit_is_reported(self):
+        self.start()
+        self.commands(4)
+        self.daemon.close()
+        self.assertTrue(self.closed.wait(5))
+        with self.assertRaisesRegex(ManagementError, "exited before the tunnel came up"):
+            self.loop.run(self.client.wait_ready(5), timeout=10)
+
+
+if __name__ == '__main__':
+    unittest.main()
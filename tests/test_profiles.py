@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from profiles import ProfileError, compile_profile
+
+PROFILE = """client
+dev tun
+remote vpn.example.com 1194 udp
+<ca>
+-----BEGIN CERTIFICATE-----
+-----END CERTIFICATE-----
+</ca>
+"""
+
+
+class CompileProfileTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.runtime = os.path.join(self.directory, 'run')
+        patcher = mock.patch.dict(os.environ, {'XDG_RUNTIME_DIR': self.runtime})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write(self, text):
+        path = os.path.join(self.directory, 'office.ovpn')
+        with open(path, 'w') as file:
+            file.write(text)
+        return path
+
+    def test_validation_creates_no_tunnel_directory(self):
+        profile = compile_profile(self.write(PROFILE))
+        self.assertFalse(profile.tunnel.dir.exists())
+        with self.assertRaises(ProfileError):
+            compile_profile(self.write("client\n"))
+        self.assertFalse(os.path.exists(os.path.join(self.runtime, 'vpn-app', 'tunnels')))
+
+    def test_plugins_and_file_placement_are_refused(self):
+        for line in ("plugin /tmp/x.so", "log /etc/passwd", "iproute /tmp/x"):
+            with self.subTest(line=line), self.assertRaises(ProfileError):
+                compile_profile(self.write(PROFILE + line + "\n"))
+
+    def test_script_hooks_are_accepted_but_disabled(self):
+        profile = compile_profile(self.write(
+            PROFILE + "script-security 2\nup /etc/openvpn/update-resolv-conf\ndown /etc/openvpn/update-resolv-conf\n"
+        ))
+        self.assertEqual(profile.scripts, ['down', 'script-security', 'up'])
+        argv = profile.argv([])
+        config = argv.index('--config')
+        self.assertEqual(argv[config + 2:config + 4], ['--script-security', '1'])
+
+    def test_every_connection_block_is_kept(self):
+        profile = compile_profile(self.write(
+            "client\ndev tun\nproto tcp\n<ca>\n-----BEGIN CERTIFICATE-----\n</ca>\n"
+            "<connection>\nremote one.example.com 443\n</connection>\n"
+            "<connection>\nremote two.example.com 1194 udp\n</connection>\n"
+        ))
+        self.assertEqual([(remote.host, remote.port, remote.proto) for remote in profile.remotes],
+                         [('one.example.com', 443, 'tcp'), ('two.example.com', 1194, 'udp')])
+
+    def test_tls_auth_and_tls_crypt_are_detected(self):
+        self.assertFalse(compile_profile(self.write(PROFILE)).tls_wrapped)
+        for block in ('tls-auth', 'tls-crypt', 'tls-crypt-v2'):
+            with self.subTest(block=block):
+                profile = compile_profile(self.write(PROFILE + f"<{block}>\nkey\n</{block}>\n"))
+                self.assertTrue(profile.tls_wrapped)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from remotes import LatencyProbe, Remote
+
+
+class FastestTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.probe = LatencyProbe(cache_file=os.path.join(directory.name, 'latency.json'))
+
+    def test_tls_wrapped_udp_remotes_are_not_probed(self):
+        remotes = [Remote('one.example.com', 1194, 'udp'), Remote('two.example.com', 1194, 'udp')]
+        with mock.patch('remotes.probe_udp') as probe_udp:
+            self.assertIsNone(self.probe.fastest(remotes, 'office', udp_probes=False))
+        probe_udp.assert_not_called()
+
+    def test_tcp_remotes_are_probed_either_way(self):
+        remotes = [Remote('one.example.com', 443, 'tcp'), Remote('two.example.com', 443, 'tcp')]
+        rtts = {'one.example.com': 0.2, 'two.example.com': 0.05}
+        with mock.patch('remotes.probe_tcp', side_effect=lambda host, port, timeout: rtts[host]):
+            self.assertEqual(self.probe.fastest(remotes, 'office', udp_probes=False), remotes[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import json
+import os
+import tempfile
+import unittest
+
+from store import Connection, ConnectionStore
+
+
+class ReloadTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'connections.json')
+        self.writes = 0
+        self.write([Connection('office', '/p/a.ovpn', 'u', 'p'), Connection('office', '/p/b.ovpn', 'u', 'p'),
+                    Connection('home', '/p/c.ovpn', 'u', 'p')])
+        self.store = ConnectionStore(self.path)
+        self.ids = self.store.load()
+
+    def write(self, connections):
+        with open(self.path, 'w') as file:
+            json.dump([connection.to_dict() for connection in connections], file)
+        # A distinct stamp even on filesystems with coarse timestamps
+        self.writes += 1
+        os.utime(self.path, ns=(self.writes * 10 ** 9, self.writes * 10 ** 9))
+
+    def connections(self):
+        return [self.store.get(connection_id) for connection_id in self.ids]
+
+    def test_duplicate_names_stay_separate_connections(self):
+        first, second, home = self.connections()
+        self.write([first, second.replace(username='ana'), home])
+        added, removed, changed = self.store.reload()
+        self.assertEqual((added, removed), ([], {}))
+        self.assertEqual(list(changed), [self.ids[1]])
+        self.assertEqual(self.store.get(self.ids[0]).username, 'u')
+        self.assertEqual(len(self.store), 3)
+
+    def test_rename_is_a_change_not_a_new_connection(self):
+        first, second, home = self.connections()
+        self.write([first, second, home.replace(name='house')])
+        added, removed, changed = self.store.reload()
+        self.assertEqual((added, removed), ([], {}))
+        self.assertEqual(changed[self.ids[2]][1].name, 'house')
+
+    def test_moved_profile_keeps_its_id(self):
+        first, second, home = self.connections()
+        self.write([first, second, home.replace(config_path='/q/c.ovpn')])
+        self.assertEqual(list(self.store.reload()[2]), [self.ids[2]])
+
+    def test_removing_one_duplicate_removes_that_one(self):
+        first, second, home = self.connections()
+        self.write([second, home, Connection('lab', '/p/d.ovpn', 'u', 'p')])
+        added, removed, changed = self.store.reload()
+        self.assertEqual(list(removed), [self.ids[0]])
+        self.assertEqual(changed, {})
+        self.assertEqual([self.store.get(connection_id).config_path for connection_id in added], ['/p/d.ovpn'])
+
+
+if __name__ == '__main__':
+    unittest.main()
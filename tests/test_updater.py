@@ -0,0 +1,92 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from updater import UpdateChecker
+
+
+class FakeGitHub(ThreadingHTTPServer):
+    """Serves /repos/<repo>/releases/latest with a fixed status, tag and ETag"""
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), self.Handler)
+        self.status = 200
+        self.tag = 'v1.2.0'
+        self.etag = '"abc"'
+        self.requests = []
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            server = self.server
+            server.requests.append((self.path, dict(self.headers)))
+            status = server.status
+            if status == 200 and self.headers.get('If-None-Match') == server.etag:
+                status = 304
+            self.send_response(status)
+            body = json.dumps({'tag_name': server.tag}).encode() if status == 200 else b""
+            self.send_header('ETag', server.etag)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+
+class UpdateCheckerTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache_file = os.path.join(directory.name, 'latest_release.json')
+        self.github = FakeGitHub()
+        self.addCleanup(self.github.server_close)
+        self.addCleanup(self.github.shutdown)
+        # A proxy from the environment must not intercept the local server
+        patcher = mock.patch.dict(os.environ, {'NO_PROXY': '127.0.0.1', 'no_proxy': '127.0.0.1'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def checker(self, ttl=3600, url=None):
+        return UpdateChecker(repo='owner/vpn', current_version='1.0.0', api_url=url or self.github.url, ttl=ttl,
+                             cache_file=self.cache_file)
+
+    def test_newer_release_is_reported_and_cached(self):
+        self.assertEqual(self.checker().check(), '1.2.0')
+        self.assertEqual(self.github.requests[0][0], '/repos/owner/vpn/releases/latest')
+        # Within the TTL the network is not touched
+        self.assertEqual(self.checker().check(), '1.2.0')
+        self.assertEqual(len(self.github.requests), 1)
+
+    def test_expired_cache_makes_a_conditional_request(self):
+        self.checker(ttl=0).check()
+        self.github.tag = 'v9.9.9'  # Would only be seen on a full answer
+        self.assertEqual(self.checker(ttl=0).check(), '1.2.0')
+        self.assertEqual(self.github.requests[1][1].get('If-None-Match'), '"abc"')
+
+    def test_same_or_older_release_is_not_an_update(self):
+        self.github.tag = 'v1.0.0'
+        self.assertIsNone(self.checker().check())
+
+    def test_no_releases(self):
+        self.github.status = 404
+        self.assertIsNone(self.checker().check())
+
+    def test_errors_fall_back_to_the_last_answer(self):
+        self.checker(ttl=0).check()
+        self.github.status = 500
+        self.assertEqual(self.checker(ttl=0).check(), '1.2.0')
+        # Nothing listening
+        self.assertEqual(self.checker(ttl=0, url='http://127.0.0.1:9').check(), '1.2.0')
+
+
+if __name__ == '__main__':
+    unittest.main()
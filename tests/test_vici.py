@@ -0,0 +1,140 @@
+import queue
+import socket
+import threading
+import unittest
+
+from vici import (
+    CMD_REQUEST, CMD_RESPONSE, CMD_UNKNOWN, EVENT, EVENT_CONFIRM, EVENT_REGISTER, EVENT_UNREGISTER, ViciError,
+    ViciSession, decode_message, decode_packet, encode_message, encode_packet, read_packet
+)
+
+
+class FakeCharon:
+    """charon's side of a VICI connection.
+
+    Requests are recorded as (command, message) and answered with
+    `replies[command]` (success by default), after the (event, message)
+    pairs in `streams[command]`, as list-sas streams list-sa events;
+    commands in `unknown` get CMD_UNKNOWN. Registrations are confirmed
+    and emit() sends events.
+    """
+
+    def __init__(self, sock, replies=None, unknown=(), streams=None):
+        self.sock = sock
+        self.replies = replies or {}
+        self.unknown = unknown
+        self.streams = streams or {}
+        self.requests = queue.Queue()
+        self.events = set()
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                packet = read_packet(self.sock)
+            except OSError:
+                return
+            if packet is None:
+                return
+            packet_type, name, data = packet
+            if packet_type == EVENT_REGISTER:
+                self.events.add(name)
+                self.sock.sendall(encode_packet(EVENT_CONFIRM))
+            elif packet_type == EVENT_UNREGISTER:
+                self.events.discard(name)
+                self.sock.sendall(encode_packet(EVENT_CONFIRM))
+            elif name in self.unknown:
+                self.sock.sendall(encode_packet(CMD_UNKNOWN))
+            else:
+                self.requests.put((name, decode_message(data)))
+                for event, message in self.streams.get(name, ()):
+                    self.emit(event, message)
+                self.sock.sendall(encode_packet(CMD_RESPONSE, message=self.replies.get(name, {'success': 'yes'})))
+
+    def emit(self, event, message):
+        self.sock.sendall(encode_packet(EVENT, event, message))
+
+    def next_request(self):
+        return self.requests.get(timeout=5)
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class CodecTest(unittest.TestCase):
+    def test_nested_message_round_trips(self):
+        message = {
+            'conn': {'version': '1', 'remote_addrs': ['1.2.3.4', 'vpn.example.com'], 'local-1': {'auth': 'psk'}},
+            'empty': [],
+            'up': 'yes'
+        }
+        self.assertEqual(decode_message(encode_message(message)), message)
+
+    def test_booleans_and_numbers_are_sent_as_text(self):
+        self.assertEqual(decode_message(encode_message({'a': True, 'b': False, 'c': 30000})),
+                         {'a': 'yes', 'b': 'no', 'c': '30000'})
+
+    def test_packet_carries_type_name_and_message(self):
+        packet = encode_packet(CMD_REQUEST, 'initiate', {'ike': 'x'})
+        packet_type, name, data = decode_packet(packet[4:])
+        self.assertEqual((packet_type, name, decode_message(data)), (CMD_REQUEST, 'initiate', {'ike': 'x'}))
+        self.assertEqual(decode_packet(encode_packet(CMD_RESPONSE, message={'success': 'yes'})[4:])[:2],
+                         (CMD_RESPONSE, None))
+
+    def test_malformed_messages_are_rejected(self):
+        with self.assertRaises(ViciError):
+            decode_message(bytes([2]))
+        with self.assertRaises(ViciError):
+            decode_message(bytes([5, 0, 1]) + b"x")
+        with self.assertRaises(ViciError):
+            decode_message(bytes([9]))
+
+
+class ViciSessionTest(unittest.TestCase):
+    def start(self, **charon):
+        ours, theirs = socket.socketpair()
+        self.charon = FakeCharon(theirs, **charon)
+        self.addCleanup(self.charon.close)
+        self.events = queue.Queue()
+        self.closed = threading.Event()
+        self.session = ViciSession(ours, lambda name, message: self.events.put((name, message)), self.closed.set)
+        self.addCleanup(self.session.close)
+
+    def test_request_returns_the_reply(self):
+        self.start(replies={'version': {'daemon': 'charon', 'version': '5.9'}})
+        self.assertEqual(self.session.request('version')['version'], '5.9')
+        self.session.request('initiate', {'ike': 'vpn-app-x', 'timeout': 30000})
+        self.assertEqual(self.charon.next_request(), ('version', {}))
+        self.assertEqual(self.charon.next_request(), ('initiate', {'ike': 'vpn-app-x', 'timeout': '30000'}))
+
+    def test_failed_and_unknown_commands_raise(self):
+        self.start(replies={'terminate': {'success': 'no', 'errmsg': 'no matching SAs'}}, unknown=('bogus',))
+        with self.assertRaisesRegex(ViciError, 'no matching SAs'):
+            self.session.request('terminate', {'ike': 'vpn-app-x'})
+        with self.assertRaisesRegex(ViciError, 'does not know bogus'):
+            self.session.request('bogus')
+
+    def test_events_interleave_with_replies(self):
+        self.start()
+        self.session.register('ike-updown')
+        self.assertEqual(self.charon.events, {'ike-updown'})
+        self.charon.emit('ike-updown', {'up': 'yes', 'vpn-app-x': {'state': 'ESTABLISHED'}})
+        self.session.request('list-sas')
+        self.assertEqual(self.events.get(timeout=5), ('ike-updown', {'up': 'yes', 'vpn-app-x': {'state': 'ESTABLISHED'}}))
+
+    def test_charon_going_away_closes_the_session(self):
+        self.start()
+        self.charon.close()
+        self.assertTrue(self.closed.wait(5))
+        self.assertFalse(self.session.connected)
+        with self.assertRaisesRegex(ViciError, 'closed'):
+            self.session.request('list-sas')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import datetime
+import logging
+
+from PyQt5.QtCore import Qt, QRect, QSize
+from PyQt5.QtGui import QColor, QPainter
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QListWidget, QListWidgetItem, QPushButton, QLabel, QScrollArea, QSplitter
+)
+
+import tracing
+
+
+class WaterfallView(QWidget):
+    """One trace as a waterfall: a bar per span, indented under its parent"""
+    ROW_HEIGHT = 20
+    LABEL_WIDTH = 220
+    DURATION_WIDTH = 80
+    MARGIN = 6
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self.start_ns = 0
+        self.total_ns = 1
+
+    def set_trace(self, spans):
+        by_id = {span['span_id']: span for span in spans}
+        depth = {}
+
+        def depth_of(span):
+            if span['span_id'] not in depth:
+                parent = by_id.get(span['parent_id'])
+                depth[span['span_id']] = depth_of(parent) + 1 if parent else 0
+            return depth[span['span_id']]
+
+        self.rows = [(depth_of(span), span) for span in spans]
+        self.start_ns = min((span['start_ns'] for span in spans), default=0)
+        end_ns = max((span['end_ns'] for span in spans), default=0)
+        self.total_ns = max(1, end_ns - self.start_ns)
+        self.updateGeometry()
+        self.resize(self.sizeHint())
+        self.update()
+
+    def sizeHint(self):
+        return QSize(600, 2 * self.MARGIN + len(self.rows) * self.ROW_HEIGHT)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), self.palette().base())
+        bars_left = self.MARGIN + self.LABEL_WIDTH
+        bars_width = max(1, self.width() - bars_left - self.DURATION_WIDTH - self.MARGIN)
+        for row, (depth, span) in enumerate(self.rows):
+            top = self.MARGIN + row * self.ROW_HEIGHT
+            label_rect = QRect(self.MARGIN + 12 * depth, top, self.LABEL_WIDTH - 12 * depth, self.ROW_HEIGHT)
+            painter.setPen(self.palette().text().color())
+            painter.drawText(label_rect, Qt.AlignLeft | Qt.AlignVCenter, span['name'])
+
+            left = bars_left + int((span['start_ns'] - self.start_ns) / self.total_ns * bars_width)
+            width = max(2, int((span['end_ns'] - span['start_ns']) / self.total_ns * bars_width))
+            bar = QRect(left, top + 3, width, self.ROW_HEIGHT - 6)
+            painter.fillRect(bar, QColor("#FF6B6B" if span.get('error') else "#6495ED"))
+            painter.drawText(
+                QRect(bar.right() + 4, top, self.DURATION_WIDTH, self.ROW_HEIGHT), Qt.AlignLeft | Qt.AlignVCenter,
+                f"{span['duration_ms']:.1f} ms"
+            )
+
+
+class TraceViewer(QWidget):
+    """Recent traces from the JSONL export, with a waterfall for the selected one"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.traces = []
+
+        self.status = QLabel()
+        self.refresh_button = QPushButton("Actualizar")
+        self.refresh_button.clicked.connect(self.refresh)
+        header = QHBoxLayout()
+        header.addWidget(self.status, 1)
+        header.addWidget(self.refresh_button)
+
+        self.trace_list = QListWidget()
+        self.trace_list.currentRowChanged.connect(self.show_trace)
+        self.waterfall = WaterfallView()
+        scroll = QScrollArea()
+        scroll.setWidget(self.waterfall)
+        scroll.setWidgetResizable(True)
+
+        splitter = QSplitter(Qt.Vertical)
+        splitter.addWidget(self.trace_list)
+        splitter.addWidget(scroll)
+        splitter.setSizes([150, 400])
+
+        layout = QVBoxLayout()
+        layout.addLayout(header)
+        layout.addWidget(splitter)
+        self.setLayout(layout)
+
+    def refresh(self):
+        try:
+            if not tracing.TRACE_ENABLED:
+                self.status.setText("Trazas desactivadas (VPN_APP_TRACE=1 para activarlas)")
+            else:
+                self.status.setText(str(tracing.trace_file()))
+            self.traces = tracing.load_traces()
+            self.trace_list.clear()
+            for spans in self.traces:
+                root = next((span for span in spans if not span['parent_id']), spans[0])
+                started = datetime.datetime.fromtimestamp(root['wall_time']).strftime("%H:%M:%S")
+                connection = root['attrs'].get('connection') or ""
+                # Work handed to other threads can outlive the root span
+                total_ms = (max(span['end_ns'] for span in spans) - spans[0]['start_ns']) / 1e6
+                item = QListWidgetItem(f"{started}  {root['name']}  {connection}  {total_ms:.0f} ms")
+                if any(span.get('error') for span in spans):
+                    item.setForeground(QColor("#FF0000"))
+                self.trace_list.addItem(item)
+            if self.traces:
+                self.trace_list.setCurrentRow(0)
+            else:
+                self.waterfall.set_trace([])
+        except Exception as e:
+            logging.error(f"Error loading traces: {e}")
+
+    def show_trace(self, row):
+        if 0 <= row < len(self.traces):
+            self.waterfall.set_trace(self.traces[row])
@@ -0,0 +1,218 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from paths import state_dir
+
+# Opt-in: with tracing off, span() hands back a shared no-op
+TRACE_ENABLED = os.environ.get("VPN_APP_TRACE", "") not in ("", "0")
+TRACE_MAX_BYTES = 5 * 1024 * 1024
+TRACE_BACKUPS = 3
+
+_current = contextvars.ContextVar("vpn_trace_span", default=None)
+
+
+def trace_file():
+    path = state_dir() / 'traces'
+    path.mkdir(exist_ok=True)
+    return path / 'spans.jsonl'
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+    def fail(self, exc):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    """A timed phase. Entering makes it the parent of spans opened in the
+    same context; exiting records its end and queues it for export."""
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'attrs', 'start_ns', 'end_ns',
+                 'wall_time', 'thread', 'error', '_token')
+
+    def __init__(self, name, parent=None, attrs=None):
+        self.name = name
+        self.span_id = os.urandom(4).hex()
+        self.trace_id = parent.trace_id if parent else os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.attrs = attrs or {}
+        self.start_ns = time.monotonic_ns()
+        self.wall_time = time.time()
+        self.end_ns = None
+        self.thread = None
+        self.error = None
+        self._token = None
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end(exc)
+        _current.reset(self._token)
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def fail(self, exc):
+        """Record an error that was handled inside the span"""
+        self.error = f"{type(exc).__name__}: {exc}"
+
+    def end(self, exc=None):
+        self.end_ns = time.monotonic_ns()
+        self.thread = threading.current_thread().name
+        if exc is not None:
+            self.fail(exc)
+        _exporter().submit(self)
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'duration_ms': (self.end_ns - self.start_ns) / 1e6,
+            'wall_time': self.wall_time,
+            'thread': self.thread,
+            'attrs': self.attrs,
+            'error': self.error
+        }
+
+
+def span(name, **attrs):
+    """Open a span under the current one (or a new trace)"""
+    if not TRACE_ENABLED:
+        return _NOOP
+    return Span(name, _current.get(), attrs)
+
+
+def current():
+    return _current.get()
+
+
+def mark(name, parent=None, **attrs):
+    """Record an instant (zero-length span), e.g. a daemon state change"""
+    if not TRACE_ENABLED:
+        return
+    marker = Span(name, parent or _current.get(), attrs)
+    marker.end()
+
+
+def bind(function):
+    """Carry the current span into another thread (thread pools don't)"""
+    if not TRACE_ENABLED:
+        return function
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(function, *args, **kwargs)
+
+
+class SpanExporter:
+    """Write finished spans as JSON lines from a background thread.
+
+    The file is rotated at max_bytes, keeping `backups` older files
+    (spans.jsonl.1, .2, ...).
+    """
+
+    def __init__(self, path=None, max_bytes=TRACE_MAX_BYTES, backups=TRACE_BACKUPS):
+        self.path = str(path or trace_file())
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._run, name="vpn-trace-export", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def submit(self, span):
+        self.queue.put(span)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join(timeout=2)
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            # Drain whatever else is waiting: one write per burst
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            closing = None in batch
+            lines = "".join(json.dumps(span.to_dict()) + "\n" for span in batch if span is not None)
+            try:
+                self._write(lines)
+            except Exception as e:
+                logging.error(f"Error exporting trace spans: {e}")
+            if closing:
+                return
+
+    def _write(self, lines):
+        if not lines:
+            return
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        if size and size + len(lines) > self.max_bytes:
+            self._rotate()
+        with open(self.path, 'a') as file:
+            file.write(lines)
+
+    def _rotate(self):
+        for index in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+
+_exporter_instance = None
+_exporter_lock = threading.Lock()
+
+
+def _exporter():
+    global _exporter_instance
+    if _exporter_instance is None:
+        with _exporter_lock:
+            if _exporter_instance is None:
+                _exporter_instance = SpanExporter()
+    return _exporter_instance
+
+
+def load_traces(path=None, limit=50):
+    """Read exported spans and group them by trace, most recent trace first"""
+    path = str(path or trace_file())
+    traces = {}
+    for candidate in (f"{path}.1", path):
+        try:
+            with open(candidate, 'r') as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    traces.setdefault(record['trace_id'], []).append(record)
+        except OSError:
+            continue
+    ordered = sorted(traces.values(), key=lambda spans: min(s['wall_time'] for s in spans), reverse=True)
+    return [sorted(spans, key=lambda s: s['start_ns']) for spans in ordered[:limit]]
@@ -0,0 +1,93 @@
+import hashlib
+import logging
+import os
+import platform
+import socket
+
+from paths import runtime_dir
+
+
+def tunnel_key(config_path):
+    """Short, filesystem-safe id for the tunnel of a config path (or IPsec server)"""
+    return hashlib.sha1(config_path.encode()).hexdigest()[:12]
+
+
+# Every strongSwan connection, SA and secret we load is named with this
+SA_PREFIX = "vpn-app-"
+
+
+def sa_name(server):
+    """Name of the strongSwan connection (and IKE SA) we load for an IPsec server"""
+    return f"{SA_PREFIX}{tunnel_key(server)}"
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, but belongs to root
+        return True
+    return True
+
+
+class Tunnel:
+    """Per-tunnel runtime files: OpenVPN writes its pid and status here and
+    listens on the management socket"""
+
+    def __init__(self, config_path, base_dir=None, create=True):
+        self.config_path = config_path
+        self.key = tunnel_key(config_path)
+        self.dir = (base_dir or runtime_dir() / 'tunnels') / self.key
+        self.pid_file = self.dir / 'openvpn.pid'
+        self.status_file = self.dir / 'openvpn.status'
+        self.management_socket = self.dir / 'management.sock'
+        if create:
+            self.create()
+
+    def create(self):
+        """Make the directory, before a daemon is spawned into it"""
+        self.dir.mkdir(parents=True, exist_ok=True)
+
+    def read_pid(self):
+        try:
+            return int(self.pid_file.read_text().strip())
+        except (OSError, ValueError):
+            return None
+
+    def is_running(self):
+        pid = self.read_pid()
+        return bool(pid) and pid_alive(pid)
+
+    def clear(self):
+        """Remove files left over by a previous run"""
+        for path in (self.pid_file, self.status_file, self.management_socket):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.warning(f"Could not remove {path}: {e}")
+
+
+def allocate_device(reserved=(), dev_type='tun'):
+    """Pick a tun/tap device name not used by the system nor by another of our tunnels"""
+    prefix = 'utun' if dev_type == 'tun' and platform.system() == 'Darwin' else dev_type
+    try:
+        in_use = {name for _, name in socket.if_nameindex()}
+    except OSError:
+        in_use = set()
+    in_use.update(reserved)
+    # utun0..utun3 are usually taken by the system on macOS
+    index = 4 if prefix == 'utun' else 0
+    while f"{prefix}{index}" in in_use:
+        index += 1
+    return f"{prefix}{index}"
+
+
+def device_args(device):
+    """OpenVPN options that pin the tunnel to a device"""
+    if device.startswith('utun'):
+        return ['--dev', 'tun', '--dev-node', device]
+    return ['--dev', device]
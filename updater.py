@@ -0,0 +1,103 @@
+import json
+import logging
+import os
+import time
+
+import requests
+
+from paths import cache_dir
+
+CURRENT_VERSION = "1.0.0"  # Replace with your current version
+GITHUB_REPO = "alumno109192/vpn"  # Replace with your GitHub repo
+GITHUB_API = "https://api.github.com"
+
+# Seconds during which a stored answer is reused without touching the network
+DEFAULT_TTL = int(os.environ.get("VPN_APP_UPDATE_TTL", 6 * 60 * 60))
+
+
+def is_newer_version(latest_version, current_version):
+    """Compare version strings"""
+    latest = [int(x) for x in latest_version.split(".")]
+    current = [int(x) for x in current_version.split(".")]
+    return latest > current
+
+
+class UpdateChecker:
+    """Ask GitHub for the latest release, as cheaply as possible.
+
+    The last answer is persisted together with its ETag and Last-Modified
+    headers. Within the TTL no request is made at all; after it expires the
+    request is conditional, so an unchanged release costs a 304.
+    """
+
+    def __init__(self, repo=GITHUB_REPO, current_version=CURRENT_VERSION, api_url=GITHUB_API,
+                 ttl=DEFAULT_TTL, timeout=5, cache_file=None):
+        self.url = f"{api_url.rstrip('/')}/repos/{repo}/releases/latest"
+        self.current_version = current_version
+        self.ttl = ttl
+        self.timeout = timeout
+        self.cache_file = cache_file or (cache_dir() / 'latest_release.json')
+
+    def check(self):
+        """Return the latest version if it is newer than the running one, else None"""
+        latest_version = self.latest_version()
+        if not latest_version:
+            return None
+        try:
+            if is_newer_version(latest_version, self.current_version):
+                return latest_version
+        except ValueError:
+            logging.warning(f"Unexpected release tag: {latest_version}")
+        return None
+
+    def latest_version(self):
+        cache = self._load_cache()
+        if cache and time.time() - cache.get('fetched_at', 0) < self.ttl:
+            return cache.get('tag_name')
+
+        headers = {"User-Agent": "VPN-App", "Accept": "application/vnd.github+json"}
+        if cache.get('etag'):
+            headers["If-None-Match"] = cache['etag']
+        if cache.get('last_modified'):
+            headers["If-Modified-Since"] = cache['last_modified']
+
+        try:
+            response = requests.get(self.url, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            logging.warning(f"Error checking for updates: {e}")
+            return cache.get('tag_name')
+
+        if response.status_code == 304:
+            cache['fetched_at'] = time.time()
+        elif response.status_code == 200:
+            cache = {
+                'tag_name': response.json().get("tag_name", "").lstrip("v"),
+                'etag': response.headers.get("ETag"),
+                'last_modified': response.headers.get("Last-Modified"),
+                'fetched_at': time.time()
+            }
+        elif response.status_code == 404:
+            logging.info("No releases found on GitHub.")
+            cache = {'tag_name': None, 'fetched_at': time.time()}
+        else:
+            logging.warning(f"GitHub API error: {response.status_code}")
+            return cache.get('tag_name')
+
+        self._save_cache(cache)
+        return cache.get('tag_name')
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self, cache):
+        try:
+            tmp = f"{self.cache_file}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(cache, f)
+            os.replace(tmp, self.cache_file)
+        except OSError as e:
+            logging.error(f"Error writing update cache: {e}")
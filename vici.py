@@ -0,0 +1,264 @@
+import logging
+import os
+import queue
+import socket
+import struct
+import threading
+
+import tracing
+
+# Where charon listens, in order of preference
+VICI_SOCKETS = [
+    os.environ.get("VPN_APP_VICI_SOCKET"),
+    "/var/run/charon.vici",
+    "/run/charon.vici",
+    "/usr/local/var/run/charon.vici",
+    "/opt/homebrew/var/run/charon.vici"
+]
+
+# Packet types
+CMD_REQUEST = 0
+CMD_RESPONSE = 1
+CMD_UNKNOWN = 2
+EVENT_REGISTER = 3
+EVENT_UNREGISTER = 4
+EVENT_CONFIRM = 5
+EVENT_UNKNOWN = 6
+EVENT = 7
+
+# Message element types
+SECTION_START = 1
+SECTION_END = 2
+KEY_VALUE = 3
+LIST_START = 4
+LIST_ITEM = 5
+LIST_END = 6
+
+
+class ViciError(Exception):
+    pass
+
+
+def find_vici_socket():
+    for path in VICI_SOCKETS:
+        if path and os.path.exists(path):
+            return path
+    return None
+
+
+def _name(value):
+    data = value.encode()
+    return bytes([len(data)]) + data
+
+
+def _value(value):
+    if isinstance(value, bool):
+        value = "yes" if value else "no"
+    if not isinstance(value, bytes):
+        value = str(value).encode()
+    return struct.pack("!H", len(value)) + value
+
+
+def encode_message(message):
+    """Encode a dict (nested dicts are sections, lists are lists)"""
+    out = bytearray()
+    for key, value in message.items():
+        if isinstance(value, dict):
+            out += bytes([SECTION_START]) + _name(key) + encode_message(value) + bytes([SECTION_END])
+        elif isinstance(value, (list, tuple)):
+            out += bytes([LIST_START]) + _name(key)
+            for item in value:
+                out += bytes([LIST_ITEM]) + _value(item)
+            out += bytes([LIST_END])
+        else:
+            out += bytes([KEY_VALUE]) + _name(key) + _value(value)
+    return bytes(out)
+
+
+def decode_message(data):
+    """Decode a message into nested dicts; values and list items are str"""
+    root = {}
+    stack = [root]
+    current_list = None
+    pos = 0
+    while pos < len(data):
+        kind = data[pos]
+        pos += 1
+        if kind in (SECTION_START, KEY_VALUE, LIST_START):
+            length = data[pos]
+            key = data[pos + 1:pos + 1 + length].decode()
+            pos += 1 + length
+        if kind in (KEY_VALUE, LIST_ITEM):
+            length, = struct.unpack_from("!H", data, pos)
+            value = data[pos + 2:pos + 2 + length].decode(errors='replace')
+            pos += 2 + length
+
+        if kind == SECTION_START:
+            section = {}
+            stack[-1][key] = section
+            stack.append(section)
+        elif kind == SECTION_END:
+            if len(stack) == 1:
+                raise ViciError("Unbalanced section in VICI message")
+            stack.pop()
+        elif kind == KEY_VALUE:
+            stack[-1][key] = value
+        elif kind == LIST_START:
+            current_list = stack[-1][key] = []
+        elif kind == LIST_ITEM:
+            if current_list is None:
+                raise ViciError("List item outside of a list in VICI message")
+            current_list.append(value)
+        elif kind == LIST_END:
+            current_list = None
+        else:
+            raise ViciError(f"Unknown VICI element type {kind}")
+    return root
+
+
+def encode_packet(packet_type, name=None, message=None):
+    return pack_packet(packet_type, name, encode_message(message) if message is not None else b"")
+
+
+def pack_packet(packet_type, name=None, data=b""):
+    """Frame an already encoded message, e.g. one being relayed"""
+    payload = bytes([packet_type])
+    if name is not None:
+        payload += _name(name)
+    payload += data
+    return struct.pack("!I", len(payload)) + payload
+
+
+def decode_packet(payload):
+    """Return (packet_type, name or None, message bytes)"""
+    packet_type = payload[0]
+    if packet_type in (CMD_REQUEST, EVENT_REGISTER, EVENT_UNREGISTER, EVENT):
+        length = payload[1]
+        return packet_type, payload[2:2 + length].decode(), payload[2 + length:]
+    return packet_type, None, payload[1:]
+
+
+def read_packet(sock):
+    header = _recv_exactly(sock, 4)
+    if header is None:
+        return None
+    length, = struct.unpack("!I", header)
+    payload = _recv_exactly(sock, length)
+    if payload is None:
+        return None
+    return decode_packet(payload)
+
+
+def _recv_exactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+
+class ViciSession:
+    """One persistent connection to charon's VICI socket.
+
+    Commands are serialized (VICI answers them in order); events for the
+    registered names are dispatched to on_event(name, message) from the
+    reader thread as they arrive, interleaved with the replies.
+    """
+
+    def __init__(self, sock, on_event=None, on_closed=None):
+        self.sock = sock
+        self.on_event = on_event
+        self.on_closed = on_closed
+        self._replies = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._reader = threading.Thread(target=self._read_loop, name="vici-reader", daemon=True)
+        self._reader.start()
+
+    @classmethod
+    def open(cls, path=None, on_event=None, on_closed=None):
+        path = path or find_vici_socket()
+        if not path:
+            raise ViciError("strongSwan VICI socket not found (is charon running?)")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+        except OSError:
+            sock.close()
+            raise
+        return cls(sock, on_event, on_closed)
+
+    @property
+    def connected(self):
+        return not self._closed.is_set()
+
+    def request(self, command, message=None, timeout=60):
+        """Run a command and return its reply; raise ViciError if it failed"""
+        with tracing.span(f"vici.{command}"):
+            reply = self._exchange(encode_packet(CMD_REQUEST, command, message or {}), CMD_RESPONSE, command, timeout)
+        reply = decode_message(reply)
+        if reply.get("success", "yes") == "no":
+            raise ViciError(reply.get("errmsg") or f"{command} failed")
+        return reply
+
+    def register(self, event):
+        self._exchange(encode_packet(EVENT_REGISTER, event), EVENT_CONFIRM, event, 10)
+
+    def unregister(self, event):
+        self._exchange(encode_packet(EVENT_UNREGISTER, event), EVENT_CONFIRM, event, 10)
+
+    def _exchange(self, packet, expected, name, timeout):
+        with self._lock:
+            if not self.connected:
+                raise ViciError("VICI connection closed")
+            self.sock.sendall(packet)
+            try:
+                reply = self._replies.get(timeout=timeout)
+            except queue.Empty:
+                # The late reply would be taken for the next command's
+                self.close()
+                raise ViciError(f"No reply from charon to {name}")
+        if reply is None:
+            raise ViciError("VICI connection closed")
+        packet_type, message = reply
+        if packet_type in (CMD_UNKNOWN, EVENT_UNKNOWN):
+            raise ViciError(f"charon does not know {name}")
+        if packet_type != expected:
+            raise ViciError(f"Unexpected VICI packet type {packet_type} for {name}")
+        return message
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def _read_loop(self):
+        try:
+            while True:
+                packet = read_packet(self.sock)
+                if packet is None:
+                    break
+                packet_type, name, message = packet
+                if packet_type == EVENT:
+                    self._dispatch(name, message)
+                else:
+                    self._replies.put((packet_type, message))
+        except (OSError, struct.error) as e:
+            logging.warning(f"VICI connection lost: {e}")
+        finally:
+            self._closed.set()
+            self._replies.put(None)
+            if self.on_closed:
+                self.on_closed()
+
+    def _dispatch(self, name, message):
+        if not self.on_event:
+            return
+        try:
+            self.on_event(name, decode_message(message))
+        except Exception as e:
+            logging.error(f"Error handling VICI event {name}: {e}")